@@ -4,22 +4,25 @@
 AWS成本监控Web界面 V2 - 模块化版本
 """
 
-from flask import Flask, render_template, jsonify, Response
+from flask import Flask, render_template, jsonify, Response, request, stream_with_context
 from flask_cors import CORS
-import threading
 from datetime import datetime
 
-from database.db_manager import DatabaseManager
+from database.db_manager import DatabaseManager, ROLLUP_RESOLUTIONS
+from database.exporter import CostExporter, EXPORT_FORMATS
 from utils.db_config import get_db_config
 from utils.logger import setup_logger, get_log_config
-from cost_collector import CostCollectorV2
+from utils.cache import ttl_cache
+from jobs.job_queue import JobQueue, JOB_PENDING, JOB_RUNNING, JOB_DONE
 import sqlite3
 import json
 import logging
 
 # Prometheus集成
 try:
-    from prometheus_client import generate_latest, Gauge, Info, CONTENT_TYPE_LATEST
+    from prometheus_client import generate_latest, REGISTRY, CONTENT_TYPE_LATEST
+    from monitoring.cost_exporter import CostMetricsCollector
+    from monitoring.instrumentation import build_registry
     PROMETHEUS_AVAILABLE = True
 except ImportError:
     PROMETHEUS_AVAILABLE = False
@@ -35,83 +38,50 @@ logger = setup_logger('aws_cost_monitor_web', log_config['path'], log_config['le
 
 # 全局组件
 db_manager = DatabaseManager(get_db_config())
-collector = CostCollectorV2()
-
-# 扫描状态
-scan_status = {'running': False, 'progress': 0, 'results': None, 'error': None}
+# 扫描任务由独立的scan_worker.py进程执行，Web进程只负责入队
+job_queue = JobQueue()
+
+# 仪表板读取的数据每小时才变化一次，按进程短时缓存 (WEB_CACHE_TTL秒)
+@ttl_cache()
+def get_latest_summary_cached():
+    return db_manager.get_latest_summary()
+
+@ttl_cache()
+def get_cost_history_cached(hours, resolution=None, service_type=None):
+    return db_manager.get_cost_history(hours, resolution, service_type)
+
+# 历史聚合查询 (启用ANALYTICS_STORE时由DuckDB执行)，结果变化慢，缓存时间更长
+@ttl_cache(ttl=300)
+def get_analytics_cached(query, *args):
+    if query == 'monthly_by_service':
+        return db_manager.get_monthly_service_costs(*args)
+    if query == 'top_resources':
+        return db_manager.get_top_resources(*args)
+    return db_manager.get_region_trend(*args)
+
+def warm_caches():
+    """预热缓存 - 由生产服务器的worker启动钩子调用"""
+    try:
+        get_latest_summary_cached()
+        get_cost_history_cached(24)
+        update_prometheus_metrics()
+        logger.info("Web缓存预热完成")
+    except Exception as e:
+        logger.warning(f"Web缓存预热失败: {e}")
 
-# Prometheus指标定义
+# Prometheus指标: 只在最新快照变化时重建，抓取时输出缓存
 if PROMETHEUS_AVAILABLE:
-    aws_cost_daily_total = Gauge('aws_cost_daily_total_usd', 'AWS每日总成本(美元)')
-    aws_cost_hourly_total = Gauge('aws_cost_hourly_total_usd', 'AWS每小时总成本(美元)')
-    aws_cost_monthly_total = Gauge('aws_cost_monthly_total_usd', 'AWS当月总成本(美元)')
-    aws_cost_by_service = Gauge('aws_cost_daily_by_service_usd', 'AWS每日服务成本(美元)', ['service'])
-    aws_cost_by_resource = Gauge('aws_cost_daily_by_resource_usd', 'AWS每日资源成本(美元)', ['service', 'resource_id', 'region'])
-    aws_cost_info = Info('aws_cost_collection_info', 'AWS成本收集信息')
+    cost_metrics = CostMetricsCollector(db_manager)
+    REGISTRY.register(cost_metrics)
+    # 多进程模式下同时汇总收集器/worker进程写入的自监控指标
+    metrics_registry = build_registry(cost_metrics)
 
 def update_prometheus_metrics():
-    """更新Prometheus指标"""
+    """刷新Prometheus指标 (快照未变化时不会重建)"""
     if not PROMETHEUS_AVAILABLE:
         return
     
-    try:
-        summary = db_manager.get_latest_summary()
-        if not summary:
-            return
-        
-        # 更新基础指标
-        aws_cost_daily_total.set(summary['total_daily_cost'])
-        aws_cost_hourly_total.set(summary['total_hourly_cost'])
-        
-        # 更新服务分解
-        if summary.get('service_breakdown'):
-            try:
-                service_breakdown = json.loads(summary['service_breakdown'])
-                for service, cost in service_breakdown.items():
-                    aws_cost_by_service.labels(service=service).set(cost)
-            except:
-                pass
-        
-        # 获取月度成本
-        current_month_str = datetime.now().strftime('%Y-%m')
-        conn = db_manager.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT total_monthly_cost FROM monthly_summary WHERE year_month = ?', (current_month_str,))
-        monthly_result = cursor.fetchone()
-        if monthly_result:
-            aws_cost_monthly_total.set(monthly_result[0])
-        
-        # 获取资源详情
-        cursor.execute('''
-            SELECT service_type, resource_id, region, daily_cost 
-            FROM cost_records WHERE timestamp = ?
-        ''', (summary['timestamp'],))
-        resources = cursor.fetchall()
-        
-        for resource in resources:
-            service_type, resource_id, region, daily_cost = resource
-            aws_cost_by_resource.labels(
-                service=service_type,
-                resource_id=resource_id,
-                region=region
-            ).set(daily_cost)
-        
-        conn.close()
-        
-        # 更新信息指标
-        aws_cost_info.info({
-            'last_update': summary['timestamp'],
-            'total_resources': str(len(resources)),
-            'collection_status': 'success'
-        })
-        
-    except Exception as e:
-        logger.error(f"更新Prometheus指标失败: {e}")
-        if PROMETHEUS_AVAILABLE:
-            aws_cost_info.info({
-                'collection_status': 'error',
-                'error_message': str(e)
-            })
+    cost_metrics.refresh()
 
 @app.route('/')
 def dashboard():
@@ -209,7 +179,7 @@ def test_dashboard():
 @app.route('/api/current_cost')
 def current_cost():
     """获取当前成本数据"""
-    summary = db_manager.get_latest_summary()
+    summary = get_latest_summary_cached()
     
     if not summary:
         return jsonify({'error': '暂无数据'})
@@ -223,112 +193,75 @@ def current_cost():
 
 @app.route('/api/cost_history')
 def cost_history():
-    """获取成本历史数据"""
-    history_data = db_manager.get_cost_history(24)  # 过去24小时
+    """获取成本历史数据
+    
+    参数: hours=24 (查询范围), resolution=hour|day|week (默认按范围选择), service=EC2
+    """
+    hours = min(max(request.args.get('hours', 24, type=int), 1), 24 * 3650)
+    resolution = request.args.get('resolution')
+    if resolution and resolution not in ROLLUP_RESOLUTIONS:
+        return jsonify({'error': f'不支持的粒度: {resolution}', 'resolutions': list(ROLLUP_RESOLUTIONS)}), 400
+    
+    history_data = get_cost_history_cached(hours, resolution, request.args.get('service') or None)
     return jsonify(history_data)
 
 @app.route('/api/trigger_collection')
 def trigger_collection():
-    """手动触发数据收集"""
-    if scan_status['running']:
+    """手动触发数据收集 (提交到任务队列)；?force=1 时所有收集器都重新扫描"""
+    job_id = job_queue.enqueue('collect', {'source': 'manual', 'force': request.args.get('force') == '1'})
+    if job_id is None:
         return jsonify({'error': '收集正在进行中'}), 400
     
-    threading.Thread(target=manual_collect, daemon=True).start()
-    return jsonify({'success': True, 'message': '数据收集已启动'})
-
-def manual_collect():
-    """手动收集数据"""
-    global scan_status
-    scan_status = {'running': True, 'progress': 0, 'results': None, 'error': None}
-    
-    try:
-        scan_status['progress'] = 50
-        collector.collect_and_save()
-        
-        # 数据收集完成后更新Prometheus指标
-        try:
-            update_prometheus_metrics()
-        except Exception as e:
-            logger.warning(f"Prometheus指标更新失败: {e}")
-        
-        scan_status = {
-            'running': False,
-            'progress': 100,
-            'results': {'message': '数据收集完成'},
-            'error': None
-        }
-    except Exception as e:
-        scan_status = {
-            'running': False,
-            'progress': 0,
-            'results': None,
-            'error': str(e)
-        }
+    return jsonify({'success': True, 'message': '数据收集已启动', 'job_id': job_id})
 
 @app.route('/api/scan-status')
 def scan_status_api():
     """获取扫描状态"""
-    return jsonify(scan_status)
+    job = job_queue.get_latest_job('collect')
+    if not job:
+        return jsonify({'running': False, 'progress': 0, 'results': None, 'error': None})
+    
+    progress = {JOB_PENDING: 0, JOB_RUNNING: 50, JOB_DONE: 100}.get(job['status'], 0)
+    return jsonify({
+        'job_id': job['id'],
+        'status': job['status'],
+        'running': job['status'] in (JOB_PENDING, JOB_RUNNING),
+        'progress': progress,
+        'results': job['result'] if job['status'] == JOB_DONE else None,
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at']
+    })
+
+@app.route('/api/scan_runs')
+def scan_runs():
+    """获取扫描耗时记录，用于对比不同次扫描
+    
+    参数: limit=20 或 ids=12,15 (指定要对比的扫描)
+    """
+    try:
+        run_ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        limit = min(request.args.get('limit', 20, type=int), 500)
+        runs = db_manager.get_scan_runs(limit=limit, run_ids=run_ids or None)
+        return jsonify(runs)
+    except ValueError:
+        return jsonify({'error': 'ids参数格式错误'}), 400
+    except Exception as e:
+        logger.error(f"获取扫描记录失败: {e}")
+        return jsonify({'error': '获取扫描记录失败'}), 500
 
 @app.route('/api/service_data/<service_type>')
 def service_data(service_type):
     """获取特定服务的数据"""
     try:
-        conn = db_manager.get_connection()
-        
-        if db_manager.db_type == 'sqlite':
-            conn.row_factory = sqlite3.Row
-        
-        cursor = conn.cursor()
-        
-        # 获取最新时间戳
-        cursor.execute('''
-            SELECT timestamp FROM cost_summary 
-            ORDER BY timestamp DESC LIMIT 1
-        ''')
-        latest_timestamp = cursor.fetchone()
-        
-        if not latest_timestamp:
-            conn.close()
-            return jsonify([])
-        
-        timestamp = latest_timestamp[0] if db_manager.db_type != 'sqlite' else latest_timestamp['timestamp']
-        placeholder = '?' if db_manager.db_type == 'sqlite' else '%s'
+        account_id = request.args.get('account') or None
+        if service_type.upper() != 'LAMBDA':
+            return jsonify(db_manager.get_latest_records(service_type.upper(), account_id))
         
-        if service_type.upper() == 'LAMBDA':
-            cursor.execute(f'''
-                SELECT * FROM lambda_records 
-                WHERE timestamp = {placeholder}
-                ORDER BY daily_cost DESC
-            ''', (timestamp,))
-        else:
-            cursor.execute(f'''
-                SELECT * FROM cost_records 
-                WHERE timestamp = {placeholder} AND service_type = {placeholder}
-                ORDER BY daily_cost DESC
-            ''', (timestamp, service_type.upper()))
-        
-        resources = cursor.fetchall()
-        conn.close()
-        
-        if db_manager.db_type == 'sqlite':
-            result = [dict(row) for row in resources]
-            if service_type.upper() == 'LAMBDA':
-                for item in result:
-                    item['service_type'] = 'LAMBDA'
-            return jsonify(result)
-        else:
-            if service_type.upper() == 'LAMBDA':
-                columns = ['id', 'timestamp', 'resource_id', 'region', 'hourly_cost', 'daily_cost', 'details']
-                result = []
-                for row in resources:
-                    resource_dict = dict(zip(columns, row))
-                    resource_dict['service_type'] = 'LAMBDA'
-                    result.append(resource_dict)
-                return jsonify(result)
-            else:
-                columns = ['id', 'timestamp', 'service_type', 'resource_id', 'region', 'hourly_cost', 'daily_cost', 'details']
-                return jsonify([dict(zip(columns, row)) for row in resources])
+        result = db_manager.get_latest_records('Lambda', account_id)
+        for item in result:
+            item['service_type'] = 'LAMBDA'
+        return jsonify(result)
             
     except Exception as e:
         logger.error(f"获取服务数据失败: {e}")
@@ -338,47 +271,43 @@ def service_data(service_type):
 def resource_details():
     """获取资源详细信息"""
     try:
-        summary = db_manager.get_latest_summary()
-        if not summary:
+        resources = db_manager.get_latest_records(account_id=request.args.get('account') or None)
+        if not resources:
             logger.warning("没有找到最新的成本数据")
             return jsonify([])
         
-        conn = db_manager.get_connection()
-        if db_manager.db_type == 'sqlite':
-            conn.row_factory = sqlite3.Row
-        
-        cursor = conn.cursor()
-        placeholder = '?' if db_manager.db_type == 'sqlite' else '%s'
-        
-        cursor.execute(f'''
-            SELECT * FROM cost_records 
-            WHERE timestamp = {placeholder}
-            ORDER BY service_type, daily_cost DESC
-        ''', (summary['timestamp'],))
-        
-        resources = cursor.fetchall()
         logger.info(f"找到 {len(resources)} 个资源")
-        conn.close()
-        
-        if db_manager.db_type == 'sqlite':
-            return jsonify([dict(row) for row in resources])
-        else:
-            columns = ['id', 'timestamp', 'service_type', 'resource_id', 'region', 'hourly_cost', 'daily_cost', 'details']
-            result = []
-            for row in resources:
-                resource_dict = dict(zip(columns, row))
-                try:
-                    details = json.loads(resource_dict['details'])
-                    resource_dict['instance_type'] = details.get('instance_type', '')
-                except:
-                    resource_dict['instance_type'] = ''
-                result.append(resource_dict)
-            return jsonify(result)
+        return jsonify(resources)
             
     except Exception as e:
         logger.error(f"获取资源详情失败: {e}")
         return jsonify({'error': '获取资源详情失败'}), 500
 
+@app.route('/api/analytics/<query>')
+def analytics_query(query):
+    """历史成本聚合: monthly_by_service / top_resources / region_trend"""
+    try:
+        if query == 'monthly_by_service':
+            args = (min(request.args.get('months', 12, type=int), 60),)
+        elif query == 'top_resources':
+            args = (
+                min(request.args.get('days', 90, type=int), 3650),
+                min(request.args.get('limit', 20, type=int), 500),
+                request.args.get('service') or None
+            )
+        elif query == 'region_trend':
+            args = (min(request.args.get('days', 30, type=int), 3650),)
+        else:
+            return jsonify({'error': f'未知的分析查询: {query}'}), 404
+        
+        return jsonify({
+            'backend': 'duckdb' if db_manager.analytics is not None else db_manager.db_type,
+            'data': get_analytics_cached(query, *args)
+        })
+    except Exception as e:
+        logger.error(f"分析查询失败: {e}")
+        return jsonify({'error': '分析查询失败'}), 500
+
 @app.route('/api/monthly_summary')
 def monthly_summary():
     """获取月度成本汇总"""
@@ -450,38 +379,27 @@ def current_month():
 def traffic_summary():
     """获取流量费用汇总信息"""
     try:
-        # 直接从数据库查询Traffic类型的费用
+        # 从最新快照表查询Traffic类型的费用
         conn = db_manager.get_connection()
         cursor = conn.cursor()
         
-        # 获取最新时间戳
-        cursor.execute('SELECT timestamp FROM cost_summary ORDER BY timestamp DESC LIMIT 1')
-        latest_timestamp = cursor.fetchone()
+        cursor.execute('SELECT total_daily_cost FROM latest_snapshot')
+        total_result = cursor.fetchone()
         
-        if not latest_timestamp:
+        if not total_result:
             conn.close()
             return jsonify({'traffic_cost': 0, 'traffic_percentage': 0, 'total_cost': 0})
         
-        timestamp = latest_timestamp[0]
+        total_cost = total_result[0]
         
-        # 查询Traffic类型的费用
         cursor.execute('''
             SELECT COALESCE(SUM(daily_cost), 0) as traffic_cost 
-            FROM cost_records 
-            WHERE timestamp = ? AND service_type = 'Traffic'
-        ''', (timestamp,))
+            FROM latest_resources 
+            WHERE service_type = 'Traffic'
+        ''')
         traffic_result = cursor.fetchone()
         traffic_cost = traffic_result[0] if traffic_result else 0
         
-        # 查询总费用
-        cursor.execute('''
-            SELECT total_daily_cost 
-            FROM cost_summary 
-            WHERE timestamp = ?
-        ''', (timestamp,))
-        total_result = cursor.fetchone()
-        total_cost = total_result[0] if total_result else 0
-        
         conn.close()
         
         traffic_percentage = (traffic_cost / total_cost * 100) if total_cost > 0 else 0
@@ -495,17 +413,41 @@ def traffic_summary():
         logger.error(f"获取流量费用汇总失败: {e}")
         return jsonify({'traffic_cost': 0, 'traffic_percentage': 0, 'total_cost': 0}), 500
 
+@app.route('/api/export')
+def export_cost_records():
+    """流式导出成本历史 (CSV/NDJSON/Parquet)
+    
+    参数: format=csv|ndjson|parquet, start=ISO时间, end=ISO时间, service=EC2,RDS
+    """
+    fmt = request.args.get('format', 'csv').lower()
+    start_time = request.args.get('start')
+    end_time = request.args.get('end')
+    service_param = request.args.get('service', '')
+    service_types = [s.strip() for s in service_param.split(',') if s.strip()] or None
+    
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'不支持的导出格式: {fmt}', 'formats': list(EXPORT_FORMATS)}), 400
+    
+    try:
+        chunks = CostExporter(db_manager).stream(fmt, start_time, end_time, service_types)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 503
+    
+    filename = f"cost_records.{EXPORT_FORMATS[fmt]['extension']}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[fmt]['mimetype'],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @app.route('/metrics')
 def prometheus_metrics():
     """暴露Prometheus指标"""
     if not PROMETHEUS_AVAILABLE:
         return "Prometheus client not available. Install with: pip install prometheus_client", 503
     
-    # 更新指标
-    update_prometheus_metrics()
-    
-    # 返回Prometheus格式的指标
-    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+    # 返回Prometheus格式的指标 (CostMetricsCollector在抓取时按需刷新)
+    return Response(generate_latest(metrics_registry), mimetype=CONTENT_TYPE_LATEST)
 
 @app.route('/api/prometheus_status')
 def prometheus_status():
@@ -517,4 +459,5 @@ def prometheus_status():
     })
 
 if __name__ == '__main__':
+    # 开发服务器；生产环境请使用: gunicorn -c gunicorn.conf.py wsgi:app
     app.run(debug=True, host='0.0.0.0', port=80)
\ No newline at end of file
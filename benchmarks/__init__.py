@@ -0,0 +1 @@
+# 基准测试与压测模块
\ No newline at end of file
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仪表板接口延迟基准测试 - 在进程内调用Flask应用，统计p50/p99延迟和每个请求的SQL查询数
+
+数据库由DB_TYPE等环境变量选择；为空时先用history_generator生成合成历史。
+默认关闭进程内缓存，测量的是每次请求真正访问数据库的开销。
+
+示例:
+    python -m benchmarks.api_benchmark --resources 200 --days 365
+    python -m benchmarks.api_benchmark --requests 200 --keep-cache
+    DB_TYPE=mysql DB_HOST=localhost python -m benchmarks.api_benchmark --endpoint /api/cost_history
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.load_test import percentile
+from benchmarks.scan_benchmark import get_git_revision, load_previous
+
+
+API_ENDPOINTS = [
+    '/api/current_cost',
+    '/api/cost_history',
+    '/api/resource_details',
+    '/api/current_month',
+    '/metrics'
+]
+
+
+class _CountingCursor:
+    """统计execute/executemany调用次数的游标代理"""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.count += 1
+        return self._cursor.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter.count += 1
+        return self._cursor.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    """连接代理，创建的游标都会计数 (row_factory等属性透传给真实连接)"""
+
+    def __init__(self, conn, counter):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_counter', counter)
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def execute(self, *args, **kwargs):
+        self._counter.count += 1
+        return self._conn.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+
+class QueryCounter(threading.local):
+    """按线程统计SQL查询数，包装DatabaseManager.get_connection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def install(self, db_manager):
+        get_connection = db_manager.get_connection
+        db_manager.get_connection = lambda: _CountingConnection(get_connection(), self)
+
+
+def run_benchmark(app_module, endpoints, requests, warmup=3):
+    """依次测量每个接口，返回 {接口: 统计}"""
+    counter = QueryCounter()
+    counter.install(app_module.db_manager)
+    client = app_module.app.test_client()
+
+    results = {}
+    for endpoint in endpoints:
+        for _ in range(warmup):
+            client.get(endpoint)
+
+        latencies = []
+        queries = []
+        errors = 0
+        for _ in range(requests):
+            counter.count = 0
+            start = time.perf_counter()
+            response = client.get(endpoint)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            queries.append(counter.count)
+            if response.status_code >= 500:
+                errors += 1
+
+        latencies.sort()
+        results[endpoint] = {
+            'requests': requests,
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else 0,
+            'max_queries': max(queries) if queries else 0,
+            'response_bytes': len(response.get_data())
+        }
+    return results
+
+
+def print_report(results, previous=None):
+    """打印结果；有上次结果时同时显示p99变化"""
+    print(f"{'接口':<26}{'p50(ms)':>10}{'p99(ms)':>10}{'查询/请求':>10}{'最大查询':>10}{'响应KB':>10}{'p99变化':>10}")
+    for endpoint, stats in results.items():
+        change = ''
+        old = (previous or {}).get('results', {}).get(endpoint)
+        if old and old.get('p99_ms'):
+            change = f"{(stats['p99_ms'] / old['p99_ms'] - 1) * 100:+.0f}%"
+        print(f"{endpoint:<26}{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+              f"{stats['queries_per_request']:>10}{stats['max_queries']:>10}"
+              f"{stats['response_bytes'] / 1024:>10.1f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='仪表板接口延迟基准测试')
+    parser.add_argument('--endpoint', action='append', help='只测试指定接口 (可重复)')
+    parser.add_argument('--requests', type=int, default=50, help='每个接口的请求次数')
+    parser.add_argument('--warmup', type=int, default=3, help='每个接口的预热请求次数')
+    parser.add_argument('--keep-cache', action='store_true', help='保留进程内缓存 (默认关闭以测量数据库开销)')
+    parser.add_argument('--resources', type=int, default=200, help='数据库为空时生成的每快照资源数')
+    parser.add_argument('--days', type=int, default=365, help='数据库为空时生成的历史天数')
+    parser.add_argument('--history', default='data/api_benchmark_history.jsonl', help='历史结果文件')
+    args = parser.parse_args()
+
+    if not args.keep_cache:
+        os.environ['WEB_CACHE_TTL'] = '0'
+
+    # 环境变量需要在导入app之前设置
+    import app as app_module
+    from benchmarks.history_generator import HistoryGenerator, has_history
+
+    app_module.logger.setLevel(logging.WARNING)
+    db_manager = app_module.db_manager
+    if not has_history(db_manager):
+        generator = HistoryGenerator(db_manager, args.resources, args.days)
+        print(f"数据库为空，生成 {args.days} 天历史 ({len(generator.slots)} 个资源/快照)...")
+        generator.generate()
+
+    if not args.keep_cache and app_module.PROMETHEUS_AVAILABLE:
+        app_module.cost_metrics.check_interval = 0
+
+    conn = db_manager.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*) FROM cost_records')
+    record_count = cursor.fetchone()[0]
+    conn.close()
+
+    scenario = f"{db_manager.db_type}-{record_count}rows-{'cache' if args.keep_cache else 'nocache'}"
+    print(f"\n=== 场景 {scenario} ===")
+    results = run_benchmark(app_module, args.endpoint or API_ENDPOINTS, args.requests, args.warmup)
+
+    previous = load_previous(args.history, scenario)
+    print_report(results, previous)
+
+    os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({
+            'timestamp': datetime.now().isoformat(),
+            'revision': get_git_revision(),
+            'scenario': scenario,
+            'results': results
+        }, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+历史数据生成器 - 向任意数据库后端写入指定时长的每小时成本快照
+
+数据通过DatabaseManager.save_cost_data写入，与真实收集走相同的写入路径，
+表结构变化后生成的数据仍然与线上一致。部分资源会周期性被替换，模拟创建和删除。
+
+示例:
+    python -m benchmarks.history_generator --resources 500 --days 365
+    DB_TYPE=postgresql DB_HOST=localhost python -m benchmarks.history_generator --resources 1000
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from database.db_manager import DatabaseManager
+from utils.db_config import get_db_config
+
+
+REGIONS = ['us-east-1', 'us-west-2', 'ap-southeast-1', 'ap-east-1', 'eu-west-1', 'ap-northeast-1']
+
+# (服务, 占比, 每小时成本范围, 实例类型)
+SERVICE_MIX = [
+    ('EC2', 0.40, (0.0104, 0.384), ['t3.micro', 't3.medium', 'm5.large', 'm5.xlarge', 'c5.xlarge']),
+    ('EBS', 0.25, (0.001, 0.05), ['gp3', 'gp2', 'io1']),
+    ('RDS', 0.05, (0.017, 0.342), ['db.t3.micro', 'db.t3.small', 'db.m5.large']),
+    ('S3', 0.10, (0.0001, 0.02), ['STANDARD']),
+    ('Lambda', 0.10, (0.0, 0.01), ['x86_64']),
+    ('NAT Gateway', 0.05, (0.045, 0.09), ['NAT Gateway']),
+    ('ELB', 0.05, (0.0225, 0.03), ['application'])
+]
+
+# 按用量计费的服务，成本随时段波动
+USAGE_BASED = {'Lambda', 'NAT Gateway', 'S3'}
+
+
+class HistoryGenerator:
+    def __init__(self, db_manager, resources=200, days=365, seed=0):
+        self.db_manager = db_manager
+        self.resources = resources
+        self.days = days
+        self.random = random.Random(seed)
+        self.slots = self._build_slots()
+
+    def _build_slots(self):
+        """生成资源槽位；每个槽位的资源在生命周期结束后被新资源替换"""
+        total_hours = self.days * 24
+        slots = []
+        for service, share, cost_range, types in SERVICE_MIX:
+            for _ in range(max(1, int(self.resources * share))):
+                slots.append({
+                    'service': service,
+                    'region': self.random.choice(REGIONS),
+                    'instance_type': self.random.choice(types),
+                    'hourly_cost': self.random.uniform(*cost_range),
+                    # 约一半资源整个周期都存在，其余在1周到整个周期之间被替换
+                    'lifetime': self.random.choice([total_hours + 1, self.random.randint(24 * 7, total_hours + 1)]),
+                    'offset': self.random.randint(0, total_hours)
+                })
+        return slots[:self.resources] if len(slots) > self.resources else slots
+
+    def _snapshot(self, hour_index, timestamp):
+        services = []
+        hour_of_day = timestamp.hour
+        for index, slot in enumerate(self.slots):
+            generation = (hour_index + slot['offset']) // slot['lifetime']
+            hourly_cost = slot['hourly_cost']
+            if slot['service'] in USAGE_BASED:
+                # 白天用量高，夜间用量低
+                hourly_cost *= 0.5 + (1.0 if 8 <= hour_of_day < 20 else 0.2) * self.random.random()
+            hourly_cost = round(hourly_cost, 6)
+
+            services.append({
+                'service': slot['service'],
+                'resource_id': f"{slot['service'].lower().replace(' ', '-')}-{index:06d}-{generation}",
+                'region': slot['region'],
+                'instance_type': slot['instance_type'],
+                'hourly_cost': hourly_cost,
+                'daily_cost': round(hourly_cost * 24, 6),
+                'details': {'synthetic': True, 'generation': generation}
+            })
+        return services
+
+    def generate(self, end_time=None, progress_every=24 * 7):
+        """写入每小时快照，截止到end_time (默认当前整点)，返回写入的快照数"""
+        end_time = (end_time or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        total_hours = self.days * 24
+        start_time = end_time - timedelta(hours=total_hours - 1)
+
+        daily_max = defaultdict(float)
+        monthly_breakdown = {}
+        started = time.perf_counter()
+
+        for hour_index in range(total_hours):
+            timestamp = start_time + timedelta(hours=hour_index)
+            services = self._snapshot(hour_index, timestamp)
+            _, total_daily, breakdown = self.db_manager.save_cost_data(services, timestamp.isoformat())
+
+            # 与update_monthly_summary相同: 月度成本 = 每天最大日成本之和
+            day = timestamp.strftime('%Y-%m-%d')
+            daily_max[day] = max(daily_max[day], total_daily)
+            monthly_breakdown[timestamp.strftime('%Y-%m')] = dict(breakdown)
+
+            if progress_every and (hour_index + 1) % progress_every == 0:
+                elapsed = time.perf_counter() - started
+                print(f"已写入 {hour_index + 1}/{total_hours} 个快照 ({elapsed:.0f}s)")
+
+        self._write_monthly_summaries(daily_max, monthly_breakdown)
+        return total_hours
+
+    def _write_monthly_summaries(self, daily_max, monthly_breakdown):
+        monthly_totals = defaultdict(float)
+        for day, cost in daily_max.items():
+            monthly_totals[day[:7]] += cost
+
+        placeholder = '?' if self.db_manager.db_type == 'sqlite' else '%s'
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        for year_month, total in sorted(monthly_totals.items()):
+            cursor.execute(f'DELETE FROM monthly_summary WHERE year_month = {placeholder}', (year_month,))
+            cursor.execute(f'''
+                INSERT INTO monthly_summary
+                (year_month, total_monthly_cost, service_breakdown, created_at)
+                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder})
+            ''', (year_month, total, json.dumps(monthly_breakdown[year_month]), f'{year_month}-01T00:00:00'))
+        conn.commit()
+        conn.close()
+
+
+def has_history(db_manager):
+    """数据库中是否已有快照"""
+    return db_manager.get_latest_summary() is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='生成合成成本历史数据 (使用DB_TYPE等环境变量选择数据库)')
+    parser.add_argument('--resources', type=int, default=200, help='每个快照的资源数')
+    parser.add_argument('--days', type=int, default=365, help='历史天数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--force', action='store_true', help='数据库已有数据时仍然写入')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(get_db_config())
+    if has_history(db_manager) and not args.force:
+        print("数据库中已有成本数据，使用--force继续写入")
+        return
+
+    generator = HistoryGenerator(db_manager, args.resources, args.days, args.seed)
+    print(f"生成 {args.days} 天每小时快照, 每个快照 {len(generator.slots)} 个资源 ({db_manager.db_type})")
+    started = time.perf_counter()
+    snapshots = generator.generate()
+    print(f"完成: {snapshots} 个快照, 耗时 {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
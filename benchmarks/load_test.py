@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仪表板接口压测工具 - 并发请求并统计每秒请求数和延迟
+
+示例:
+    python -m benchmarks.load_test --url http://localhost --concurrency 16 --duration 30
+"""
+
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+DASHBOARD_ENDPOINTS = [
+    '/api/current_cost',
+    '/api/cost_history',
+    '/api/resource_details',
+    '/api/current_month',
+    '/api/monthly_summary',
+    '/api/traffic_summary',
+    '/metrics'
+]
+
+
+def percentile(sorted_values, pct):
+    """计算已排序列表的百分位数"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LoadTester:
+    def __init__(self, base_url, endpoints=None, concurrency=8, duration=10, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.endpoints = endpoints or DASHBOARD_ENDPOINTS
+        self.concurrency = concurrency
+        self.duration = duration
+        self.timeout = timeout
+        self.latencies = {endpoint: [] for endpoint in self.endpoints}
+        self.errors = {endpoint: 0 for endpoint in self.endpoints}
+        self.lock = threading.Lock()
+
+    def _request(self, endpoint):
+        start = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(self.base_url + endpoint, timeout=self.timeout) as response:
+                response.read()
+                ok = response.status < 500
+        except (urllib.error.URLError, OSError):
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            if ok:
+                self.latencies[endpoint].append(elapsed)
+            else:
+                self.errors[endpoint] += 1
+
+    def _worker(self, offset, deadline):
+        index = offset
+        while time.perf_counter() < deadline:
+            self._request(self.endpoints[index % len(self.endpoints)])
+            index += 1
+
+    def run(self):
+        """执行压测，返回每个接口的统计结果"""
+        deadline = time.perf_counter() + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(i, deadline), daemon=True)
+            for i in range(self.concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        results = {}
+        for endpoint in self.endpoints:
+            values = sorted(self.latencies[endpoint])
+            results[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors[endpoint],
+                'rps': len(values) / elapsed if elapsed else 0,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p99_ms': percentile(values, 99) * 1000
+            }
+        total = sum(r['requests'] for r in results.values())
+        results['__total__'] = {
+            'requests': total,
+            'errors': sum(r['errors'] for r in results.values()),
+            'rps': total / elapsed if elapsed else 0
+        }
+        return results
+
+
+def print_report(results):
+    """打印压测结果"""
+    print(f"{'接口':<28}{'请求数':>8}{'错误':>6}{'req/s':>10}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for endpoint, stats in results.items():
+        if endpoint == '__total__':
+            continue
+        print(f"{endpoint:<28}{stats['requests']:>8}{stats['errors']:>6}{stats['rps']:>10.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+    total = results['__total__']
+    print(f"{'总计':<28}{total['requests']:>8}{total['errors']:>6}{total['rps']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='仪表板接口压测')
+    parser.add_argument('--url', default='http://localhost', help='Web服务地址')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发线程数')
+    parser.add_argument('--duration', type=float, default=10, help='压测时长(秒)')
+    parser.add_argument('--endpoint', action='append', help='只压测指定接口 (可重复)')
+    args = parser.parse_args()
+
+    tester = LoadTester(args.url, args.endpoint, args.concurrency, args.duration)
+    print(f"压测 {args.url}: 并发{args.concurrency}, 时长{args.duration}秒")
+    print_report(tester.run())
+
+
+if __name__ == '__main__':
+    main()
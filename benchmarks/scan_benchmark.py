@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描流水线离线基准测试 - 用合成AWS账号测量collect_and_save的端到端性能
+
+每个场景在独立子进程中运行，测量:
+- 端到端耗时、AWS API调用次数、限流次数
+- 子进程峰值内存 (RSS)
+- 数据库写入吞吐 (save_cost_data 行/秒)
+
+结果追加到历史文件，并与同一场景的上一次结果比较以发现性能回退。
+
+示例:
+    python -m benchmarks.scan_benchmark --size 1k
+    python -m benchmarks.scan_benchmark --size 1k --size 10k --regions 16 --latency-ms 5 --throttle-rate 0.02
+    python -m benchmarks.scan_benchmark --size 10k --fail-on-regression
+    python -m benchmarks.scan_benchmark --size 1k --accounts 8 --latency-ms 5
+    python -m benchmarks.scan_benchmark --size 1k --regions 16 --active-regions 3 --scans 2
+    python -m benchmarks.scan_benchmark --size 1k --scans 24    # 稳定状态下一小时的扫描 (各收集器按刷新节奏)
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+# 与上次结果相比变差超过该比例视为回退
+REGRESSION_THRESHOLD = 0.2
+# 这些指标越大越差
+REGRESSION_METRICS = ['duration_seconds', 'api_calls', 'peak_rss_mb']
+
+
+def _run_scenario(config, result_queue):
+    """子进程中执行一个场景"""
+    workdir = tempfile.mkdtemp(prefix='cost_bench_')
+    os.environ['DB_TYPE'] = 'sqlite'
+    os.environ['DB_PATH'] = os.path.join(workdir, 'cost_history.db')
+    os.environ['METRIC_STORE_PATH'] = os.path.join(workdir, 'metric_store.db')
+    os.environ['PRICE_CATALOG_PATH'] = os.path.join(workdir, 'price_catalog.db')
+    os.environ['SNAPSHOT_LINEAGE_PATH'] = os.path.join(workdir, 'snapshot_lineage.db')
+    os.environ['CADENCE_STORE_PATH'] = os.path.join(workdir, 'scan_cadence.db')
+    os.environ.pop('TRACE_EXPORT_DIR', None)
+
+    from benchmarks.synthetic_aws import SyntheticAccount
+    from cost_collector import CostCollectorV2
+
+    account = SyntheticAccount(
+        regions=config['regions'], instances=config['instances'],
+        latency_ms=config['latency_ms'], throttle_rate=config['throttle_rate'], seed=config['seed'],
+        active_regions=config.get('active_regions')
+    )
+    accounts = None
+    if config.get('accounts', 1) > 1:
+        # 每个账号通过AssumeRole访问，资源规模相同
+        accounts = [{
+            'account_id': f'{100000000000 + i}', 'name': f'synthetic-{i}',
+            'role_arn': f'arn:aws:iam::{100000000000 + i}:role/CostMonitor', 'regions': list(account.regions)
+        } for i in range(config['accounts'])]
+    collector = CostCollectorV2(account.create_session(), accounts=accounts, session_hook=account.attach)
+    collector.logger.setLevel(logging.WARNING)
+    for c in collector.collectors:
+        c.regions = list(account.regions)
+
+    # 多次扫描时只统计最后一次 (前面的扫描用于预热区域扫描计划、刷新节奏等进程内状态)
+    # 每次扫描的计划时间间隔interval_hours，模拟定时任务的稳定状态
+    scans = config.get('scans', 1)
+    scan_start = datetime.now()
+    for index in range(scans - 1):
+        collector.collect_and_save(now=scan_start + timedelta(hours=index * config.get('interval_hours', 1)))
+    calls_before = account.summary()
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    collector.collect_and_save(now=scan_start + timedelta(hours=(scans - 1) * config.get('interval_hours', 1)))
+    duration = time.perf_counter() - start
+
+    run = collector.db_manager.get_scan_runs(limit=1)[0]
+    phases = run['breakdown'].get('phases', {})
+    save_seconds = phases.get('save_cost_data') or 0
+    api_summary = account.summary()
+    by_operation = {
+        operation: count - calls_before['by_operation'].get(operation, 0)
+        for operation, count in api_summary['by_operation'].items()
+    }
+    by_operation = dict(sorted(
+        ((operation, count) for operation, count in by_operation.items() if count), key=lambda item: -item[1]
+    ))
+
+    result_queue.put({
+        'duration_seconds': round(duration, 3),
+        'resources': run['resource_count'],
+        'api_calls': api_summary['api_calls'] - calls_before['api_calls'],
+        'throttles': api_summary['throttles'] - calls_before['throttles'],
+        'metric_datapoints': api_summary['metric_datapoints'] - calls_before['metric_datapoints'],
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'rss_growth_mb': round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024, 1),
+        'db_write_seconds': round(save_seconds, 3),
+        'db_rows_per_second': round(run['resource_count'] / save_seconds, 1) if save_seconds else None,
+        'phases': phases,
+        'top_operations': dict(list(by_operation.items())[:10])
+    })
+
+
+def run_scenario(config, timeout=3600):
+    """在独立子进程中运行场景，保证峰值内存互不影响"""
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_run_scenario, args=(config, result_queue))
+    process.start()
+    try:
+        result = result_queue.get(timeout=timeout)
+    finally:
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+    return result
+
+
+def scenario_key(config):
+    """场景标识，用于和历史结果对比"""
+    key = (f"{config['instances']}i-{config['regions']}r-"
+           f"{config['latency_ms']}ms-{config['throttle_rate']}t")
+    if config.get('accounts', 1) > 1:
+        key += f"-{config['accounts']}a"
+    if config.get('active_regions'):
+        key += f"-{config['active_regions']}active"
+    if config.get('scans', 1) > 1:
+        key += f"-{config['scans']}scans"
+        if config.get('interval_hours', 1) != 1:
+            key += f"-{config['interval_hours']}h"
+    return key
+
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def load_previous(history_path, key):
+    """读取同一场景最近一次的结果"""
+    if not os.path.exists(history_path):
+        return None
+    previous = None
+    with open(history_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('scenario') == key:
+                previous = entry
+    return previous
+
+
+def find_regressions(result, previous):
+    """与上次结果比较，返回回退的指标"""
+    if not previous:
+        return []
+    regressions = []
+    for metric in REGRESSION_METRICS:
+        old, new = previous['results'].get(metric), result.get(metric)
+        if old and new and new > old * (1 + REGRESSION_THRESHOLD):
+            regressions.append(f"{metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='扫描流水线离线基准测试')
+    parser.add_argument('--size', action='append', choices=list(SIZES), help='账号规模 (可重复，默认1k)')
+    parser.add_argument('--instances', type=int, help='自定义实例数 (覆盖--size)')
+    parser.add_argument('--regions', type=int, default=6, help='区域数量 (最多16)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='每次API调用注入的延迟(毫秒)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='每次API调用被限流的概率')
+    parser.add_argument('--accounts', type=int, default=1, help='通过AssumeRole扫描的账号数')
+    parser.add_argument('--active-regions', type=int, help='只有前N个区域有资源 (模拟稀疏的区域分布)')
+    parser.add_argument('--scans', type=int, default=1, help='连续扫描次数，只统计最后一次')
+    parser.add_argument('--interval-hours', type=float, default=1, help='连续扫描之间模拟的时间间隔(小时)')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--history', default='data/benchmark_history.jsonl', help='历史结果文件')
+    parser.add_argument('--fail-on-regression', action='store_true', help='发现回退时以非0退出')
+    args = parser.parse_args()
+
+    instance_counts = [args.instances] if args.instances else [SIZES[s] for s in (args.size or ['1k'])]
+    revision = get_git_revision()
+    failed = False
+
+    for instances in instance_counts:
+        config = {
+            'instances': instances,
+            'regions': args.regions,
+            'latency_ms': args.latency_ms,
+            'throttle_rate': args.throttle_rate,
+            'accounts': args.accounts,
+            'active_regions': args.active_regions,
+            'scans': max(1, args.scans),
+            'interval_hours': args.interval_hours,
+            'seed': args.seed
+        }
+        key = scenario_key(config)
+        print(f"\n=== 场景 {key} ===")
+        result = run_scenario(config)
+
+        print(f"端到端耗时: {result['duration_seconds']}s, 资源: {result['resources']}")
+        print(f"API调用: {result['api_calls']}, 限流: {result['throttles']}, "
+              f"CloudWatch数据点: {result.get('metric_datapoints')}")
+        print(f"峰值内存: {result['peak_rss_mb']}MB (扫描增长 {result['rss_growth_mb']}MB)")
+        print(f"数据库写入: {result['db_write_seconds']}s, {result['db_rows_per_second']} 行/秒")
+        print(f"阶段耗时: {result['phases']}")
+        print(f"调用最多的操作: {result['top_operations']}")
+
+        previous = load_previous(args.history, key)
+        regressions = find_regressions(result, previous)
+        if regressions:
+            failed = True
+            print(f"⚠ 相比 {previous.get('revision') or previous['timestamp']} 出现回退:")
+            for line in regressions:
+                print(f"  {line}")
+
+        os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'timestamp': datetime.now().isoformat(),
+                'revision': revision,
+                'scenario': key,
+                'config': config,
+                'results': result
+            }, ensure_ascii=False) + '\n')
+
+    if failed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成AWS账号 - 离线基准测试用
+
+与botocore Stubber相同，在before-call事件中直接返回解析后的响应，不发出任何网络请求；
+不同的是响应按操作和参数动态生成，可以模拟任意规模的账号、注入延迟和限流。
+"""
+
+import csv
+import hashlib
+import json
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import boto3
+from botocore.awsrequest import AWSResponse
+
+
+DEFAULT_REGIONS = [
+    'us-east-1', 'us-west-2', 'ap-southeast-1', 'ap-east-1', 'eu-west-1', 'ap-northeast-1',
+    'us-east-2', 'us-west-1', 'eu-central-1', 'eu-west-2', 'ap-south-1', 'ca-central-1',
+    'sa-east-1', 'ap-northeast-2', 'ap-southeast-2', 'eu-north-1'
+]
+
+INSTANCE_TYPES = ['t3.micro', 't3.small', 't3.medium', 'm5.large', 'm5.xlarge', 'c5.large', 'c5.xlarge']
+VOLUME_TYPES = ['gp3', 'gp2', 'io1', 'st1', 'sc1', 'io2']
+DB_CLASSES = ['db.t3.micro', 'db.t3.small', 'db.m5.large']
+
+
+def _stable_int(*parts):
+    """根据输入生成稳定的伪随机整数"""
+    digest = hashlib.md5(':'.join(str(p) for p in parts).encode()).hexdigest()
+    return int(digest[:8], 16)
+
+
+class SyntheticAccount:
+    def __init__(self, regions=6, instances=1000, volumes=None, functions=None, buckets=None,
+                 load_balancers=None, db_instances=None, tables=None, queues=None, topics=None, snapshots=None,
+                 latency_ms=0.0, throttle_rate=0.0, max_attempts=5, seed=0, active_regions=None):
+        self.regions = DEFAULT_REGIONS[:regions]
+        # 只有前active_regions个区域有资源，其余区域已启用但为空 (稀疏的区域分布)
+        self.active_regions = self.regions[:active_regions] if active_regions else self.regions
+        # 未指定时按实例数推算其他资源规模
+        self.counts = {
+            'instances': instances,
+            'volumes': instances if volumes is None else volumes,
+            'functions': instances // 2 if functions is None else functions,
+            'buckets': max(1, instances // 20) if buckets is None else buckets,
+            'load_balancers': max(1, instances // 50) if load_balancers is None else load_balancers,
+            'db_instances': max(1, instances // 100) if db_instances is None else db_instances,
+            'tables': max(1, instances // 50) if tables is None else tables,
+            'queues': max(1, instances // 20) if queues is None else queues,
+            'topics': max(1, instances // 100) if topics is None else topics,
+            'snapshots': instances if snapshots is None else snapshots
+        }
+        self.latency = latency_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self.max_attempts = max_attempts
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.api_calls = Counter()
+        self.throttles = Counter()
+        self.datapoints = 0
+
+        self.handlers = {
+            ('ec2', 'DescribeInstances'): self._describe_instances,
+            ('ec2', 'DescribeVolumes'): self._describe_volumes,
+            ('ec2', 'DescribeSnapshots'): self._describe_snapshots,
+            ('ebs', 'ListChangedBlocks'): self._list_changed_blocks,
+            ('ec2', 'DescribeAddresses'): lambda region, params: {'Addresses': []},
+            ('ec2', 'DescribeNatGateways'): self._describe_nat_gateways,
+            ('ec2', 'DescribeVpcEndpoints'): lambda region, params: {'VpcEndpoints': []},
+            ('ec2', 'DescribeRegions'): self._describe_regions,
+            ('elbv2', 'DescribeLoadBalancers'): self._describe_load_balancers,
+            ('elb', 'DescribeLoadBalancers'): lambda region, params: {'LoadBalancerDescriptions': []},
+            ('rds', 'DescribeDBInstances'): self._describe_db_instances,
+            ('rds', 'DescribeDBClusters'): self._describe_db_clusters,
+            ('lambda', 'ListFunctions'): self._list_functions,
+            ('cloudwatch', 'GetMetricStatistics'): self._get_metric_statistics,
+            ('cloudwatch', 'GetMetricData'): self._get_metric_data,
+            ('s3', 'ListBuckets'): self._list_buckets,
+            ('s3', 'GetBucketLocation'): self._get_bucket_location,
+            ('cloudwatch', 'ListMetrics'): self._list_metrics,
+            ('dynamodb', 'ListTables'): self._list_tables,
+            ('dynamodb', 'DescribeTable'): self._describe_table,
+            ('sns', 'ListTopics'): self._list_topics,
+            ('sqs', 'ListQueues'): self._list_queues,
+            ('cloudfront', 'ListDistributions'): lambda region, params: {'DistributionList': {'Quantity': 0}},
+            ('route53', 'ListHostedZones'): lambda region, params: {'HostedZones': []},
+            ('pricing', 'GetProducts'): self._get_products,
+            ('pricing', 'ListPriceLists'): self._list_price_lists,
+            ('pricing', 'GetPriceListFileUrl'): self._get_price_list_file_url,
+            ('sts', 'GetCallerIdentity'): lambda region, params: {'Account': '123456789012'},
+            ('sts', 'AssumeRole'): self._assume_role
+        }
+
+    # ---- 会话接入 ----
+
+    def create_session(self):
+        """创建已接入合成账号的boto3 Session"""
+        session = boto3.Session(
+            aws_access_key_id='synthetic', aws_secret_access_key='synthetic', region_name='us-east-1'
+        )
+        return self.attach(session)
+
+    def attach(self, session):
+        """给已有Session注册钩子；放在最后执行，使监控和追踪钩子先运行"""
+        session.events.register('before-parameter-build.*.*', self._capture_params)
+        session.events.register_last('before-call.*.*', self._respond)
+        return session
+
+    def _capture_params(self, params, context, **kwargs):
+        context['synthetic_params'] = dict(params)
+
+    def _respond(self, model, context, request_signer, **kwargs):
+        service = model.service_model.service_name
+        operation = model.name
+        region = request_signer.region_name
+        params = context.get('synthetic_params', {})
+
+        # 模拟botocore的重试: 每次尝试都可能被限流，全部失败时返回限流错误
+        for attempt in range(self.max_attempts):
+            with self.lock:
+                self.api_calls[f"{service}.{operation}"] += 1
+                throttled = self.throttle_rate and self.random.random() < self.throttle_rate
+                if throttled:
+                    self.throttles[f"{service}.{operation}"] += 1
+            if self.latency:
+                time.sleep(self.latency)
+            if not throttled:
+                break
+            time.sleep(min(0.02 * (2 ** attempt), 1.0))
+        else:
+            return AWSResponse(None, 400, {}, None), {
+                'Error': {'Code': 'Throttling', 'Message': 'Rate exceeded'},
+                'ResponseMetadata': {'HTTPStatusCode': 400}
+            }
+
+        handler = self.handlers.get((service, operation))
+        parsed = handler(region, params) if handler else {}
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200})
+        return AWSResponse(None, 200, {}, None), parsed
+
+    # ---- 资源分布 ----
+
+    def _region_indexes(self, kind, region):
+        """把某类资源按序号平均分配到有资源的区域"""
+        if region not in self.active_regions:
+            return range(0)
+        position = self.active_regions.index(region)
+        return range(position, self.counts[kind], len(self.active_regions))
+
+    def _paginate(self, items, params, token_key='NextToken', limit_key='MaxResults'):
+        """按MaxResults/NextToken分页；未指定MaxResults时返回全部"""
+        limit = params.get(limit_key)
+        if not limit:
+            return items, None
+        start = int(params.get(token_key) or 0)
+        end = start + int(limit)
+        next_token = str(end) if end < len(items) else None
+        return items[start:end], next_token
+
+    # ---- 操作实现 ----
+
+    def _assume_role(self, region, params):
+        return {'Credentials': {
+            'AccessKeyId': 'synthetic',
+            'SecretAccessKey': 'synthetic',
+            'SessionToken': params['RoleArn'],
+            'Expiration': datetime.now(timezone.utc) + timedelta(seconds=params.get('DurationSeconds', 3600))
+        }}
+
+    def _describe_regions(self, region, params):
+        return {'Regions': [
+            {'RegionName': name, 'Endpoint': f'ec2.{name}.amazonaws.com', 'OptInStatus': 'opt-in-not-required'}
+            for name in self.regions
+        ]}
+
+    def _instance(self, index, region):
+        instance = {
+            'InstanceId': f'i-{index:017x}',
+            'InstanceType': INSTANCE_TYPES[index % len(INSTANCE_TYPES)],
+            'State': {'Name': 'running', 'Code': 16},
+            'Placement': {'AvailabilityZone': f'{region}a'},
+            'LaunchTime': datetime(2024, 1, 1, tzinfo=timezone.utc)
+        }
+        if index % 3 == 0:
+            instance['PublicIpAddress'] = f'54.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+        return instance
+
+    def _describe_instances(self, region, params):
+        instances = [self._instance(i, region) for i in self._region_indexes('instances', region)]
+        if params.get('InstanceIds'):
+            instances = [inst for inst in instances if inst['InstanceId'] in params['InstanceIds']]
+        page, next_token = self._paginate(instances, params)
+        result = {'Reservations': [{'ReservationId': f"r-{inst['InstanceId'][2:]}", 'Instances': [inst]} for inst in page]}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _describe_volumes(self, region, params):
+        volumes = []
+        for i in self._region_indexes('volumes', region):
+            volume_type = VOLUME_TYPES[i % len(VOLUME_TYPES)]
+            volumes.append({
+                'VolumeId': f'vol-{i:017x}',
+                'Size': 8 + (i % 50) * 10,
+                'VolumeType': volume_type,
+                'State': 'available' if i % 10 == 0 else 'in-use',
+                'Iops': 3000 + (i % 4) * 1000 if volume_type in ('gp3', 'io1', 'io2') else None,
+                'Throughput': 125 + (i % 3) * 125 if volume_type == 'gp3' else None,
+                'AvailabilityZone': f'{region}a',
+                'CreateTime': datetime(2024, 1, 1, tzinfo=timezone.utc)
+            })
+        for volume in volumes:
+            for key in [k for k, v in volume.items() if v is None]:
+                del volume[key]
+        if params.get('VolumeIds'):
+            volumes = [volume for volume in volumes if volume['VolumeId'] in params['VolumeIds']]
+        page, next_token = self._paginate(volumes, params)
+        result = {'Volumes': page}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _snapshot(self, index, region):
+        """快照按顺序属于前几个卷 (每个卷若干个快照)，每二十个快照有一个已归档"""
+        volumes = list(self._region_indexes('volumes', region))
+        volume = volumes[index % max(1, len(volumes) // 4)] if volumes else 0
+        snapshot = {
+            'SnapshotId': f'snap-{index:017x}',
+            'VolumeId': f'vol-{volume:017x}',
+            'VolumeSize': 8 + (volume % 50) * 10,
+            'State': 'completed',
+            'StartTime': datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(hours=index),
+            'OwnerId': '123456789012',
+            'FullSnapshotSizeInBytes': self._snapshot_block_count(f'snap-{index:017x}', True) * 524288
+        }
+        if index % 20 == 19:
+            snapshot['StorageTier'] = 'archive'
+        return snapshot
+
+    def _describe_snapshots(self, region, params):
+        snapshots = [self._snapshot(i, region) for i in self._region_indexes('snapshots', region)]
+        page, next_token = self._paginate(snapshots, params)
+        result = {'Snapshots': page}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _snapshot_block_count(self, snapshot_id, full):
+        index = int(snapshot_id.split('-')[1], 16)
+        return (200 + index % 800) * (10 if full else 1)
+
+    def _block_page(self, key, count, params):
+        blocks = [{'BlockIndex': n, key: f't{n}'} for n in range(count)]
+        page, next_token = self._paginate(blocks, params)
+        return page, next_token
+
+    def _list_changed_blocks(self, region, params):
+        count = self._snapshot_block_count(params['SecondSnapshotId'], False)
+        page, next_token = self._block_page('SecondBlockToken', count, params)
+        result = {'ChangedBlocks': page, 'BlockSize': 524288, 'VolumeSize': 100}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _describe_nat_gateways(self, region, params):
+        gateways = [
+            {'NatGatewayId': f'nat-{i:017x}', 'State': 'available', 'SubnetId': 'subnet-1', 'VpcId': 'vpc-1'}
+            for i in self._region_indexes('load_balancers', region) if i % 5 == 0
+        ]
+        return {'NatGateways': gateways}
+
+    def _describe_load_balancers(self, region, params):
+        lbs = [{
+            'LoadBalancerArn': f'arn:aws:elasticloadbalancing:{region}:123456789012:loadbalancer/app/lb-{i}/{i:016x}',
+            'LoadBalancerName': f'lb-{i}',
+            'Type': 'application' if i % 2 == 0 else 'network',
+            'Scheme': 'internet-facing' if i % 3 == 0 else 'internal',
+            'State': {'Code': 'active'},
+            'VpcId': 'vpc-1'
+        } for i in self._region_indexes('load_balancers', region)]
+        page, next_token = self._paginate(lbs, params, token_key='Marker', limit_key='PageSize')
+        result = {'LoadBalancers': page}
+        if next_token:
+            result['NextMarker'] = next_token
+        return result
+
+    def _db_instance(self, index):
+        engine = ['mysql', 'postgres', 'aurora-mysql'][index % 3]
+        db = {
+            'DBInstanceIdentifier': f'db-{index}',
+            'DBInstanceClass': DB_CLASSES[index % len(DB_CLASSES)],
+            'Engine': engine,
+            'DBInstanceStatus': 'available',
+            'LicenseModel': 'postgresql-license' if engine == 'postgres' else 'general-public-license',
+            'MultiAZ': index % 4 == 0,
+            'AllocatedStorage': 20 + (index % 10) * 10,
+            'StorageType': 'gp3'
+        }
+        if engine.startswith('aurora'):
+            # 每个Aurora集群有两个实例，每四个集群有一个Serverless v2集群
+            db.update({'DBClusterIdentifier': f'cluster-{index // 6}', 'AllocatedStorage': 1, 'StorageType': 'aurora'})
+            if (index // 6) % 4 == 3:
+                db['DBInstanceClass'] = 'db.serverless'
+        elif index % 5 == 0:
+            db.update({'StorageType': 'io1', 'Iops': 1000 + (index % 3) * 1000, 'AllocatedStorage': 100})
+        return db
+
+    def _describe_db_instances(self, region, params):
+        dbs = [self._db_instance(i) for i in self._region_indexes('db_instances', region)]
+        page, next_token = self._paginate(dbs, params, token_key='Marker', limit_key='MaxRecords')
+        result = {'DBInstances': page}
+        if next_token:
+            result['Marker'] = next_token
+        return result
+
+    def _describe_db_clusters(self, region, params):
+        clusters = {}
+        for i in self._region_indexes('db_instances', region):
+            db = self._db_instance(i)
+            if 'DBClusterIdentifier' in db:
+                cluster_id = db['DBClusterIdentifier']
+                clusters[cluster_id] = {
+                    'DBClusterIdentifier': cluster_id,
+                    'Engine': db['Engine'],
+                    'Status': 'available',
+                    'AllocatedStorage': 1,
+                    'StorageType': 'aurora-iopt1' if int(cluster_id.split('-')[1]) % 5 == 4 else 'aurora',
+                    'ServerlessV2ScalingConfiguration': {'MinCapacity': 0.5, 'MaxCapacity': 16}
+                }
+        page, next_token = self._paginate(list(clusters.values()), params, token_key='Marker', limit_key='MaxRecords')
+        result = {'DBClusters': page}
+        if next_token:
+            result['Marker'] = next_token
+        return result
+
+    def _list_functions(self, region, params):
+        functions = [{
+            'FunctionName': f'fn-{i}',
+            'FunctionArn': f'arn:aws:lambda:{region}:123456789012:function:fn-{i}',
+            'MemorySize': [128, 256, 512, 1024][i % 4],
+            'Architectures': ['arm64' if i % 2 else 'x86_64'],
+            'EphemeralStorage': {'Size': 512},
+            'Runtime': 'python3.11',
+            'LastModified': '2024-01-01T00:00:00.000+0000',
+            'RevisionId': f'rev-{i}'
+        } for i in self._region_indexes('functions', region)]
+        limit = params.get('MaxItems') or 50
+        start = int(params.get('Marker') or 0)
+        result = {'Functions': functions[start:start + limit]}
+        if start + limit < len(functions):
+            result['NextMarker'] = str(start + limit)
+        return result
+
+    def _list_buckets(self, region, params):
+        return {'Buckets': [
+            {'Name': f'bucket-{i}', 'CreationDate': datetime(2024, 1, 1, tzinfo=timezone.utc)}
+            for i in range(self.counts['buckets'])
+        ]}
+
+    def _list_tables(self, region, params):
+        tables = [f'table-{i}' for i in self._region_indexes('tables', region)]
+        limit = params.get('Limit') or 100
+        start = 0
+        if params.get('ExclusiveStartTableName'):
+            start = tables.index(params['ExclusiveStartTableName']) + 1
+        result = {'TableNames': tables[start:start + limit]}
+        if start + limit < len(tables):
+            result['LastEvaluatedTableName'] = tables[start + limit - 1]
+        return result
+
+    def _describe_table(self, region, params):
+        name = params['TableName']
+        index = int(name.split('-')[-1])
+        table = {
+            'TableName': name,
+            'TableStatus': 'ACTIVE',
+            'TableSizeBytes': (index % 100) * 1024 ** 3,
+            'ItemCount': index * 1000
+        }
+        on_demand = index % 2 == 0
+        if on_demand:
+            table['BillingModeSummary'] = {'BillingMode': 'PAY_PER_REQUEST'}
+            table['ProvisionedThroughput'] = {'ReadCapacityUnits': 0, 'WriteCapacityUnits': 0}
+        else:
+            table['ProvisionedThroughput'] = {'ReadCapacityUnits': 5 + index % 20, 'WriteCapacityUnits': 5 + index % 10}
+        if index % 5 == 0:
+            table['TableClassSummary'] = {'TableClass': 'STANDARD_INFREQUENT_ACCESS'}
+        # 每三张表有一个全局二级索引
+        if index % 3 == 0:
+            table['GlobalSecondaryIndexes'] = [{
+                'IndexName': 'gsi-0',
+                'IndexStatus': 'ACTIVE',
+                'IndexSizeBytes': (index % 10) * 1024 ** 3,
+                'ProvisionedThroughput': table['ProvisionedThroughput']
+            }]
+        return {'Table': table}
+
+    def _queue_name(self, index):
+        # 每十个队列有一个FIFO队列
+        return f'queue-{index}.fifo' if index % 10 == 9 else f'queue-{index}'
+
+    def _list_queues(self, region, params):
+        urls = [
+            f'https://sqs.{region}.amazonaws.com/123456789012/{self._queue_name(i)}'
+            for i in self._region_indexes('queues', region)
+        ]
+        page, next_token = self._paginate(urls, params)
+        result = {'QueueUrls': page} if page else {}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _list_topics(self, region, params):
+        arns = [f'arn:aws:sns:{region}:123456789012:topic-{i}' for i in self._region_indexes('topics', region)]
+        page, next_token = self._paginate(arns, {**params, 'MaxResults': 100})
+        result = {'Topics': [{'TopicArn': arn} for arn in page]}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _get_metric_statistics(self, region, params):
+        dimension = (params.get('Dimensions') or [{'Value': ''}])[0]['Value']
+        end = params['EndTime']
+        start = params['StartTime']
+        period = params['Period']
+        # 与CloudWatch一样从StartTime开始按Period对齐，最后一个时间段可以不完整
+        points = max(1, min(math.ceil((end - start).total_seconds() / period), 1440))
+        base = _stable_int(region, params['MetricName'], dimension) % 1000
+        statistic = params.get('Statistics', ['Sum'])[0]
+        with self.lock:
+            self.datapoints += points
+        return {
+            'Label': params['MetricName'],
+            'Datapoints': [
+                {'Timestamp': start + timedelta(seconds=period * k), statistic: float(base * 1024 ** 2), 'Unit': 'None'}
+                for k in range(points)
+            ]
+        }
+
+    def _bucket_storage_types(self, index):
+        """存储桶中有数据的存储类型"""
+        storage_types = ['StandardStorage']
+        if index % 3 == 0:
+            storage_types.append('StandardIAStorage')
+        if index % 5 == 0:
+            storage_types += ['GlacierStorage', 'GlacierObjectOverhead']
+        if index % 7 == 0:
+            storage_types += ['IntelligentTieringFAStorage', 'IntelligentTieringIAStorage']
+        return storage_types
+
+    def _bucket_region(self, index):
+        return self.active_regions[index % len(self.active_regions)]
+
+    def _get_bucket_location(self, region, params):
+        bucket_region = self._bucket_region(int(params['Bucket'].rsplit('-', 1)[1]))
+        return {'LocationConstraint': None if bucket_region == 'us-east-1' else bucket_region}
+
+    def _list_metrics(self, region, params):
+        """只实现S3的BucketSizeBytes和SNS/SQS的用量指标 (每四个队列/主题有一个空闲)"""
+        namespace = params.get('Namespace')
+        if namespace == 'AWS/S3':
+            metrics = [{
+                'Namespace': 'AWS/S3', 'MetricName': 'BucketSizeBytes',
+                'Dimensions': [{'Name': 'BucketName', 'Value': f'bucket-{i}'},
+                               {'Name': 'StorageType', 'Value': storage_type}]
+            } for i in range(self.counts['buckets']) if self._bucket_region(i) == region
+                for storage_type in self._bucket_storage_types(i)]
+        elif namespace == 'AWS/SQS':
+            metrics = [{
+                'Namespace': 'AWS/SQS', 'MetricName': params.get('MetricName'),
+                'Dimensions': [{'Name': 'QueueName', 'Value': self._queue_name(i)}]
+            } for i in self._region_indexes('queues', region) if i % 4]
+        elif namespace == 'AWS/SNS':
+            metrics = [{
+                'Namespace': 'AWS/SNS', 'MetricName': params.get('MetricName'),
+                'Dimensions': [{'Name': 'TopicName', 'Value': f'topic-{i}'}]
+            } for i in self._region_indexes('topics', region) if i % 4]
+        else:
+            metrics = []
+        page, next_token = self._paginate(metrics, {**params, 'MaxResults': 500})
+        result = {'Metrics': page}
+        if next_token:
+            result['NextToken'] = next_token
+        return result
+
+    def _get_metric_data(self, region, params):
+        """每个查询返回一个时间段的值；Duration按调用次数 x 平均时长生成"""
+        results = []
+        for query in params['MetricDataQueries']:
+            metric = query['MetricStat']['Metric']
+            dimension = (metric.get('Dimensions') or [{'Value': ''}])[0]['Value']
+            value = float(_stable_int(region, 'Invocations', dimension) % 1000)
+            if metric['MetricName'] == 'Duration':
+                value *= 20 + _stable_int(region, 'Duration', dimension) % 2000
+            elif metric['MetricName'].startswith('Provisioned'):
+                # 与describe_table返回的预置容量一致
+                table = self._describe_table(region, {'TableName': dimension})['Table']
+                key = 'ReadCapacityUnits' if 'Read' in metric['MetricName'] else 'WriteCapacityUnits'
+                value = float(table['ProvisionedThroughput'][key])
+            elif metric['MetricName'] == 'VolumeBytesUsed':
+                value = float(_stable_int(dimension) % 500) * 1024 ** 3
+            elif metric['MetricName'] == 'ServerlessDatabaseCapacity':
+                value = 0.5 + _stable_int(dimension) % 16
+            elif metric['Namespace'] in ('AWS/SQS', 'AWS/SNS'):
+                # 每天数千到数百万次请求
+                value *= 1 + _stable_int(region, metric['MetricName'], dimension) % 2000
+            elif metric['MetricName'] == 'BucketSizeBytes':
+                storage_type = metric['Dimensions'][1]['Value']
+                value = float(_stable_int(dimension, storage_type) % 500) * 1024 ** 3
+            results.append({'Id': query['Id'], 'Label': metric['MetricName'], 'Timestamps': [params['StartTime']],
+                            'Values': [value], 'StatusCode': 'Complete'})
+        with self.lock:
+            self.datapoints += len(results)
+        return {'MetricDataResults': results}
+
+    def _get_products(self, region, params):
+        filters = {f['Field']: f['Value'] for f in params.get('Filters', [])}
+        key = filters.get('instanceType') or filters.get('volumeApiName') or 'default'
+        price = 0.01 + (_stable_int(key) % 500) / 1000.0
+        product = {
+            'product': {'attributes': filters},
+            'terms': {'OnDemand': {'T1': {'priceDimensions': {'D1': {
+                'unit': 'Hrs', 'pricePerUnit': {'USD': f'{price:.4f}'}
+            }}}}}
+        }
+        return {'PriceList': [json.dumps(product)], 'FormatVersion': 'aws_v1'}
+
+    def _list_price_lists(self, region, params):
+        return {'PriceLists': [{
+            'PriceListArn': f"arn:aws:pricing:::price-list/aws/{params['ServiceCode']}/USD/20260101000000/{params['RegionCode']}",
+            'RegionCode': params['RegionCode'],
+            'CurrencyCode': 'USD',
+            'FileFormats': ['json', 'csv']
+        }]}
+
+    def _get_price_list_file_url(self, region, params):
+        """生成只含合成账号用到的RDS价格的CSV价格表，返回file://地址"""
+        region_code = params['PriceListArn'].rsplit('/', 1)[1]
+        header = ['SKU', 'OfferTermCode', 'RateCode', 'TermType', 'PriceDescription', 'Unit', 'PricePerUnit',
+                  'Currency', 'Product Family', 'Location Type', 'Instance Type', 'Database Engine',
+                  'Database Edition', 'License Model', 'Deployment Option', 'Volume Type', 'usageType']
+        rows = []
+        for engine in ('MySQL', 'PostgreSQL', 'Aurora MySQL'):
+            aurora = engine.startswith('Aurora')
+            for instance_class in DB_CLASSES + ['db.serverless']:
+                if instance_class == 'db.serverless' and not aurora:
+                    continue
+                base = 0.12 if instance_class == 'db.serverless' else 0.01 + (_stable_int(instance_class) % 500) / 1000.0
+                family = 'ServerlessV2' if instance_class == 'db.serverless' else 'Database Instance'
+                for deployment in (('Single-AZ',) if aurora else ('Single-AZ', 'Multi-AZ')):
+                    for io_optimized in ((False, True) if aurora else (False,)):
+                        price = base * (2 if deployment == 'Multi-AZ' else 1) * (1.3 if io_optimized else 1)
+                        usage = 'InstanceUsageIOOptimized' if io_optimized else 'InstanceUsage'
+                        rows.append(['', '', '', 'OnDemand', '', 'Hrs', f'{price:.4f}', 'USD', family, 'AWS Region',
+                                     '' if instance_class == 'db.serverless' else instance_class, engine, '',
+                                     'No license required', deployment, '', f'{usage}:{instance_class}'])
+                        # 预留实例价格不应被读取
+                        rows.append(['', '', '', 'Reserved', '', 'Hrs', '0.0001', 'USD', family, 'AWS Region',
+                                     instance_class, engine, '', 'No license required', deployment, '', usage])
+        for volume_type, family, price, usage in (
+            ('General Purpose-GP3', 'Database Storage', 0.115, 'RDS:GP3-Storage'),
+            ('General Purpose', 'Database Storage', 0.115, 'RDS:GP2-Storage'),
+            ('Provisioned IOPS', 'Database Storage', 0.125, 'RDS:PIOPS-Storage'),
+            ('', 'Provisioned IOPS', 0.10, 'RDS:PIOPS'),
+            ('', 'Provisioned IOPS', 0.02, 'RDS:GP3-PIOPS'),
+            ('', 'Provisioned Throughput', 0.08, 'RDS:GP3-Throughput'),
+            ('General Purpose-Aurora', 'Database Storage', 0.10, 'Aurora:StorageUsage'),
+            ('IO Optimized-Aurora', 'Database Storage', 0.225, 'Aurora:IO-OptimizedStorageUsage'),
+            ('', 'System Operation', 0.0000002, 'Aurora:StorageIOUsage')
+        ):
+            for deployment in ('Single-AZ', 'Multi-AZ'):
+                rows.append(['', '', '', 'OnDemand', '', 'GB-Mo', str(price * (2 if deployment == 'Multi-AZ' else 1)),
+                             'USD', family, 'AWS Region', '', 'Any', '', '', deployment, volume_type, usage])
+
+        path = os.path.join(tempfile.gettempdir(), f'synthetic_rds_{region_code}_{os.getpid()}.csv')
+        with open(path, 'w', newline='') as f:
+            f.write('"FormatVersion","v1.0"\n"Disclaimer","synthetic"\n"Publication Date","2026-01-01T00:00:00Z"\n')
+            f.write('"Version","20260101000000"\n"OfferCode","AmazonRDS"\n')
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(header)
+            writer.writerows(rows)
+        return {'Url': 'file://' + path}
+
+    def summary(self):
+        """返回API调用和限流统计"""
+        with self.lock:
+            return {
+                'api_calls': sum(self.api_calls.values()),
+                'throttles': sum(self.throttles.values()),
+                'metric_datapoints': self.datapoints,
+                'by_operation': dict(self.api_calls.most_common())
+            }
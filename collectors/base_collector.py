@@ -5,14 +5,34 @@
 """
 
 import boto3
+import time
 from abc import ABC, abstractmethod
 
+from monitoring.instrumentation import observe_scan_duration
+from monitoring.tracing import span
+from utils.constants import AWS_REGIONS
+
 
 class BaseCollector(ABC):
+    # 刷新间隔和结果有效期 (小时)，见 collectors.cadence
+    refresh_hours = 1
+    freshness_hours = 3
+    
     def __init__(self, session=None, price_manager=None):
         self.session = session or boto3.Session()
         self.price_manager = price_manager
-        self.regions = ['us-east-1', 'us-west-2', 'ap-southeast-1', 'ap-east-1', 'eu-west-1', 'ap-northeast-1']
+        self.regions = list(AWS_REGIONS)
+        # 由CostCollectorV2设置 (collectors.regions.RegionPlanner)，用于跳过空区域
+        self.region_planner = None
+        # 收集器所属的账号 (由CostCollectorV2设置)
+        self.account_id = ''
+        # 本次扫描中API调用失败的区域 (结果不完整，不能视为空区域)
+        self.failed_regions = set()
+    
+    @property
+    def collector_name(self):
+        """收集器名称 (用于指标标签)，如 EC2Collector -> EC2"""
+        return type(self).__name__.replace('Collector', '')
     
     @abstractmethod
     def scan_region(self, region):
@@ -24,6 +44,33 @@ class BaseCollector(ABC):
         """扫描所有区域的资源"""
         pass
     
+    def regions_to_scan(self):
+        """本次需要扫描的区域 (跳过最近扫描过且没有资源的区域)"""
+        if self.region_planner is None:
+            return self.regions
+        return self.region_planner.filter_regions(self.collector_name, self.regions)
+    
+    def mark_region_failed(self, region):
+        """scan_region捕获API错误 (限流、无权限等) 后调用，本次区域的结果不完整"""
+        self.failed_regions.add(region)
+    
+    def timed_scan_region(self, region):
+        """扫描单个区域并记录耗时；只有成功的扫描才会把区域记录为空"""
+        start = time.perf_counter()
+        self.failed_regions.discard(region)
+        try:
+            with span(f"region {region}", kind='region', collector=self.collector_name, region=region):
+                services = self.scan_region(region)
+            if self.region_planner is not None:
+                self.region_planner.record(self.collector_name, region, len(services),
+                                           succeeded=region not in self.failed_regions)
+            return services
+        except Exception:
+            self.failed_regions.add(region)
+            raise
+        finally:
+            observe_scan_duration(self.collector_name, region, time.perf_counter() - start)
+    
     def get_client(self, service, region):
         """获取AWS客户端"""
-        return self.session.client(service, region_name=region)
\ No newline at end of file
+        return self.session.client(service, region_name=region)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+收集器刷新节奏 - 每个收集器按自己的刷新间隔扫描，快照合并各收集器最新的结果
+
+- 收集器通过 refresh_hours (刷新间隔) 和 freshness_hours (结果有效期) 声明节奏，
+  可用 COLLECTOR_REFRESH_HOURS=S3=24,Traffic=6 覆盖
+- 刷新间隔大于快照间隔的收集器，每次的间隔加上 ±SCAN_JITTER 的随机抖动，
+  多个账号/收集器的慢速扫描分散到不同的小时，避免API调用集中
+- 未到刷新时间的收集器沿用上一次的结果；超过有效期仍未成功刷新的结果不再计入快照
+- 每个收集器最近一次的结果和下次刷新时间保存在本地SQLite (CADENCE_STORE_PATH)，
+  进程内调度器和各scan_worker进程共享同一份节奏，进程重启后也不会重新扫描所有服务
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+
+# 快照调度的时间误差 (上一次扫描开始到本次开始不一定正好整小时)
+SCHEDULE_TOLERANCE = timedelta(minutes=5)
+
+
+def _parse_hours(value):
+    """EC2=1,S3=24 -> {'EC2': 1.0, 'S3': 24.0}"""
+    hours = {}
+    for item in value.split(','):
+        name, _, interval = item.partition('=')
+        if name.strip() and interval.strip():
+            hours[name.strip()] = float(interval)
+    return hours
+
+
+def get_cadence_config():
+    """刷新节奏配置"""
+    return {
+        'snapshot_hours': float(os.getenv('SNAPSHOT_INTERVAL_HOURS', 1)),
+        'refresh_hours': _parse_hours(os.getenv('COLLECTOR_REFRESH_HOURS', '')),
+        'jitter': float(os.getenv('SCAN_JITTER', 0.1)),
+        'path': os.getenv('CADENCE_STORE_PATH', 'data/scan_cadence.db')
+    }
+
+
+class ScanCadence:
+    def __init__(self, config=None, rng=None, account_id=''):
+        self.config = config or get_cadence_config()
+        self.rng = rng or random.Random()
+        self.account_id = account_id
+        # 收集器名称 -> {'services': 结果, 'scanned_at': 扫描时间, 'next_due': 下次刷新时间}
+        # 只是SQLite中结果的副本，其他进程写入更新的结果后重新读取
+        self._results = {}
+        self._lock = threading.Lock()
+
+        path = self.config.get('path', ':memory:')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout=30000')
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS collector_cadence (
+                account_id TEXT NOT NULL,
+                collector TEXT NOT NULL,
+                scanned_at TEXT NOT NULL,
+                next_due TEXT NOT NULL,
+                services TEXT NOT NULL,
+                PRIMARY KEY (account_id, collector)
+            )
+        ''')
+
+    def _state(self, name):
+        """收集器最近一次的扫描状态 (可能由其他进程写入)；没有扫描过时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT scanned_at, next_due FROM collector_cadence WHERE account_id = ? AND collector = ?',
+                (self.account_id, name)
+            ).fetchone()
+            if row is None:
+                return None
+            scanned_at = datetime.fromisoformat(row[0])
+            state = self._results.get(name)
+            if state is None or state['scanned_at'] != scanned_at:
+                services = self._conn.execute(
+                    'SELECT services FROM collector_cadence WHERE account_id = ? AND collector = ?',
+                    (self.account_id, name)
+                ).fetchone()[0]
+                state = {'services': json.loads(services), 'scanned_at': scanned_at,
+                         'next_due': datetime.fromisoformat(row[1])}
+                self._results[name] = state
+            else:
+                state['next_due'] = datetime.fromisoformat(row[1])
+            return state
+
+    def refresh_hours(self, collector):
+        return self.config['refresh_hours'].get(collector.collector_name, collector.refresh_hours)
+
+    def freshness_hours(self, collector):
+        return max(collector.freshness_hours, self.refresh_hours(collector))
+
+    def is_due(self, collector, now=None):
+        """收集器本次快照是否需要重新扫描"""
+        now = now or datetime.now()
+        state = self._state(collector.collector_name)
+        return state is None or now + SCHEDULE_TOLERANCE >= state['next_due']
+
+    def store(self, collector, services, now=None):
+        """保存扫描结果并计算下次刷新时间"""
+        now = now or datetime.now()
+        refresh = self.refresh_hours(collector)
+        if refresh > self.config['snapshot_hours']:
+            refresh *= 1 + self.rng.uniform(-self.config['jitter'], self.config['jitter'])
+        state = {
+            'services': list(services),
+            'scanned_at': now,
+            'next_due': now + timedelta(hours=refresh)
+        }
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO collector_cadence (account_id, collector, scanned_at, next_due, services)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (account_id, collector) DO UPDATE SET
+                    scanned_at = excluded.scanned_at,
+                    next_due = excluded.next_due,
+                    services = excluded.services
+            ''', (self.account_id, collector.collector_name, now.isoformat(), state['next_due'].isoformat(),
+                  json.dumps(state['services'], ensure_ascii=False, default=str)))
+            self._results[collector.collector_name] = state
+
+    def cached(self, collector, now=None):
+        """上一次的结果；超过有效期时返回None"""
+        now = now or datetime.now()
+        state = self._state(collector.collector_name)
+        if state is None or now - state['scanned_at'] > timedelta(hours=self.freshness_hours(collector)):
+            return None
+        return [dict(service) for service in state['services']]
+
+    def status(self):
+        """各收集器最近一次扫描时间和下次刷新时间 (包括其他进程的扫描)"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT collector, scanned_at, next_due, json_array_length(services) FROM collector_cadence
+                WHERE account_id = ?
+            ''', (self.account_id,)).fetchall()
+        return {name: {'scanned_at': scanned_at, 'next_due': next_due, 'resources': resources}
+                for name, scanned_at, next_due, resources in rows}
@@ -8,6 +8,9 @@ from .base_collector import BaseCollector
 
 
 class CloudFrontCollector(BaseCollector):
+    refresh_hours = 6
+    freshness_hours = 24
+    
     def scan_region(self, region):
         """CloudFront是全球服务，只在us-east-1扫描"""
         if region != 'us-east-1':
@@ -36,9 +39,10 @@ class CloudFrontCollector(BaseCollector):
                         })
                         
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"扫描CloudFront失败: {e}")
         return services
     
     def scan_all_regions(self):
         """CloudFront只需要扫描一次"""
-        return self.scan_region('us-east-1')
\ No newline at end of file
+        return self.timed_scan_region('us-east-1')
\ No newline at end of file
@@ -4,50 +4,200 @@
 DynamoDB资源收集器
 """
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from .base_collector import BaseCollector
+from datetime import datetime, timedelta, timezone
+from monitoring.tracing import wrap_context
+from utils.rate_limit import RateLimiter
 
 
 class DynamoDBCollector(BaseCollector):
+    refresh_hours = 6
+    freshness_hours = 24
+    
+    # 表的计费模式、表类别、索引等基本不变，每天重新describe一次；
+    # 预置容量 (可能被自动扩缩容调整) 和用量每次从CloudWatch读取
+    METADATA_HOURS = 24
+    # describe_table的并发数和每秒请求数
+    DESCRIBE_WORKERS = 8
+    DESCRIBE_RATE = 50
+    # get_metric_data每次最多500个查询
+    METRIC_BATCH = 500
+    
+    def __init__(self, session=None, price_manager=None):
+        super().__init__(session, price_manager)
+        # 区域 -> {表名: (describe时间, 表信息)}
+        self._tables = {}
+        self._describe_limiter = RateLimiter(self.DESCRIBE_RATE)
+    
+    def _list_table_names(self, dynamodb):
+        names = []
+        for page in dynamodb.get_paginator('list_tables').paginate():
+            names.extend(page['TableNames'])
+        return names
+    
+    def _describe(self, dynamodb, name):
+        """表的静态信息；表已删除时返回None"""
+        self._describe_limiter.acquire()
+        try:
+            table = dynamodb.describe_table(TableName=name)['Table']
+        except dynamodb.exceptions.ResourceNotFoundException:
+            return None
+        
+        billing_mode = table.get('BillingModeSummary', {}).get('BillingMode', 'PROVISIONED')
+        throughput = table.get('ProvisionedThroughput', {})
+        return {
+            'status': table['TableStatus'],
+            'billing_mode': billing_mode,
+            'table_class': table.get('TableClassSummary', {}).get('TableClass', 'STANDARD'),
+            'read_capacity': throughput.get('ReadCapacityUnits', 0),
+            'write_capacity': throughput.get('WriteCapacityUnits', 0),
+            'size_bytes': table.get('TableSizeBytes', 0),
+            'indexes': [{
+                'name': index['IndexName'],
+                'read_capacity': index.get('ProvisionedThroughput', {}).get('ReadCapacityUnits', 0),
+                'write_capacity': index.get('ProvisionedThroughput', {}).get('WriteCapacityUnits', 0),
+                'size_bytes': index.get('IndexSizeBytes', 0)
+            } for index in table.get('GlobalSecondaryIndexes', [])]
+        }
+    
+    def _get_tables(self, dynamodb, region):
+        """区域内所有表的信息，只对新表和信息过期的表并发调用describe_table"""
+        now = time.time()
+        previous = self._tables.get(region, {})
+        names = self._list_table_names(dynamodb)
+        
+        tables = {}
+        stale = []
+        for name in names:
+            cached = previous.get(name)
+            if cached and now - cached[0] < self.METADATA_HOURS * 3600:
+                tables[name] = cached
+            else:
+                stale.append(name)
+        
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(self.DESCRIBE_WORKERS, len(stale))) as executor:
+                futures = [executor.submit(wrap_context(self._describe), dynamodb, name) for name in stale]
+                for name, future in zip(stale, futures):
+                    try:
+                        table = future.result()
+                    except Exception as e:
+                        # describe失败时沿用上次的信息
+                        print(f"获取DynamoDB表 {name} 信息失败 ({region}): {e}")
+                        if name in previous:
+                            tables[name] = previous[name]
+                        continue
+                    if table is not None:
+                        tables[name] = (now, table)
+        
+        # 已删除的表不再缓存
+        self._tables[region] = tables
+        return {name: entry[1] for name, entry in tables.items()}
+    
+    def _get_usage(self, cloudwatch, tables):
+        """批量获取过去24小时表和全局二级索引的消耗容量 (Sum) 以及预置容量 (Average)
+        返回 {(表名, 索引名或None): {指标名: 值}}"""
+        queries = []
+        for name, table in tables.items():
+            provisioned = table['billing_mode'] != 'PAY_PER_REQUEST'
+            for index_name in [None] + [index['name'] for index in table['indexes']]:
+                dimensions = [{'Name': 'TableName', 'Value': name}]
+                if index_name:
+                    dimensions.append({'Name': 'GlobalSecondaryIndexName', 'Value': index_name})
+                metrics = [('ConsumedReadCapacityUnits', 'Sum'), ('ConsumedWriteCapacityUnits', 'Sum')]
+                if provisioned:
+                    metrics += [('ProvisionedReadCapacityUnits', 'Average'), ('ProvisionedWriteCapacityUnits', 'Average')]
+                for metric, stat in metrics:
+                    queries.append(((name, index_name), metric, stat, {
+                        'Namespace': 'AWS/DynamoDB', 'MetricName': metric, 'Dimensions': dimensions
+                    }))
+        
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=24)
+        usage = {}
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        for start in range(0, len(queries), self.METRIC_BATCH):
+            batch = queries[start:start + self.METRIC_BATCH]
+            values = {}
+            for page in paginator.paginate(MetricDataQueries=[{
+                'Id': f'm{index}',
+                'MetricStat': {'Metric': metric, 'Period': 86400, 'Stat': stat},
+                'ReturnData': True
+            } for index, (_, _, stat, metric) in enumerate(batch)], StartTime=start_time, EndTime=end_time):
+                for result in page['MetricDataResults']:
+                    values.setdefault(result['Id'], []).extend(result.get('Values') or [])
+            
+            for index, (target, metric, stat, _) in enumerate(batch):
+                points = values.get(f'm{index}')
+                if not points:
+                    continue
+                usage.setdefault(target, {})[metric] = sum(points) if stat == 'Sum' else sum(points) / len(points)
+        return usage
+    
     def scan_region(self, region):
         """扫描单个区域的DynamoDB表"""
         services = []
         try:
             dynamodb = self.get_client('dynamodb', region)
-            tables = dynamodb.list_tables()
+            cloudwatch = self.get_client('cloudwatch', region)
             
-            for table_name in tables['TableNames']:
-                try:
-                    table_info = dynamodb.describe_table(TableName=table_name)
-                    table = table_info['Table']
-                    
-                    if table['TableStatus'] == 'ACTIVE':
-                        billing_mode = table.get('BillingModeSummary', {}).get('BillingMode', 'PROVISIONED')
-                        
-                        if billing_mode == 'PAY_PER_REQUEST':
-                            # 按需计费模式 - 基础成本很低
-                            hourly_cost = 0.001
-                            instance_type = "On-Demand"
-                        else:
-                            # 预置容量模式
-                            read_capacity = table.get('ProvisionedThroughput', {}).get('ReadCapacityUnits', 0)
-                            write_capacity = table.get('ProvisionedThroughput', {}).get('WriteCapacityUnits', 0)
-                            
-                            # RCU: $0.00013/小时, WCU: $0.00065/小时
-                            hourly_cost = (read_capacity * 0.00013) + (write_capacity * 0.00065)
-                            instance_type = f"Provisioned (R:{read_capacity}, W:{write_capacity})"
-                        
-                        services.append({
-                            'service': 'DynamoDB',
-                            'resource_id': table_name,
-                            'region': region,
-                            'instance_type': instance_type,
-                            'hourly_cost': hourly_cost,
-                            'daily_cost': hourly_cost * 24
-                        })
-                except Exception:
-                    continue
-                    
+            tables = {name: table for name, table in self._get_tables(dynamodb, region).items()
+                      if table['status'] == 'ACTIVE'}
+            usage = self._get_usage(cloudwatch, tables) if tables else {}
+            
+            for name, table in tables.items():
+                prices = self.price_manager.get_dynamodb_price(table['table_class'], region)
+                targets = [(None, table)] + [(index['name'], index) for index in table['indexes']]
+                
+                consumed_read = consumed_write = 0.0
+                capacity_cost = 0.0
+                read_capacity = write_capacity = 0.0
+                for index_name, target in targets:
+                    metrics = usage.get((name, index_name), {})
+                    consumed_read += metrics.get('ConsumedReadCapacityUnits', 0)
+                    consumed_write += metrics.get('ConsumedWriteCapacityUnits', 0)
+                    if table['billing_mode'] != 'PAY_PER_REQUEST':
+                        # 表和每个全局二级索引分别预置容量；没有指标时使用describe的值
+                        read = metrics.get('ProvisionedReadCapacityUnits', target['read_capacity'])
+                        write = metrics.get('ProvisionedWriteCapacityUnits', target['write_capacity'])
+                        read_capacity += read
+                        write_capacity += write
+                        capacity_cost += read * prices['rcu_hour'] + write * prices['wcu_hour']
+                
+                if table['billing_mode'] == 'PAY_PER_REQUEST':
+                    # 按需模式: 消耗的容量单位即请求单位
+                    daily_request_cost = (consumed_read * prices['read_request_unit']
+                                          + consumed_write * prices['write_request_unit'])
+                    instance_type = "On-Demand"
+                else:
+                    daily_request_cost = capacity_cost * 24
+                    instance_type = f"Provisioned (R:{read_capacity:g}, W:{write_capacity:g})"
+                
+                # 存储包括表和全局二级索引
+                size_gb = (table['size_bytes'] + sum(index['size_bytes'] for index in table['indexes'])) / (1024**3)
+                daily_storage_cost = size_gb * prices['storage_gb_month'] / 30
+                daily_cost = daily_request_cost + daily_storage_cost
+                
+                services.append({
+                    'service': 'DynamoDB',
+                    'resource_id': name,
+                    'region': region,
+                    'instance_type': instance_type,
+                    'resource_type': 'On-Demand' if table['billing_mode'] == 'PAY_PER_REQUEST' else 'Provisioned',
+                    'hourly_cost': daily_cost / 24,
+                    'daily_cost': daily_cost,
+                    'table_class': table['table_class'],
+                    'size_gb': round(size_gb, 3),
+                    'global_indexes': len(table['indexes']),
+                    'consumed_read_units': round(consumed_read, 1),
+                    'consumed_write_units': round(consumed_write, 1)
+                })
+        
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描DynamoDB失败 ({region}): {e}")
             else:
@@ -57,6 +207,6 @@ class DynamoDBCollector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的DynamoDB表"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
-        return all_services
\ No newline at end of file
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
+        return all_services
@@ -4,42 +4,255 @@
 EBS资源收集器
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 from .base_collector import BaseCollector
+from .snapshot_lineage import SnapshotLineageStore
+from monitoring.tracing import wrap_context
+from utils.rate_limit import RateLimiter
+
+
+# 计费的卷状态 (未挂载的available卷同样计费)
+BILLED_VOLUME_STATES = ('creating', 'available', 'in-use')
+
+# gp3包含的IOPS和吞吐量(MB/s)
+GP3_BASELINE_IOPS = 3000
+GP3_BASELINE_THROUGHPUT = 125
+
+# 快照源卷未知时 (例如从其他账号复制的快照)，describe_snapshots返回的卷ID
+UNKNOWN_VOLUME_ID = 'vol-ffffffff'
 
 
 class EBSCollector(BaseCollector):
+    # EBS direct API (ListChangedBlocks) 的并发数、每秒请求数，以及每次扫描最多测量的新快照数；
+    # 其余新快照先按估算大小计价，下次扫描继续测量
+    SNAPSHOT_WORKERS = 4
+    SNAPSHOT_API_RATE = 40
+    SNAPSHOTS_PER_SCAN = 50
+    # 尚未测量的后续快照按卷大小的比例估算增量
+    ESTIMATED_CHANGE_RATIO = 0.1
+    
+    def __init__(self, session=None, price_manager=None):
+        super().__init__(session, price_manager)
+        # 快照创建后内容不再变化，增量大小保存在SnapshotLineageStore中，只有父快照改变 (中间的快照被删除) 时才重新测量
+        self.lineage_store = None
+        self._snapshot_limiter = RateLimiter(self.SNAPSHOT_API_RATE)
+        # 没有EBS direct API权限时不再尝试测量，全部按估算大小计价
+        self._measure_snapshots = True
+    
+    def build_service(self, volume, region):
+        """把describe_volumes返回的卷转换为成本记录 (容量 + 预置IOPS/吞吐量)"""
+        size_gb = volume['Size']
+        volume_type = volume['VolumeType']
+        iops = volume.get('Iops') or 0
+        throughput = volume.get('Throughput') or 0
+        
+        monthly_cost = size_gb * self.price_manager.get_ebs_price(volume_type, region)
+        if volume_type == 'gp3':
+            monthly_cost += self.price_manager.get_ebs_iops_price('gp3', max(0, iops - GP3_BASELINE_IOPS), region)
+            monthly_cost += max(0, throughput - GP3_BASELINE_THROUGHPUT) * self.price_manager.get_ebs_throughput_price(region)
+        elif volume_type in ('io1', 'io2'):
+            monthly_cost += self.price_manager.get_ebs_iops_price(volume_type, iops, region)
+        daily_cost = monthly_cost / 30
+        hourly_cost = daily_cost / 24
+        
+        service = {
+            'service': 'EBS',
+            'resource_id': volume['VolumeId'],
+            'region': region,
+            'instance_type': f"{volume_type} {size_gb}GB",
+            'hourly_cost': hourly_cost,
+            'daily_cost': daily_cost,
+            'state': volume['State']
+        }
+        if volume_type in ('gp3', 'io1', 'io2'):
+            service['iops'] = iops
+        if volume_type == 'gp3':
+            service['throughput'] = throughput
+        if volume['State'] == 'available':
+            # 未挂载到任何实例的卷
+            service['unattached'] = True
+        return service
+    
+    def describe_resources(self, region, volume_ids):
+        """只查询指定的卷 (事件驱动更新用)，返回其中计费的卷"""
+        ec2 = self.get_client('ec2', region)
+        response = ec2.describe_volumes(VolumeIds=list(volume_ids))
+        return [self.build_service(volume, region) for volume in response['Volumes']
+                if volume['State'] in BILLED_VOLUME_STATES]
+    
+    def _list_volumes(self, ec2):
+        volumes = []
+        for page in ec2.get_paginator('describe_volumes').paginate(PaginationConfig={'PageSize': 500}):
+            volumes.extend(page['Volumes'])
+        return volumes
+    
+    def _list_snapshots(self, ec2):
+        snapshots = []
+        paginator = ec2.get_paginator('describe_snapshots')
+        for page in paginator.paginate(OwnerIds=['self'], PaginationConfig={'PageSize': 1000}):
+            snapshots.extend(page['Snapshots'])
+        return snapshots
+    
+    def _get_lineage_store(self):
+        if self.lineage_store is None:
+            self.lineage_store = SnapshotLineageStore()
+        return self.lineage_store
+    
+    def _count_changed_blocks(self, ebs, snapshot_id, parent_id):
+        """快照相对父快照新增/修改的数据量(GB)"""
+        changed_bytes = 0
+        next_token = None
+        while True:
+            self._snapshot_limiter.acquire()
+            params = {'MaxResults': 10000}
+            if next_token:
+                params['NextToken'] = next_token
+            response = ebs.list_changed_blocks(FirstSnapshotId=parent_id, SecondSnapshotId=snapshot_id, **params)
+            # 只在第一个快照中存在的块已被删除，不占用新快照的空间
+            blocks = [block for block in response.get('ChangedBlocks', []) if block.get('SecondBlockToken')]
+            changed_bytes += len(blocks) * response.get('BlockSize', 524288)
+            next_token = response.get('NextToken')
+            if not next_token:
+                return changed_bytes / (1024**3)
+    
+    def _snapshot_sizes(self, region, snapshots):
+        """按源卷串联快照 (按创建时间排序)，返回 {快照ID: (GB, 是否为估算值)}
+        链中的第一个快照按describe_snapshots的FullSnapshotSizeInBytes计算全部数据；
+        之后的快照只对尚未测量过的调用ListChangedBlocks，其余读取SnapshotLineageStore"""
+        store = self._get_lineage_store()
+        previous = store.load(self.account_id, region)
+        sizes = {}
+        pending = []
+        by_volume = {}
+        for snapshot in snapshots:
+            by_volume.setdefault(snapshot.get('VolumeId') or UNKNOWN_VOLUME_ID, []).append(snapshot)
+        
+        for volume_id, chain in by_volume.items():
+            chain.sort(key=lambda s: s['StartTime'])
+            parent_id = None
+            for snapshot in chain:
+                # 来源未知的快照之间没有关系，各自按完整数据计算
+                parent = parent_id if volume_id != UNKNOWN_VOLUME_ID else None
+                parent_id = snapshot['SnapshotId']
+                if parent is None:
+                    full_bytes = snapshot.get('FullSnapshotSizeInBytes')
+                    sizes[snapshot['SnapshotId']] = ((full_bytes / (1024**3), False) if full_bytes
+                                                     else (snapshot['VolumeSize'], True))
+                    continue
+                cached = previous.get(snapshot['SnapshotId'])
+                if cached and cached['parent'] == parent:
+                    sizes[snapshot['SnapshotId']] = (cached['incremental_gb'], False)
+                else:
+                    pending.append((snapshot, parent))
+        
+        # 每次扫描最多测量SNAPSHOTS_PER_SCAN个新快照，先测量较早的
+        pending.sort(key=lambda item: item[0]['StartTime'])
+        measure = pending[:self.SNAPSHOTS_PER_SCAN] if self._measure_snapshots else []
+        measured = {}
+        if measure:
+            ebs = self.get_client('ebs', region)
+            with ThreadPoolExecutor(max_workers=min(self.SNAPSHOT_WORKERS, len(measure))) as executor:
+                futures = [executor.submit(wrap_context(self._count_changed_blocks), ebs, snapshot['SnapshotId'], parent)
+                           for snapshot, parent in measure]
+                for (snapshot, parent), future in zip(measure, futures):
+                    try:
+                        measured[snapshot['SnapshotId']] = {'parent': parent, 'incremental_gb': future.result()}
+                    except Exception as e:
+                        if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'AccessDeniedException':
+                            self._measure_snapshots = False
+                        print(f"测量快照 {snapshot['SnapshotId']} 大小失败 ({region}): {e}")
+        
+        # 保存新测量的结果，已删除的快照不再保存
+        store.save(self.account_id, region, measured, {snapshot['SnapshotId'] for snapshot in snapshots})
+        
+        for snapshot, parent in pending:
+            entry = measured.get(snapshot['SnapshotId'])
+            if entry:
+                sizes[snapshot['SnapshotId']] = (entry['incremental_gb'], False)
+            else:
+                # 尚未测量的后续快照按卷大小的比例估算
+                sizes[snapshot['SnapshotId']] = (snapshot['VolumeSize'] * self.ESTIMATED_CHANGE_RATIO, True)
+        return sizes
+    
+    def _snapshot_services(self, region, snapshots, volume_ids):
+        """按源卷汇总的快照成本记录"""
+        completed = [s for s in snapshots if s.get('State') == 'completed']
+        if not completed:
+            self._get_lineage_store().save(self.account_id, region, {}, set())
+            return []
+        
+        # 归档层按完整快照计费，不参与增量链
+        standard = [s for s in completed if s.get('StorageTier', 'standard') != 'archive']
+        archived = [s for s in completed if s.get('StorageTier', 'standard') == 'archive']
+        sizes = self._snapshot_sizes(region, standard)
+        
+        groups = {}
+        for snapshot in standard + archived:
+            volume_id = snapshot.get('VolumeId') or UNKNOWN_VOLUME_ID
+            group = groups.setdefault(volume_id, {
+                'count': 0, 'size_gb': 0.0, 'monthly_cost': 0.0, 'estimated': 0, 'oldest': snapshot['StartTime']
+            })
+            if snapshot.get('StorageTier', 'standard') == 'archive':
+                tier = 'archive'
+                full_bytes = snapshot.get('FullSnapshotSizeInBytes')
+                size_gb = full_bytes / (1024**3) if full_bytes else snapshot['VolumeSize']
+            else:
+                tier = 'standard'
+                size_gb, estimated = sizes[snapshot['SnapshotId']]
+                group['estimated'] += int(estimated)
+            group['count'] += 1
+            group['size_gb'] += size_gb
+            group['monthly_cost'] += size_gb * self.price_manager.get_ebs_snapshot_price(tier, region)
+            group['oldest'] = min(group['oldest'], snapshot['StartTime'])
+        
+        services = []
+        for volume_id, group in groups.items():
+            daily_cost = group['monthly_cost'] / 30
+            service = {
+                'service': 'EBS',
+                'resource_id': f"{volume_id}/snapshots",
+                'region': region,
+                'instance_type': f"Snapshots x{group['count']} {group['size_gb']:.1f}GB",
+                'resource_type': 'Snapshots',
+                'hourly_cost': daily_cost / 24,
+                'daily_cost': daily_cost,
+                'snapshot_count': group['count'],
+                'snapshot_gb': round(group['size_gb'], 3),
+                'oldest_snapshot': group['oldest'].isoformat(),
+                # 源卷已删除的快照通常可以清理
+                'source_volume_exists': volume_id in volume_ids
+            }
+            if group['estimated']:
+                service['estimated_snapshots'] = group['estimated']
+            services.append(service)
+        return services
+    
     def scan_region(self, region):
-        """扫描单个区域的EBS卷"""
+        """扫描单个区域的EBS卷和快照 (卷和快照并行分页查询)"""
         services = []
         try:
             ec2 = self.get_client('ec2', region)
-            response = ec2.describe_volumes()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                volumes_future = executor.submit(wrap_context(self._list_volumes), ec2)
+                snapshots_future = executor.submit(wrap_context(self._list_snapshots), ec2)
+                volumes = volumes_future.result()
+                snapshots = snapshots_future.result()
+            
+            for volume in volumes:
+                if volume['State'] in BILLED_VOLUME_STATES:
+                    services.append(self.build_service(volume, region))
             
-            for volume in response['Volumes']:
-                if volume['State'] == 'in-use':
-                    size_gb = volume['Size']
-                    volume_type = volume['VolumeType']
-                    
-                    price_per_gb = self.price_manager.get_ebs_price(volume_type, region)
-                    monthly_cost = size_gb * price_per_gb
-                    daily_cost = monthly_cost / 30
-                    hourly_cost = daily_cost / 24
-                    
-                    services.append({
-                        'service': 'EBS',
-                        'resource_id': volume['VolumeId'],
-                        'region': region,
-                        'instance_type': f"{volume_type} {size_gb}GB",
-                        'hourly_cost': hourly_cost,
-                        'daily_cost': daily_cost
-                    })
+            volume_ids = {volume['VolumeId'] for volume in volumes}
+            services.extend(self._snapshot_services(region, snapshots, volume_ids))
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"扫描EBS失败 ({region}): {e}")
         return services
     
     def scan_all_regions(self):
         """扫描所有区域的EBS卷"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
-        return all_services
\ No newline at end of file
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
+        return all_services
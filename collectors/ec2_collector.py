@@ -8,6 +8,28 @@ from .base_collector import BaseCollector
 
 
 class EC2Collector(BaseCollector):
+    def build_service(self, instance, region):
+        """把describe_instances返回的实例转换为成本记录"""
+        hourly_cost = self.price_manager.get_ec2_price(instance['InstanceType'], region)
+        return {
+            'service': 'EC2',
+            'resource_id': instance['InstanceId'],
+            'region': region,
+            'instance_type': instance['InstanceType'],
+            'hourly_cost': hourly_cost,
+            'daily_cost': hourly_cost * 24
+        }
+    
+    def describe_resources(self, region, instance_ids):
+        """只查询指定的实例 (事件驱动更新用)，返回其中运行中的实例"""
+        ec2 = self.get_client('ec2', region)
+        response = ec2.describe_instances(
+            InstanceIds=list(instance_ids),
+            Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
+        )
+        return [self.build_service(instance, region)
+                for reservation in response['Reservations'] for instance in reservation['Instances']]
+    
     def scan_region(self, region):
         """扫描单个区域的EC2实例"""
         services = []
@@ -19,15 +41,7 @@ class EC2Collector(BaseCollector):
             
             for reservation in response['Reservations']:
                 for instance in reservation['Instances']:
-                    hourly_cost = self.price_manager.get_ec2_price(instance['InstanceType'], region)
-                    services.append({
-                        'service': 'EC2',
-                        'resource_id': instance['InstanceId'],
-                        'region': region,
-                        'instance_type': instance['InstanceType'],
-                        'hourly_cost': hourly_cost,
-                        'daily_cost': hourly_cost * 24
-                    })
+                    services.append(self.build_service(instance, region))
         except Exception as e:
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描EC2失败 ({region}): {e}")
@@ -38,6 +52,6 @@ class EC2Collector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的EC2实例"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
         return all_services
\ No newline at end of file
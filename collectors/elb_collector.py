@@ -8,6 +8,28 @@ from .base_collector import BaseCollector
 
 
 class ELBCollector(BaseCollector):
+    def build_service(self, lb, region, classic=False):
+        """把负载均衡器描述 (LoadBalancerName/Type/Scheme) 转换为成本记录"""
+        # ALB/NLB: $0.0225/小时, Classic ELB: $0.025/小时
+        hourly_cost = 0.025 if classic else 0.0225
+        
+        # 面向互联网的负载均衡器有Public IP成本
+        if lb.get('Scheme') == 'internet-facing':
+            hourly_cost += self.price_manager.get_public_ip_price(region)
+        
+        if classic:
+            instance_type = f"Classic ({lb.get('Scheme', 'internal')})"
+        else:
+            instance_type = f"{lb['Type'].upper()} ({lb.get('Scheme', 'internal')})"
+        return {
+            'service': 'ELB',
+            'resource_id': lb['LoadBalancerName'],
+            'region': region,
+            'instance_type': instance_type,
+            'hourly_cost': hourly_cost,
+            'daily_cost': hourly_cost * 24
+        }
+    
     def scan_region(self, region):
         """扫描单个区域的负载均衡器"""
         services = []
@@ -18,22 +40,7 @@ class ELBCollector(BaseCollector):
             
             for lb in load_balancers['LoadBalancers']:
                 if lb['State']['Code'] == 'active':
-                    lb_type = lb['Type']
-                    # ALB: $0.0225/小时, NLB: $0.0225/小时
-                    hourly_cost = 0.0225
-                    
-                    # 面向互联网的负载均衡器有Public IP成本
-                    if lb.get('Scheme') == 'internet-facing':
-                        hourly_cost += self.price_manager.get_public_ip_price(region)
-                    
-                    services.append({
-                        'service': 'ELB',
-                        'resource_id': lb['LoadBalancerName'],
-                        'region': region,
-                        'instance_type': f"{lb_type.upper()} ({lb.get('Scheme', 'internal')})",
-                        'hourly_cost': hourly_cost,
-                        'daily_cost': hourly_cost * 24
-                    })
+                    services.append(self.build_service(lb, region))
             
             # Classic ELB
             try:
@@ -41,23 +48,12 @@ class ELBCollector(BaseCollector):
                 classic_lbs = elb.describe_load_balancers()
                 
                 for lb in classic_lbs['LoadBalancerDescriptions']:
-                    hourly_cost = 0.025  # Classic ELB价格
-                    
-                    if lb.get('Scheme') == 'internet-facing':
-                        hourly_cost += self.price_manager.get_public_ip_price(region)
-                    
-                    services.append({
-                        'service': 'ELB',
-                        'resource_id': lb['LoadBalancerName'],
-                        'region': region,
-                        'instance_type': f"Classic ({lb.get('Scheme', 'internal')})",
-                        'hourly_cost': hourly_cost,
-                        'daily_cost': hourly_cost * 24
-                    })
+                    services.append(self.build_service(lb, region, classic=True))
             except:
                 pass
                 
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描ELB失败 ({region}): {e}")
             else:
@@ -67,6 +63,6 @@ class ELBCollector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的负载均衡器"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
         return all_services
\ No newline at end of file
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件驱动的资源清单更新 - 消费CloudTrail资源生命周期事件，在两次完整扫描之间增量更新最新快照
+
+事件来源 (EVENT_FEED):
+- file:data/events.jsonl   每行一个事件的本地文件 (测试和离线回放用)
+- sqs:<队列URL>            EventBridge规则把CloudTrail管理事件投递到SQS队列
+
+每行/每条消息可以是EventBridge事件 ({"detail-type": ..., "detail": {...}})、
+单条CloudTrail记录，或CloudTrail日志文件格式 ({"Records": [...]})。
+创建类事件尽量直接使用事件中的资源描述，必要时只查询涉及的资源，不重新列出整个区域。
+"""
+
+import json
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+
+
+def get_event_config():
+    """事件驱动更新配置"""
+    return {
+        'feed': os.getenv('EVENT_FEED', ''),
+        'poll_seconds': int(os.getenv('EVENT_POLL_SECONDS', 30))
+    }
+
+
+def get_event_feed(session=None, feed=None):
+    """按配置创建事件来源，未配置时返回None"""
+    feed = feed if feed is not None else get_event_config()['feed']
+    if not feed:
+        return None
+    kind, _, target = feed.partition(':')
+    if kind == 'file':
+        return FileEventFeed(target)
+    if kind == 'sqs':
+        return SQSEventFeed(session, target)
+    raise ValueError(f"不支持的事件来源: {feed} (应为 file:<路径> 或 sqs:<队列URL>)")
+
+
+def parse_events(payload):
+    """从一条消息中取出CloudTrail事件"""
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+    if 'Records' in payload:
+        return list(payload['Records'])
+    if 'detail' in payload:
+        return [payload['detail']]
+    return [payload]
+
+
+def event_local_time(event):
+    """CloudTrail的eventTime (UTC) 转换为与快照相同的本地时间字符串"""
+    event_time = event.get('eventTime')
+    if not event_time:
+        return datetime.now().isoformat()
+    parsed = datetime.fromisoformat(event_time.replace('Z', '+00:00'))
+    return parsed.astimezone().replace(tzinfo=None).isoformat()
+
+
+class FileEventFeed:
+    """从JSON Lines文件读取新追加的事件，读取位置保存在 <文件>.offset 中"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset_path = path + '.offset'
+        self._pending_offset = None
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def poll(self, max_events=1000):
+        if not os.path.exists(self.path):
+            return []
+        events = []
+        with open(self.path, encoding='utf-8') as f:
+            f.seek(self._read_offset())
+            while len(events) < max_events:
+                line = f.readline()
+                # 只处理完整的行，写了一半的行留到下次
+                if not line or not line.endswith('\n'):
+                    break
+                self._pending_offset = f.tell()
+                if line.strip():
+                    try:
+                        events.extend(parse_events(line))
+                    except ValueError as e:
+                        print(f"跳过无法解析的事件: {e}")
+        return events
+
+    def ack(self):
+        """事件处理成功后提交读取位置"""
+        if self._pending_offset is not None:
+            with open(self.offset_path, 'w', encoding='utf-8') as f:
+                f.write(str(self._pending_offset))
+            self._pending_offset = None
+
+
+class SQSEventFeed:
+    """从SQS队列接收EventBridge投递的CloudTrail事件，处理成功后删除消息"""
+
+    def __init__(self, session, queue_url):
+        self.queue_url = queue_url
+        region = queue_url.split('.')[1] if queue_url.startswith('https://sqs.') else None
+        self.sqs = session.client('sqs', region_name=region)
+        self._receipts = []
+
+    def poll(self, max_events=1000):
+        events = []
+        while len(events) < max_events:
+            response = self.sqs.receive_message(
+                QueueUrl=self.queue_url, MaxNumberOfMessages=10, WaitTimeSeconds=1 if events else 5
+            )
+            messages = response.get('Messages', [])
+            if not messages:
+                break
+            for message in messages:
+                self._receipts.append(message['ReceiptHandle'])
+                try:
+                    events.extend(parse_events(message['Body']))
+                except ValueError as e:
+                    print(f"跳过无法解析的事件: {e}")
+        return events
+
+    def ack(self):
+        for start in range(0, len(self._receipts), 10):
+            self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=[
+                {'Id': str(index), 'ReceiptHandle': receipt}
+                for index, receipt in enumerate(self._receipts[start:start + 10])
+            ])
+        self._receipts = []
+
+
+def _items(container, key):
+    """CloudTrail中的列表参数: {"items": [...]}"""
+    return ((container or {}).get(key) or {}).get('items') or []
+
+
+def _load_balancer_name(arn):
+    """arn:aws:elasticloadbalancing:...:loadbalancer/app/<名称>/<id> -> 名称"""
+    return arn.split(':loadbalancer/')[-1].split('/')[1]
+
+
+class InventoryEventHandler:
+    """把CloudTrail事件转换为资源清单变化
+
+    collectors为收集器名称 (EC2/EBS/RDS/ELB) 到收集器的映射，用于计算成本和查询单个资源
+    """
+
+    # 事件名称 -> 处理方法
+    EVENTS = {
+        'RunInstances': '_run_instances',
+        'StartInstances': '_start_instances',
+        'StopInstances': '_stop_instances',
+        'TerminateInstances': '_stop_instances',
+        'CreateVolume': '_refresh_volumes',
+        'AttachVolume': '_refresh_volumes',
+        'DetachVolume': '_refresh_volumes',
+        'DeleteVolume': '_remove_volumes',
+        'CreateDBInstance': '_create_db_instance',
+        'DeleteDBInstance': '_delete_db_instance',
+        'CreateLoadBalancer': '_create_load_balancer',
+        'DeleteLoadBalancer': '_delete_load_balancer'
+    }
+
+    def __init__(self, collectors):
+        self.collectors = collectors
+
+    def handle(self, event):
+        """返回 (新增或变化的资源列表, 删除的资源列表)；不关心的事件返回 None"""
+        handler = self.EVENTS.get(event.get('eventName'))
+        if handler is None or event.get('errorCode'):
+            return None
+        return getattr(self, handler)(event, event['awsRegion'])
+
+    def _run_instances(self, event, region):
+        instances = _items(event.get('responseElements'), 'instancesSet')
+        return [self.collectors['EC2'].build_service(
+            {'InstanceId': item['instanceId'], 'InstanceType': item['instanceType']}, region
+        ) for item in instances], []
+
+    def _start_instances(self, event, region):
+        instance_ids = [item['instanceId'] for item in _items(event.get('requestParameters'), 'instancesSet')]
+        return self.collectors['EC2'].describe_resources(region, instance_ids), []
+
+    def _stop_instances(self, event, region):
+        return [], [('EC2', item['instanceId'], region)
+                    for item in _items(event.get('requestParameters'), 'instancesSet')]
+
+    def _volume_id(self, event):
+        return (event.get('responseElements') or {}).get('volumeId') or event['requestParameters']['volumeId']
+
+    def _refresh_volumes(self, event, region):
+        # 未挂载的卷同样计费，创建/挂载/卸载后查询该卷的当前配置
+        return self.collectors['EBS'].describe_resources(region, [self._volume_id(event)]), []
+
+    def _remove_volumes(self, event, region):
+        return [], [('EBS', self._volume_id(event), region)]
+
+    def _create_db_instance(self, event, region):
+        params = event['requestParameters']
+        return [self.collectors['RDS'].build_service({
+            'DBInstanceIdentifier': params['dBInstanceIdentifier'],
+            'DBInstanceClass': params['dBInstanceClass'],
+            'Engine': params.get('engine'),
+            'LicenseModel': params.get('licenseModel'),
+            'MultiAZ': params.get('multiAZ', False),
+            'AllocatedStorage': params.get('allocatedStorage'),
+            'StorageType': params.get('storageType'),
+            'Iops': params.get('iops'),
+            'StorageThroughput': params.get('storageThroughput')
+        }, region)], []
+
+    def _delete_db_instance(self, event, region):
+        return [], [('RDS', event['requestParameters']['dBInstanceIdentifier'], region)]
+
+    def _create_load_balancer(self, event, region):
+        response = event.get('responseElements') or {}
+        if response.get('loadBalancers'):
+            return [self.collectors['ELB'].build_service({
+                'LoadBalancerName': lb['loadBalancerName'], 'Type': lb['type'], 'Scheme': lb.get('scheme')
+            }, region) for lb in response['loadBalancers']], []
+        # Classic ELB
+        params = event['requestParameters']
+        return [self.collectors['ELB'].build_service({
+            'LoadBalancerName': params['loadBalancerName'], 'Scheme': params.get('scheme', 'internet-facing')
+        }, region, classic=True)], []
+
+    def _delete_load_balancer(self, event, region):
+        params = event['requestParameters']
+        name = params.get('loadBalancerName') or _load_balancer_name(params['loadBalancerArn'])
+        return [], [('ELB', name, region)]
+
+
+class EventInventoryUpdater:
+    """从事件来源读取一批事件，并把资源变化应用到最新快照"""
+
+    # 完整扫描开始超过该时间仍未保存结果时视为已中断 (进程崩溃)，不再暂停事件
+    SCAN_TIMEOUT = timedelta(hours=2)
+
+    def __init__(self, feed, db_manager, resolve_account, logger=None):
+        """resolve_account(事件中的账号ID): 返回 (记录使用的账号ID, 收集器列表)，未知账号返回None"""
+        self.feed = feed
+        self.db_manager = db_manager
+        self.resolve_account = resolve_account
+        self.logger = logger
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _scan_in_progress(self, summary, now=None):
+        started_at = summary and summary.get('scan_started_at')
+        if not started_at:
+            return False
+        return (now or datetime.now()) - datetime.fromisoformat(started_at) < self.SCAN_TIMEOUT
+
+    def process(self, max_events=1000):
+        """处理一批事件，返回统计信息"""
+        # 快照时间是完整扫描开始的时间；扫描进行中时事件留在来源中 (不读取也不确认)，
+        # 否则应用的变化会被即将保存的扫描结果整体覆盖
+        summary = self.db_manager.get_latest_summary()
+        if self._scan_in_progress(summary):
+            return {'events': 0, 'deferred': 1}
+        snapshot_time = summary['timestamp'] if summary else None
+
+        events = self.feed.poll(max_events)
+        stats = Counter(events=len(events))
+        if not events:
+            return dict(stats)
+
+        added = {}
+        removed = {}
+        handlers = {}
+        latest_time = None
+        for event in sorted(events, key=lambda e: e.get('eventTime', '')):
+            event_time = event_local_time(event)
+            # 完整扫描开始之前发生的事件已经反映在快照中
+            if snapshot_time and event_time < snapshot_time:
+                stats['stale'] += 1
+                continue
+
+            event_account = event.get('recipientAccountId') or (event.get('userIdentity') or {}).get('accountId') or ''
+            if event_account not in handlers:
+                resolved = self.resolve_account(event_account)
+                handlers[event_account] = resolved and (resolved[0], InventoryEventHandler(
+                    {collector.collector_name: collector for collector in resolved[1]}
+                ))
+            if not handlers[event_account]:
+                stats['unknown_account'] += 1
+                continue
+
+            account_id, handler = handlers[event_account]
+            try:
+                changes = handler.handle(event)
+            except Exception as e:
+                stats['errors'] += 1
+                self._log(f"处理事件失败 ({event.get('eventName')}): {e}")
+                continue
+            if changes is None:
+                stats['ignored'] += 1
+                continue
+
+            # 同一资源的多个事件以最后一个为准
+            services, deleted = changes
+            for service in services:
+                service['account_id'] = account_id
+                key = (service['service'], service['resource_id'], service['region'], account_id)
+                removed.pop(key, None)
+                added[key] = service
+            for service, resource_id, region in deleted:
+                key = (service, resource_id, region, account_id)
+                added.pop(key, None)
+                removed[key] = key
+            stats['applied'] += 1
+            latest_time = max(latest_time or event_time, event_time)
+
+        if added or removed:
+            result = self.db_manager.apply_inventory_changes(latest_time, list(added.values()), list(removed.values()))
+            if result is None:
+                stats['no_snapshot'] += stats.pop('applied')
+            else:
+                stats['added'] = len(added)
+                stats['removed'] = len(removed)
+                self._log(f"事件更新: 新增/变化 {len(added)} 个资源, 删除 {len(removed)} 个, "
+                          f"当前每日${result['total_daily_cost']:.2f}")
+        self.feed.ack()
+        return dict(stats)
@@ -5,10 +5,70 @@ Lambda资源收集器
 """
 
 from .base_collector import BaseCollector
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
 
 class LambdaCollector(BaseCollector):
+    # get_metric_data每次最多500个查询，每个函数需要调用次数和执行时长两个查询
+    FUNCTIONS_PER_METRIC_BATCH = 250
+    
+    def __init__(self, session=None, price_manager=None):
+        super().__init__(session, price_manager)
+        # 区域 -> {函数ARN: (RevisionId, 计价配置)}；配置未变化的函数不重复解析和查价
+        self._profiles = {}
+    
+    def _pricing_profile(self, func, region, previous):
+        """函数的内存、架构、临时存储和对应的单价"""
+        revision = func.get('RevisionId') or func.get('LastModified')
+        cached = previous.get(func['FunctionArn'])
+        if cached and cached[0] == revision:
+            return cached
+        
+        architecture = (func.get('Architectures') or ['x86_64'])[0]
+        ephemeral_mb = (func.get('EphemeralStorage') or {}).get('Size', 512)
+        return revision, {
+            'memory_mb': func['MemorySize'],
+            'architecture': architecture,
+            # 512MB以内的临时存储免费
+            'extra_ephemeral_gb': max(0, ephemeral_mb - 512) / 1024,
+            'prices': self.price_manager.get_lambda_price(architecture, region)
+        }
+    
+    def _get_usage(self, cloudwatch, function_names):
+        """批量获取过去24小时的调用次数和总执行时长: {函数名: (调用次数, 总时长毫秒)}"""
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=24)
+        usage = {}
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        
+        for start in range(0, len(function_names), self.FUNCTIONS_PER_METRIC_BATCH):
+            batch = function_names[start:start + self.FUNCTIONS_PER_METRIC_BATCH]
+            queries = []
+            for index, name in enumerate(batch):
+                for prefix, metric in (('i', 'Invocations'), ('d', 'Duration')):
+                    queries.append({
+                        'Id': f'{prefix}{index}',
+                        'MetricStat': {
+                            'Metric': {
+                                'Namespace': 'AWS/Lambda',
+                                'MetricName': metric,
+                                'Dimensions': [{'Name': 'FunctionName', 'Value': name}]
+                            },
+                            'Period': 86400,
+                            'Stat': 'Sum'
+                        },
+                        'ReturnData': True
+                    })
+            
+            totals = {}
+            for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time):
+                for result in page['MetricDataResults']:
+                    totals[result['Id']] = totals.get(result['Id'], 0) + sum(result.get('Values') or [])
+            
+            for index, name in enumerate(batch):
+                usage[name] = (totals.get(f'i{index}', 0), totals.get(f'd{index}', 0))
+        return usage
+    
     def scan_region(self, region):
         """扫描单个区域的Lambda函数"""
         services = []
@@ -16,44 +76,46 @@ class LambdaCollector(BaseCollector):
             lambda_client = self.get_client('lambda', region)
             cloudwatch = self.get_client('cloudwatch', region)
             
-            response = lambda_client.list_functions()
+            functions = []
+            for page in lambda_client.get_paginator('list_functions').paginate():
+                functions.extend(page['Functions'])
+            
+            previous = self._profiles.get(region, {})
+            profiles = {func['FunctionArn']: self._pricing_profile(func, region, previous) for func in functions}
+            self._profiles[region] = profiles
+            
+            usage = self._get_usage(cloudwatch, [func['FunctionName'] for func in functions])
             
-            for func in response['Functions']:
-                try:
-                    # 获取过去24小时的调用次数
-                    metrics = cloudwatch.get_metric_statistics(
-                        Namespace='AWS/Lambda',
-                        MetricName='Invocations',
-                        Dimensions=[{'Name': 'FunctionName', 'Value': func['FunctionName']}],
-                        StartTime=datetime.now() - timedelta(hours=24),
-                        EndTime=datetime.now(),
-                        Period=3600,
-                        Statistics=['Sum']
-                    )
-                    
-                    total_invocations = sum(point['Sum'] for point in metrics['Datapoints']) if metrics['Datapoints'] else 0
-                    
-                    if total_invocations > 0:
-                        memory_gb = func['MemorySize'] / 1024
-                        avg_duration = 1000  # 假设平均执行1秒
-                        
-                        hourly_invocations = total_invocations / 24
-                        compute_cost = hourly_invocations * memory_gb * (avg_duration/1000) * 0.0000166667
-                        request_cost = hourly_invocations * 0.0000002
-                        hourly_cost = compute_cost + request_cost
-                        
-                        services.append({
-                            'service': 'Lambda',
-                            'resource_id': func['FunctionName'],
-                            'region': region,
-                            'instance_type': f"{func['MemorySize']}MB ({int(total_invocations)}次/24h)",
-                            'hourly_cost': hourly_cost,
-                            'daily_cost': hourly_cost * 24
-                        })
-                except Exception:
+            for func in functions:
+                total_invocations, total_duration_ms = usage.get(func['FunctionName'], (0, 0))
+                if total_invocations <= 0:
                     continue
-                    
+                
+                profile = profiles[func['FunctionArn']][1]
+                prices = profile['prices']
+                duration_seconds = total_duration_ms / 1000
+                gb_seconds = duration_seconds * profile['memory_mb'] / 1024
+                
+                compute_cost = gb_seconds * prices['gb_second']
+                request_cost = total_invocations * prices['request']
+                storage_cost = duration_seconds * profile['extra_ephemeral_gb'] * prices['ephemeral_gb_second']
+                daily_cost = compute_cost + request_cost + storage_cost
+                
+                services.append({
+                    'service': 'Lambda',
+                    'resource_id': func['FunctionName'],
+                    'region': region,
+                    'instance_type': f"{profile['memory_mb']}MB {profile['architecture']} ({int(total_invocations)}次/24h)",
+                    'resource_type': f"{profile['memory_mb']}MB {profile['architecture']}",
+                    'hourly_cost': daily_cost / 24,
+                    'daily_cost': daily_cost,
+                    'invocations': int(total_invocations),
+                    'avg_duration_ms': round(total_duration_ms / total_invocations, 2),
+                    'gb_seconds': round(gb_seconds, 3)
+                })
+        
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描Lambda失败 ({region}): {e}")
             else:
@@ -63,6 +125,6 @@ class LambdaCollector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的Lambda函数"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
-        return all_services
\ No newline at end of file
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
+        return all_services
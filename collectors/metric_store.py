@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CloudWatch指标数据点存储 - 30天回看窗口只拉取上次之后新增的数据点
+
+每个指标序列 (账号/区域/命名空间/指标/维度) 的每日数据点保存在本地SQLite (METRIC_STORE_PATH)。
+每次只请求最后一个已拉取的日期 (可能是未结束的当天) 到现在的数据，
+窗口合计随新数据点和过期数据点增量更新，不再每小时重新下载整个30天。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+def get_metric_store_path():
+    """指标数据点存储路径"""
+    return os.getenv('METRIC_STORE_PATH', 'data/metric_store.db')
+
+
+def series_key(account_id, region, namespace, metric, dimensions):
+    """指标序列标识"""
+    dims = ','.join(f"{d['Name']}={d['Value']}" for d in sorted(dimensions, key=lambda d: d['Name']))
+    return f"{account_id}/{region}/{namespace}/{metric}/{dims}"
+
+
+def _utc_day(timestamp):
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date().isoformat()
+
+
+class MetricStore:
+    def __init__(self, path=None, window_days=30):
+        self.path = path or get_metric_store_path()
+        self.window_days = window_days
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout=30000')
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._lock = threading.Lock()
+        self.init_store()
+
+    def init_store(self):
+        """初始化数据点表"""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_datapoints (
+                series TEXT NOT NULL,
+                day TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (series, day)
+            ) WITHOUT ROWID
+        ''')
+        # fetched_day: 最后一次拉取到的日期 (当天可能尚未结束，下次从这一天重新拉取)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_series (
+                series TEXT PRIMARY KEY,
+                fetched_day TEXT NOT NULL,
+                window_sum REAL NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+
+    def window_sum(self, cloudwatch, account_id, region, namespace, metric, dimensions, statistic='Sum', now=None):
+        """最近window_days天 (按UTC日期，含当天) 的指标合计，只向CloudWatch请求尚未存储的部分"""
+        now = now or datetime.now(timezone.utc)
+        today = now.date()
+        window_start = (today - timedelta(days=self.window_days - 1)).isoformat()
+        series = series_key(account_id, region, namespace, metric, dimensions)
+
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT fetched_day FROM metric_series WHERE series = ?', (series,)
+            ).fetchone()
+        fetch_start = max(window_start, row[0]) if row else window_start
+
+        # 起点对齐到UTC零点，每个数据点对应一个完整的日期
+        response = cloudwatch.get_metric_statistics(
+            Namespace=namespace,
+            MetricName=metric,
+            Dimensions=dimensions,
+            StartTime=datetime.fromisoformat(fetch_start).replace(tzinfo=timezone.utc),
+            EndTime=now,
+            Period=86400,
+            Statistics=[statistic]
+        )
+        values = {}
+        for point in response['Datapoints']:
+            day = _utc_day(point['Timestamp'])
+            if day >= fetch_start:
+                values[day] = values.get(day, 0.0) + point[statistic]
+
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 拉取期间其他进程 (调度器/scan_worker) 可能已更新同一序列，在写事务中重新读取当前合计
+                current = conn.execute(
+                    'SELECT window_sum FROM metric_series WHERE series = ?', (series,)
+                ).fetchone()
+                # 增量维护窗口合计: 减去过期和将被重新拉取的日期 (包括其他进程刚写入的)，加上新数据点
+                window_total = current[0] if current else 0.0
+                replaced = conn.execute('''
+                    SELECT COALESCE(SUM(value), 0) FROM metric_datapoints
+                    WHERE series = ? AND (day < ? OR day >= ?)
+                ''', (series, window_start, fetch_start)).fetchone()[0]
+                conn.execute('''
+                    DELETE FROM metric_datapoints WHERE series = ? AND (day < ? OR day >= ?)
+                ''', (series, window_start, fetch_start))
+                conn.executemany(
+                    'INSERT INTO metric_datapoints (series, day, value) VALUES (?, ?, ?)',
+                    [(series, day, value) for day, value in values.items()]
+                )
+                window_total = max(0.0, window_total - replaced + sum(values.values()))
+                conn.execute('''
+                    INSERT INTO metric_series (series, fetched_day, window_sum, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (series) DO UPDATE SET
+                        fetched_day = excluded.fetched_day,
+                        window_sum = excluded.window_sum,
+                        updated_at = excluded.updated_at
+                ''', (series, today.isoformat(), window_total, now.isoformat()))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return window_total
+
+    def prune(self, now=None):
+        """删除一个窗口期内都没有再查询过的序列 (资源已删除)"""
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=self.window_days)).isoformat()
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('''
+                    DELETE FROM metric_datapoints WHERE series IN (
+                        SELECT series FROM metric_series WHERE updated_at < ?
+                    )
+                ''', (cutoff,))
+                removed = conn.execute('DELETE FROM metric_series WHERE updated_at < ?', (cutoff,)).rowcount
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return removed
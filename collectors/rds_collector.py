@@ -5,28 +5,169 @@ RDS资源收集器
 """
 
 from .base_collector import BaseCollector
+from datetime import datetime, timedelta, timezone
 
 
 class RDSCollector(BaseCollector):
+    # get_metric_data每次最多500个查询
+    METRIC_BATCH = 500
+    
+    def _gp3_baseline(self, engine, allocated_gb):
+        """gp3存储包含的IOPS和吞吐量(MB/s)，超出部分单独计费"""
+        if engine.startswith('sqlserver') or allocated_gb < 400:
+            return 3000, 125
+        return 12000, 500
+    
+    def _storage_monthly_cost(self, db, region, multi_az):
+        """实例存储的月费用 (容量 + 预置IOPS/吞吐量)"""
+        storage_type = db.get('StorageType') or 'gp2'
+        allocated_gb = db.get('AllocatedStorage') or 0
+        prices = self.price_manager.get_rds_storage_price(storage_type, region, multi_az)
+        
+        cost = allocated_gb * prices['storage']
+        iops = db.get('Iops') or 0
+        if storage_type == 'gp3':
+            baseline_iops, baseline_throughput = self._gp3_baseline(db.get('Engine') or '', allocated_gb)
+            cost += max(0, iops - baseline_iops) * prices['iops']
+            cost += max(0, (db.get('StorageThroughput') or 0) - baseline_throughput) * prices['throughput']
+        elif 'iops' in prices:
+            cost += iops * prices['iops']
+        return cost
+    
+    def build_service(self, db, region, cluster=None, acu=None):
+        """把describe_db_instances返回的实例转换为成本记录
+        cluster: 实例所属的Aurora集群；acu: Serverless v2实例过去24小时的平均容量"""
+        engine = db.get('Engine') or 'mysql'
+        aurora = engine.startswith('aurora')
+        # Aurora的每个实例单独计费，没有多可用区价格
+        multi_az = bool(db.get('MultiAZ')) and not aurora
+        instance_class = db['DBInstanceClass']
+        io_optimized = (cluster or {}).get('StorageType') == 'aurora-iopt1'
+        
+        instance_hourly = self.price_manager.get_rds_instance_price(
+            engine, instance_class, region, multi_az, db.get('LicenseModel'), io_optimized
+        )
+        if instance_class == 'db.serverless':
+            if acu is None:
+                acu = ((cluster or {}).get('ServerlessV2ScalingConfiguration') or {}).get('MinCapacity', 0.5)
+            instance_hourly *= acu
+        
+        # Aurora的存储按集群计费 (见_cluster_service)
+        storage_monthly = 0 if aurora else self._storage_monthly_cost(db, region, multi_az)
+        hourly_cost = instance_hourly + storage_monthly / 30 / 24
+        
+        service = {
+            'service': 'RDS',
+            'resource_id': db['DBInstanceIdentifier'],
+            'region': region,
+            'instance_type': instance_class,
+            'hourly_cost': hourly_cost,
+            'daily_cost': hourly_cost * 24,
+            'engine': engine,
+            'deployment': 'Multi-AZ' if multi_az else 'Single-AZ',
+            'instance_hourly': round(instance_hourly, 6),
+            'storage_monthly': round(storage_monthly, 4)
+        }
+        if not aurora:
+            service['storage'] = f"{db.get('AllocatedStorage') or 0}GB {db.get('StorageType') or 'gp2'}"
+        if acu is not None and instance_class == 'db.serverless':
+            service['avg_acu'] = round(acu, 2)
+        return service
+    
+    def _cluster_service(self, cluster, region, metrics):
+        """Aurora集群存储和I/O的成本记录"""
+        storage_type = 'aurora-iopt1' if cluster.get('StorageType') == 'aurora-iopt1' else 'aurora'
+        prices = self.price_manager.get_rds_storage_price(storage_type, region)
+        size_gb = metrics.get('VolumeBytesUsed', 0) / (1024**3)
+        io_requests = metrics.get('VolumeReadIOPs', 0) + metrics.get('VolumeWriteIOPs', 0)
+        
+        # I/O优化集群不按I/O次数计费
+        daily_cost = size_gb * prices['storage'] / 30 + io_requests * prices.get('io', 0)
+        return {
+            'service': 'RDS',
+            'resource_id': cluster['DBClusterIdentifier'],
+            'region': region,
+            'instance_type': f"Aurora Storage ({size_gb:.1f}GB)",
+            'resource_type': 'Aurora Storage',
+            'hourly_cost': daily_cost / 24,
+            'daily_cost': daily_cost,
+            'engine': cluster.get('Engine'),
+            'storage': f"{size_gb:.1f}GB {storage_type}",
+            'io_requests_24h': int(io_requests)
+        }
+    
+    def _get_metrics(self, cloudwatch, cluster_ids, serverless_ids):
+        """批量获取Aurora集群的存储用量/I/O次数和Serverless v2实例的平均容量: {(标识, 指标名): 值}"""
+        queries = []
+        for cluster_id in cluster_ids:
+            for metric, stat in (('VolumeBytesUsed', 'Average'), ('VolumeReadIOPs', 'Sum'), ('VolumeWriteIOPs', 'Sum')):
+                queries.append((cluster_id, 'DBClusterIdentifier', metric, stat))
+        for instance_id in serverless_ids:
+            queries.append((instance_id, 'DBInstanceIdentifier', 'ServerlessDatabaseCapacity', 'Average'))
+        
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=24)
+        metrics = {}
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        for start in range(0, len(queries), self.METRIC_BATCH):
+            batch = queries[start:start + self.METRIC_BATCH]
+            values = {}
+            for page in paginator.paginate(MetricDataQueries=[{
+                'Id': f'm{index}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/RDS',
+                        'MetricName': metric,
+                        'Dimensions': [{'Name': dimension, 'Value': identifier}]
+                    },
+                    'Period': 86400,
+                    'Stat': stat
+                },
+                'ReturnData': True
+            } for index, (identifier, dimension, metric, stat) in enumerate(batch)],
+                    StartTime=start_time, EndTime=end_time):
+                for result in page['MetricDataResults']:
+                    values.setdefault(result['Id'], []).extend(result.get('Values') or [])
+            
+            for index, (identifier, _, metric, stat) in enumerate(batch):
+                points = values.get(f'm{index}')
+                if points:
+                    metrics[(identifier, metric)] = sum(points) if stat == 'Sum' else sum(points) / len(points)
+        return metrics
+    
     def scan_region(self, region):
-        """扫描单个区域的RDS实例"""
+        """扫描单个区域的RDS实例和Aurora集群"""
         services = []
         try:
             rds = self.get_client('rds', region)
-            response = rds.describe_db_instances()
+            instances = []
+            for page in rds.get_paginator('describe_db_instances').paginate():
+                instances.extend(db for db in page['DBInstances'] if db['DBInstanceStatus'] == 'available')
+            
+            clusters = {}
+            if any(db.get('Engine', '').startswith('aurora') for db in instances):
+                for page in rds.get_paginator('describe_db_clusters').paginate():
+                    for cluster in page['DBClusters']:
+                        if cluster.get('Engine', '').startswith('aurora'):
+                            clusters[cluster['DBClusterIdentifier']] = cluster
+            
+            serverless = [db['DBInstanceIdentifier'] for db in instances if db['DBInstanceClass'] == 'db.serverless']
+            metrics = {}
+            if clusters or serverless:
+                metrics = self._get_metrics(self.get_client('cloudwatch', region), list(clusters), serverless)
+            
+            for db in instances:
+                cluster = clusters.get(db.get('DBClusterIdentifier'))
+                acu = metrics.get((db['DBInstanceIdentifier'], 'ServerlessDatabaseCapacity'))
+                services.append(self.build_service(db, region, cluster, acu))
             
-            for db in response['DBInstances']:
-                if db['DBInstanceStatus'] == 'available':
-                    hourly_cost = self.price_manager.get_rds_price(db['DBInstanceClass'], region)
-                    services.append({
-                        'service': 'RDS',
-                        'resource_id': db['DBInstanceIdentifier'],
-                        'region': region,
-                        'instance_type': db['DBInstanceClass'],
-                        'hourly_cost': hourly_cost,
-                        'daily_cost': hourly_cost * 24
-                    })
+            for cluster_id, cluster in clusters.items():
+                cluster_metrics = {metric: metrics[(cluster_id, metric)]
+                                   for metric in ('VolumeBytesUsed', 'VolumeReadIOPs', 'VolumeWriteIOPs')
+                                   if (cluster_id, metric) in metrics}
+                services.append(self._cluster_service(cluster, region, cluster_metrics))
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描RDS失败 ({region}): {e}")
             else:
@@ -36,6 +177,6 @@ class RDSCollector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的RDS实例"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
-        return all_services
\ No newline at end of file
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
+        return all_services
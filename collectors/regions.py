@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+区域扫描计划 - 通过describe_regions发现账号启用的区域，并降低空区域的扫描频率
+
+- 区域列表每 REGION_DISCOVERY_HOURS 小时刷新一次，新启用的区域自动纳入扫描
+- 某个收集器在某区域扫描成功且没有资源时记录"空闲起始时间"，之后每 EMPTY_REGION_RESCAN_HOURS 小时才重新扫描一次
+  (API调用失败的扫描不计入)
+- 每 REGION_FULL_SWEEP_HOURS 小时执行一次全量扫描，不跳过任何区域
+"""
+
+import os
+import threading
+from datetime import datetime, timedelta
+
+from utils.constants import AWS_REGIONS
+
+
+def get_region_config():
+    """区域扫描配置: SCAN_REGIONS=auto 时自动发现，也可以是逗号分隔的区域列表"""
+    regions = os.getenv('SCAN_REGIONS', 'auto').strip()
+    return {
+        'regions': None if regions.lower() == 'auto' else [r.strip() for r in regions.split(',') if r.strip()],
+        'discovery_hours': float(os.getenv('REGION_DISCOVERY_HOURS', 24)),
+        'empty_rescan_hours': float(os.getenv('EMPTY_REGION_RESCAN_HOURS', 6)),
+        'full_sweep_hours': float(os.getenv('REGION_FULL_SWEEP_HOURS', 24))
+    }
+
+
+def discover_regions(session):
+    """账号中已启用的区域 (包括已选择加入的区域)"""
+    ec2 = session.client('ec2', region_name=session.region_name or 'us-east-1')
+    response = ec2.describe_regions()
+    return sorted(region['RegionName'] for region in response['Regions'])
+
+
+class RegionPlanner:
+    def __init__(self, session, regions=None, config=None, logger=None):
+        """regions: 固定的区域列表 (不做自动发现)"""
+        self.session = session
+        self.config = config or get_region_config()
+        self.fixed_regions = regions or self.config['regions']
+        self.logger = logger
+        self.regions = list(self.fixed_regions or AWS_REGIONS)
+        self.full_sweep = True
+        self.skipped = 0
+        self._discovered_at = None
+        self._last_full_sweep = None
+        self._now = None
+        # (收集器, 区域) -> {'empty_since': 首次为空的时间, 'last_scanned': 最近一次扫描时间}
+        self._empty = {}
+        self._lock = threading.Lock()
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def start_scan(self, now=None):
+        """每次扫描开始时调用: 按需刷新区域列表，并决定本次是否为全量扫描，返回要使用的区域"""
+        now = now or datetime.now()
+        if not self.fixed_regions and (
+                self._discovered_at is None
+                or now - self._discovered_at >= timedelta(hours=self.config['discovery_hours'])):
+            try:
+                discovered = discover_regions(self.session)
+                added = sorted(set(discovered) - set(self.regions))
+                if added and self._discovered_at is not None:
+                    self._log(f"发现新启用的区域: {', '.join(added)}")
+                self.regions = discovered
+                self._discovered_at = now
+            except Exception as e:
+                # 保留上一次的区域列表，下次扫描再尝试
+                self._log(f"发现区域失败，继续使用 {len(self.regions)} 个区域: {e}")
+
+        with self._lock:
+            self.full_sweep = (self._last_full_sweep is None
+                               or now - self._last_full_sweep >= timedelta(hours=self.config['full_sweep_hours']))
+            if self.full_sweep:
+                self._last_full_sweep = now
+            self.skipped = 0
+            self._now = now
+        return list(self.regions)
+
+    def filter_regions(self, collector_name, regions):
+        """去掉最近扫描过且为空的区域"""
+        with self._lock:
+            if self.full_sweep:
+                return list(regions)
+
+            rescan_after = timedelta(hours=self.config['empty_rescan_hours'])
+            selected = []
+            for region in regions:
+                state = self._empty.get((collector_name, region))
+                if state and self._now - state['last_scanned'] < rescan_after:
+                    self.skipped += 1
+                    continue
+                selected.append(region)
+            return selected
+
+    def record(self, collector_name, region, resource_count, succeeded=True):
+        """记录区域的扫描结果；扫描失败 (succeeded=False) 时没有资源不代表区域为空，保持原来的状态"""
+        with self._lock:
+            key = (collector_name, region)
+            if resource_count:
+                self._empty.pop(key, None)
+                return
+            if not succeeded:
+                return
+            now = self._now or datetime.now()
+            state = self._empty.setdefault(key, {'empty_since': now})
+            state['last_scanned'] = now
+
+    def empty_regions(self):
+        """当前记录为空的 (收集器, 区域) 及其空闲起始时间"""
+        with self._lock:
+            return {f'{collector}/{region}': state['empty_since'].isoformat()
+                    for (collector, region), state in self._empty.items()}
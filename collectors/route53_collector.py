@@ -8,6 +8,10 @@ from .base_collector import BaseCollector
 
 
 class Route53Collector(BaseCollector):
+    # 托管区域为固定月费，很少变化
+    refresh_hours = 24
+    freshness_hours = 72
+    
     def scan_region(self, region):
         """Route53是全球服务，只在us-east-1扫描"""
         if region != 'us-east-1':
@@ -34,6 +38,7 @@ class Route53Collector(BaseCollector):
                 })
                 
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描Route53失败: {e}")
             else:
@@ -42,4 +47,4 @@ class Route53Collector(BaseCollector):
     
     def scan_all_regions(self):
         """Route53只需要扫描一次"""
-        return self.scan_region('us-east-1')
\ No newline at end of file
+        return self.timed_scan_region('us-east-1')
\ No newline at end of file
@@ -5,63 +5,190 @@ S3资源收集器
 """
 
 from .base_collector import BaseCollector
-from datetime import datetime, timedelta
+from .s3_inventory import S3InventoryReader, get_inventory_config
+from datetime import datetime, timedelta, timezone
+
+
+# CloudWatch BucketSizeBytes的StorageType -> 计价类别 (PriceManager.get_s3_price)
+# 归档对象的元数据开销按对应类别或标准存储计价
+STORAGE_TYPES = {
+    'StandardStorage': 'Standard',
+    'ReducedRedundancyStorage': 'ReducedRedundancy',
+    'StandardIAStorage': 'IA',
+    'StandardIASizeOverhead': 'IA',
+    'OneZoneIAStorage': 'OneZoneIA',
+    'OneZoneIASizeOverhead': 'OneZoneIA',
+    'GlacierInstantRetrievalStorage': 'GlacierIR',
+    'GlacierIRSizeOverhead': 'GlacierIR',
+    'GlacierStorage': 'Glacier',
+    'GlacierObjectOverhead': 'Glacier',
+    'GlacierS3ObjectOverhead': 'Standard',
+    'GlacierStagingStorage': 'Standard',
+    'DeepArchiveStorage': 'DeepArchive',
+    'DeepArchiveObjectOverhead': 'DeepArchive',
+    'DeepArchiveS3ObjectOverhead': 'Standard',
+    'DeepArchiveStagingStorage': 'Standard',
+    'IntelligentTieringFAStorage': 'IntelligentTiering-FA',
+    'IntelligentTieringIAStorage': 'IntelligentTiering-IA',
+    'IntelligentTieringAIAStorage': 'IntelligentTiering-AIA',
+    'IntelligentTieringAAStorage': 'IntelligentTiering-AA',
+    'IntelligentTieringDAAStorage': 'IntelligentTiering-DAA'
+}
 
 
 class S3Collector(BaseCollector):
-    def scan_region(self, region):
-        """S3是全球服务，只在us-east-1扫描"""
-        if region != 'us-east-1':
-            return []
+    # BucketSizeBytes每天只更新一次
+    refresh_hours = 24
+    freshness_hours = 48
+    
+    # get_metric_data每次最多500个查询
+    METRIC_BATCH = 500
+    
+    def __init__(self, session=None, price_manager=None):
+        super().__init__(session, price_manager)
+        # 存储桶 -> 区域 (存储桶创建后区域不会改变)
+        self._bucket_regions = {}
+        # 本次扫描按区域分组的存储桶
+        self._buckets_by_region = {}
+        # 配置了S3_INVENTORY_MANIFESTS时读取清单报告，得到精确的按类别/前缀大小
+        self.inventory = S3InventoryReader(self.session) if get_inventory_config()['manifests'] else None
+        self._inventory_sizes = {}
+    
+    def _bucket_region(self, s3, bucket):
+        """存储桶所在区域 (缓存)"""
+        name = bucket['Name']
+        region = self._bucket_regions.get(name) or bucket.get('BucketRegion')
+        if not region:
+            location = s3.get_bucket_location(Bucket=name).get('LocationConstraint')
+            # us-east-1返回空值，早期的欧洲区域返回EU
+            region = {None: 'us-east-1', '': 'us-east-1', 'EU': 'eu-west-1'}.get(location, location)
+        self._bucket_regions[name] = region
+        return region
+    
+    def _get_bucket_sizes(self, region, bucket_names):
+        """批量获取区域内存储桶各存储类型的大小: {存储桶: {计价类别: 字节}}"""
+        cloudwatch = self.get_client('cloudwatch', region)
         
+        # 只查询实际存在数据的 (存储桶, 存储类型) 组合
+        series = []
+        for page in cloudwatch.get_paginator('list_metrics').paginate(Namespace='AWS/S3', MetricName='BucketSizeBytes'):
+            for metric in page['Metrics']:
+                dimensions = {d['Name']: d['Value'] for d in metric['Dimensions']}
+                if dimensions.get('BucketName') in bucket_names and dimensions.get('StorageType') in STORAGE_TYPES:
+                    series.append(metric)
+        
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(days=2)
+        sizes = {}
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        for start in range(0, len(series), self.METRIC_BATCH):
+            batch = series[start:start + self.METRIC_BATCH]
+            queries = [{
+                'Id': f'm{index}',
+                'MetricStat': {'Metric': metric, 'Period': 86400, 'Stat': 'Average'},
+                'ReturnData': True
+            } for index, metric in enumerate(batch)]
+            
+            latest = {}
+            for page in paginator.paginate(MetricDataQueries=queries, StartTime=start_time, EndTime=end_time,
+                                           ScanBy='TimestampDescending'):
+                for result in page['MetricDataResults']:
+                    if result.get('Values') and result['Id'] not in latest:
+                        latest[result['Id']] = result['Values'][0]
+            
+            for index, metric in enumerate(batch):
+                if f'm{index}' not in latest:
+                    continue
+                dimensions = {d['Name']: d['Value'] for d in metric['Dimensions']}
+                classes = sizes.setdefault(dimensions['BucketName'], {})
+                price_class = STORAGE_TYPES[dimensions['StorageType']]
+                classes[price_class] = classes.get(price_class, 0) + latest[f'm{index}']
+        return sizes
+    
+    def _bucket_service(self, name, region, class_bytes, source, prefixes=None):
+        """按存储类别计价的存储桶成本记录；小于1MB的存储桶返回None"""
+        class_gb = {cls: size / (1024**3) for cls, size in class_bytes.items() if size > 0}
+        size_gb = sum(class_gb.values())
+        if size_gb <= 0.001:  # 只统计大于1MB的存储桶
+            return None
+        
+        monthly_cost = 0
+        for cls, gb in class_gb.items():
+            if cls == 'Standard':
+                gb = max(0, gb - 5)  # 前5GB免费
+            monthly_cost += gb * self.price_manager.get_s3_price(cls, region)
+        daily_cost = monthly_cost / 30
+        
+        service = {
+            'service': 'S3',
+            'resource_id': name,
+            'region': region,
+            'instance_type': f"{size_gb:.2f}GB",
+            'resource_type': 'Bucket',
+            'hourly_cost': daily_cost / 24,
+            'daily_cost': daily_cost,
+            'storage_classes': {cls: round(gb, 3) for cls, gb in sorted(class_gb.items())},
+            'size_source': source
+        }
+        if prefixes:
+            top = sorted(prefixes.items(), key=lambda item: -item[1])[:20]
+            service['top_prefixes'] = {prefix: round(size / (1024**3), 3) for prefix, size in top}
+        return service
+    
+    def scan_region(self, region):
+        """扫描区域内的存储桶 (存储桶列表和所在区域由scan_all_regions准备)"""
         services = []
+        buckets = self._buckets_by_region.get(region, [])
+        if not buckets:
+            return services
+        
         try:
-            s3 = self.get_client('s3', 'us-east-1')
-            cloudwatch = self.get_client('cloudwatch', 'us-east-1')
+            # 有清单报告的存储桶使用精确大小，其余查询CloudWatch
+            pending = {name for name in buckets if name not in self._inventory_sizes}
+            sizes = self._get_bucket_sizes(region, pending) if pending else {}
             
-            response = s3.list_buckets()
+            for name in buckets:
+                usage = self._inventory_sizes.get(name)
+                if usage:
+                    service = self._bucket_service(name, region, usage['classes'], 'inventory', usage['prefixes'])
+                else:
+                    service = self._bucket_service(name, region, sizes.get(name, {}), 'cloudwatch')
+                if service:
+                    services.append(service)
+        except Exception as e:
+            self.mark_region_failed(region)
+            print(f"扫描S3失败 ({region}): {e}")
+        return services
+    
+    def scan_all_regions(self):
+        """列出所有存储桶，按所在区域分组后批量查询大小"""
+        try:
+            s3 = self.get_client('s3', 'us-east-1')
+            buckets = s3.list_buckets()['Buckets']
             
-            for bucket in response['Buckets']:
+            buckets_by_region = {}
+            for bucket in buckets:
                 try:
-                    # 获取存储桶大小
-                    metrics = cloudwatch.get_metric_statistics(
-                        Namespace='AWS/S3',
-                        MetricName='BucketSizeBytes',
-                        Dimensions=[
-                            {'Name': 'BucketName', 'Value': bucket['Name']},
-                            {'Name': 'StorageType', 'Value': 'StandardStorage'}
-                        ],
-                        StartTime=datetime.now() - timedelta(days=2),
-                        EndTime=datetime.now(),
-                        Period=86400,
-                        Statistics=['Average']
-                    )
-                    
-                    size_bytes = metrics['Datapoints'][-1]['Average'] if metrics['Datapoints'] else 0
-                    size_gb = size_bytes / (1024**3)
-                    
-                    if size_gb > 0.001:  # 只统计大于1MB的存储桶
-                        price_per_gb = self.price_manager.get_s3_price('Standard', 'us-east-1')
-                        billable_gb = max(0, size_gb - 5)  # 前5GB免费
-                        monthly_cost = billable_gb * price_per_gb
-                        daily_cost = monthly_cost / 30
-                        hourly_cost = daily_cost / 24
-                        
-                        services.append({
-                            'service': 'S3',
-                            'resource_id': bucket['Name'],
-                            'region': 'us-east-1',
-                            'instance_type': f"{size_gb:.2f}GB",
-                            'hourly_cost': hourly_cost,
-                            'daily_cost': daily_cost
-                        })
-                except Exception as bucket_error:
+                    region = self._bucket_region(s3, bucket)
+                except Exception as e:
+                    print(f"获取存储桶 {bucket['Name']} 区域失败: {e}")
                     continue
-                    
+                buckets_by_region.setdefault(region, []).append(bucket['Name'])
+            self._buckets_by_region = buckets_by_region
+            
+            # 已删除的存储桶不再缓存区域
+            names = {bucket['Name'] for bucket in buckets}
+            self._bucket_regions = {name: region for name, region in self._bucket_regions.items() if name in names}
         except Exception as e:
             print(f"扫描S3失败: {e}")
-        return services
-    
-    def scan_all_regions(self):
-        """S3只需要扫描一次"""
-        return self.scan_region('us-east-1')
\ No newline at end of file
+            return []
+        
+        self._inventory_sizes = {}
+        if self.inventory is not None:
+            self.inventory.logger = getattr(self, 'logger', None)
+            self._inventory_sizes = self.inventory.sizes()
+        
+        all_services = []
+        for region in sorted(self._buckets_by_region):
+            all_services.extend(self.timed_scan_region(region))
+        return all_services
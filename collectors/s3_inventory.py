@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+S3 Inventory / Storage Lens 导出读取 - 流式汇总每个存储桶按存储类别和前缀的精确大小
+
+S3_INVENTORY_MANIFESTS: 逗号分隔的manifest.json位置 (s3://桶/路径/manifest.json 或本地路径)
+- S3 Inventory报告: CSV (gzip) 或 Parquet，逐个对象累加 Size
+- Storage Lens导出: CSV 或 Parquet，读取 StorageBytes 指标的 BUCKET / PREFIX 记录
+本地manifest的报告文件需与manifest放在同一目录。
+
+报告逐行/逐批处理，内存占用只与存储桶和前缀数量有关；manifest未变化时直接使用上次的汇总。
+Parquet报告需要安装pyarrow。
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from urllib.parse import unquote_plus
+
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+# 报告中的存储类别 -> 计价类别 (PriceManager.get_s3_price)
+STORAGE_CLASSES = {
+    'STANDARD': 'Standard',
+    'REDUCED_REDUNDANCY': 'ReducedRedundancy',
+    'STANDARD_IA': 'IA',
+    'ONEZONE_IA': 'OneZoneIA',
+    'GLACIER_IR': 'GlacierIR',
+    'GLACIER': 'Glacier',
+    'DEEP_ARCHIVE': 'DeepArchive',
+    'INTELLIGENT_TIERING': 'IntelligentTiering-FA'
+}
+
+# 智能分层对象所在的访问层
+INTELLIGENT_TIERING_TIERS = {
+    'FREQUENT': 'IntelligentTiering-FA',
+    'INFREQUENT': 'IntelligentTiering-IA',
+    'ARCHIVE_INSTANT_ACCESS': 'IntelligentTiering-AIA',
+    'ARCHIVE': 'IntelligentTiering-AA',
+    'DEEP_ARCHIVE': 'IntelligentTiering-DAA'
+}
+
+# 每批读取的Parquet行数
+PARQUET_BATCH_ROWS = 65536
+
+
+def get_inventory_config():
+    """清单报告配置"""
+    manifests = os.getenv('S3_INVENTORY_MANIFESTS', '')
+    return {
+        'manifests': [m.strip() for m in manifests.split(',') if m.strip()],
+        'prefix_depth': int(os.getenv('S3_INVENTORY_PREFIX_DEPTH', 1))
+    }
+
+
+def _snake_case(name):
+    """StorageClass -> storage_class"""
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name.strip()).lower()
+
+
+def _split_s3_uri(uri):
+    bucket, _, key = uri[len('s3://'):].partition('/')
+    return bucket, key
+
+
+class S3InventoryReader:
+    def __init__(self, session, manifests=None, prefix_depth=None, logger=None):
+        config = get_inventory_config()
+        self.session = session
+        self.manifests = config['manifests'] if manifests is None else manifests
+        self.prefix_depth = config['prefix_depth'] if prefix_depth is None else prefix_depth
+        self.logger = logger
+        # manifest位置 -> (manifest校验值, 汇总结果)
+        self._cache = {}
+        self._s3 = None
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def _client(self):
+        if self._s3 is None:
+            self._s3 = self.session.client('s3')
+        return self._s3
+
+    def _read_bytes(self, location):
+        if location.startswith('s3://'):
+            bucket, key = _split_s3_uri(location)
+            return self._client().get_object(Bucket=bucket, Key=key)['Body'].read()
+        with open(location, 'rb') as f:
+            return f.read()
+
+    def _open_stream(self, location):
+        """报告文件的二进制流 (S3对象按流读取，不整体加载到内存)"""
+        if location.startswith('s3://'):
+            bucket, key = _split_s3_uri(location)
+            return self._client().get_object(Bucket=bucket, Key=key)['Body']
+        return open(location, 'rb')
+
+    def _report_location(self, manifest_location, manifest, key):
+        if not manifest_location.startswith('s3://'):
+            return os.path.join(os.path.dirname(manifest_location), os.path.basename(key))
+        destination = manifest['destinationBucket'].split(':::')[-1]
+        return f"s3://{destination}/{key}"
+
+    def sizes(self):
+        """所有清单报告的汇总: {存储桶: {'classes': {计价类别: 字节}, 'prefixes': {前缀: 字节}, 'report_date': 日期}}"""
+        result = {}
+        for location in self.manifests:
+            try:
+                result.update(self._load(location))
+            except Exception as e:
+                self._log(f"读取S3清单报告失败 ({location}): {e}")
+        return result
+
+    def _load(self, location):
+        raw = self._read_bytes(location)
+        checksum = hashlib.md5(raw).hexdigest()
+        cached = self._cache.get(location)
+        if cached and cached[0] == checksum:
+            return cached[1]
+
+        manifest = json.loads(raw)
+        if 'reportFiles' in manifest:
+            usage = self._load_storage_lens(location, manifest)
+        else:
+            usage = self._load_inventory(location, manifest)
+        self._cache[location] = (checksum, usage)
+        self._log(f"已读取S3清单报告 {location}: {len(usage)} 个存储桶")
+        return usage
+
+    def _iter_rows(self, location, file_format, fields):
+        """逐行返回报告记录 (字段名统一为snake_case)"""
+        if file_format.upper() == 'PARQUET':
+            yield from self._iter_parquet_rows(location)
+            return
+
+        stream = self._open_stream(location)
+        try:
+            if location.endswith('.gz'):
+                stream = gzip.GzipFile(fileobj=stream)
+            for row in csv.reader(io.TextIOWrapper(stream, encoding='utf-8', newline='')):
+                # Storage Lens的CSV可能带表头
+                if [_snake_case(value) for value in row] == fields:
+                    continue
+                yield dict(zip(fields, row))
+        finally:
+            stream.close()
+
+    def _iter_parquet_rows(self, location):
+        if not PARQUET_AVAILABLE:
+            raise RuntimeError("Parquet格式的报告需要安装pyarrow: pip install pyarrow")
+
+        # ParquetFile需要可随机访问的文件，S3上的报告先下载到临时文件
+        temp = None
+        if location.startswith('s3://'):
+            temp = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+            with temp:
+                body = self._open_stream(location)
+                shutil.copyfileobj(body, temp)
+                body.close()
+            path = temp.name
+        else:
+            path = location
+        try:
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(batch_size=PARQUET_BATCH_ROWS):
+                columns = [_snake_case(name) for name in batch.schema.names]
+                for values in zip(*(column.to_pylist() for column in batch.columns)):
+                    yield dict(zip(columns, values))
+        finally:
+            if temp is not None:
+                os.unlink(temp.name)
+
+    def _prefix(self, key):
+        """对象键的前N级目录；根目录下的对象为空字符串"""
+        parts = key.split('/')[:-1]
+        return '/'.join(parts[:self.prefix_depth]) + '/' if parts else ''
+
+    def _load_inventory(self, location, manifest):
+        """S3 Inventory: 逐个对象累加大小"""
+        fields = [_snake_case(name) for name in manifest.get('fileSchema', '').split(',')]
+        source_bucket = manifest.get('sourceBucket')
+        # CSV报告中的对象键经过URL编码
+        url_encoded = manifest.get('fileFormat', 'CSV').upper() == 'CSV'
+        usage = {}
+        for report in manifest['files']:
+            report_location = self._report_location(location, manifest, report['key'])
+            for row in self._iter_rows(report_location, manifest.get('fileFormat', 'CSV'), fields):
+                size = row.get('size')
+                if size in (None, ''):
+                    # 删除标记没有大小
+                    continue
+                storage_class = row.get('storage_class') or 'STANDARD'
+                if storage_class == 'INTELLIGENT_TIERING':
+                    price_class = INTELLIGENT_TIERING_TIERS.get(
+                        row.get('intelligent_tiering_access_tier') or 'FREQUENT', 'IntelligentTiering-FA'
+                    )
+                else:
+                    price_class = STORAGE_CLASSES.get(storage_class, 'Standard')
+
+                bucket = row.get('bucket') or source_bucket
+                entry = usage.setdefault(bucket, {'classes': Counter(), 'prefixes': Counter(),
+                                                  'report_date': manifest.get('creationTimestamp')})
+                size = int(size)
+                entry['classes'][price_class] += size
+                key = row.get('key') or ''
+                entry['prefixes'][self._prefix(unquote_plus(key) if url_encoded else key)] += size
+        return usage
+
+    def _load_storage_lens(self, location, manifest):
+        """Storage Lens: BUCKET记录为各存储类别的大小，PREFIX记录按存储类别累加为前缀大小"""
+        fields = [_snake_case(name) for name in manifest.get('reportSchema', '').split(',')]
+        usage = {}
+        for report in manifest['reportFiles']:
+            report_location = self._report_location(location, manifest, report['key'])
+            for row in self._iter_rows(report_location, manifest.get('reportFormat', 'CSV'), fields):
+                if row.get('metric_name') != 'StorageBytes' or not row.get('bucket_name'):
+                    continue
+                entry = usage.setdefault(row['bucket_name'], {'classes': Counter(), 'prefixes': Counter(),
+                                                              'report_date': row.get('report_date')})
+                price_class = STORAGE_CLASSES.get(row.get('storage_class'))
+                if not price_class:
+                    continue
+                value = int(float(row.get('metric_value') or 0))
+                if row.get('record_type') == 'BUCKET':
+                    entry['classes'][price_class] += value
+                elif row.get('record_type') == 'PREFIX':
+                    entry['prefixes'][row.get('record_value') or ''] += value
+        return usage
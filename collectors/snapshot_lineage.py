@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EBS快照增量大小存储 - 快照的增量只测量一次
+
+每个快照相对上一个快照 (父快照) 的增量大小保存在本地SQLite (SNAPSHOT_LINEAGE_PATH)，
+重启后和多个scan_worker进程之间共享，只有新快照或父快照改变 (中间的快照被删除) 时才重新测量。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+
+def get_snapshot_lineage_path():
+    """快照增量存储路径"""
+    return os.getenv('SNAPSHOT_LINEAGE_PATH', 'data/snapshot_lineage.db')
+
+
+class SnapshotLineageStore:
+    def __init__(self, path=None):
+        self.path = path or get_snapshot_lineage_path()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout=30000')
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._lock = threading.Lock()
+        self.init_store()
+
+    def init_store(self):
+        """初始化快照增量表 (parent_id为空字符串表示链中的第一个快照)"""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS snapshot_lineage (
+                account_id TEXT NOT NULL,
+                region TEXT NOT NULL,
+                snapshot_id TEXT NOT NULL,
+                parent_id TEXT NOT NULL,
+                incremental_gb REAL NOT NULL,
+                measured_at TEXT NOT NULL,
+                PRIMARY KEY (account_id, region, snapshot_id)
+            ) WITHOUT ROWID
+        ''')
+
+    def load(self, account_id, region):
+        """区域内已测量的快照: {快照ID: {'parent': 父快照ID或None, 'incremental_gb': 增量大小}}"""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT snapshot_id, parent_id, incremental_gb FROM snapshot_lineage
+                WHERE account_id = ? AND region = ?
+            ''', (account_id, region)).fetchall()
+        return {snapshot_id: {'parent': parent_id or None, 'incremental_gb': incremental_gb}
+                for snapshot_id, parent_id, incremental_gb in rows}
+
+    def save(self, account_id, region, measured, existing):
+        """保存新测量的快照，并删除区域内已不存在的快照
+        measured: {快照ID: {'parent', 'incremental_gb'}}；existing: 当前仍存在的快照ID集合"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                stored = [row[0] for row in conn.execute(
+                    'SELECT snapshot_id FROM snapshot_lineage WHERE account_id = ? AND region = ?',
+                    (account_id, region)
+                )]
+                conn.executemany(
+                    'DELETE FROM snapshot_lineage WHERE account_id = ? AND region = ? AND snapshot_id = ?',
+                    [(account_id, region, snapshot_id) for snapshot_id in stored if snapshot_id not in existing]
+                )
+                conn.executemany('''
+                    INSERT INTO snapshot_lineage (account_id, region, snapshot_id, parent_id, incremental_gb, measured_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (account_id, region, snapshot_id) DO UPDATE SET
+                        parent_id = excluded.parent_id,
+                        incremental_gb = excluded.incremental_gb,
+                        measured_at = excluded.measured_at
+                ''', [(account_id, region, snapshot_id, entry['parent'] or '', entry['incremental_gb'], now)
+                      for snapshot_id, entry in measured.items()])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
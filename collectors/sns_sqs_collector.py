@@ -5,64 +5,160 @@ SNS和SQS资源收集器
 """
 
 from .base_collector import BaseCollector
+from datetime import datetime, timedelta, timezone
+from pricing.tiers import allocate_tiered_costs
+
+
+# 计为SQS请求的队列指标 (发送、接收、删除、空轮询各算一次请求)
+SQS_REQUEST_METRICS = (
+    'NumberOfMessagesSent',
+    'NumberOfMessagesReceived',
+    'NumberOfMessagesDeleted',
+    'NumberOfEmptyReceives'
+)
 
 
 class SNSSQSCollector(BaseCollector):
+    refresh_hours = 6
+    freshness_hours = 24
+    
+    # get_metric_data每次最多500个查询
+    METRIC_BATCH = 500
+    
+    def _active_names(self, cloudwatch, namespace, metric, dimension):
+        """最近两周有指标数据的主题/队列名 (空闲的资源不再逐个查询)"""
+        names = set()
+        for page in cloudwatch.get_paginator('list_metrics').paginate(Namespace=namespace, MetricName=metric):
+            for item in page['Metrics']:
+                dimensions = {d['Name']: d['Value'] for d in item['Dimensions']}
+                if len(dimensions) == 1 and dimension in dimensions:
+                    names.add(dimensions[dimension])
+        return names
+    
+    def _get_usage(self, cloudwatch, namespace, dimension, names, metrics):
+        """批量获取过去24小时各资源指标的合计: {名称: 合计}"""
+        queries = [(name, metric) for name in names for metric in metrics]
+        end_time = datetime.now(timezone.utc)
+        start_time = end_time - timedelta(hours=24)
+        usage = {}
+        paginator = cloudwatch.get_paginator('get_metric_data')
+        
+        for start in range(0, len(queries), self.METRIC_BATCH):
+            batch = queries[start:start + self.METRIC_BATCH]
+            totals = {}
+            for page in paginator.paginate(MetricDataQueries=[{
+                'Id': f'm{index}',
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': namespace,
+                        'MetricName': metric,
+                        'Dimensions': [{'Name': dimension, 'Value': name}]
+                    },
+                    'Period': 86400,
+                    'Stat': 'Sum'
+                },
+                'ReturnData': True
+            } for index, (name, metric) in enumerate(batch)], StartTime=start_time, EndTime=end_time):
+                for result in page['MetricDataResults']:
+                    totals[result['Id']] = totals.get(result['Id'], 0) + sum(result.get('Values') or [])
+            
+            for index, (name, _) in enumerate(batch):
+                usage[name] = usage.get(name, 0) + totals.get(f'm{index}', 0)
+        return usage
+    
+    def _scan_topics(self, region, cloudwatch):
+        """SNS主题及过去24小时的发布次数"""
+        sns = self.get_client('sns', region)
+        topics = []
+        for page in sns.get_paginator('list_topics').paginate():
+            topics.extend(topic['TopicArn'].split(':')[-1] for topic in page['Topics'])
+        if not topics:
+            return []
+        
+        active = self._active_names(cloudwatch, 'AWS/SNS', 'NumberOfMessagesPublished', 'TopicName')
+        published = self._get_usage(cloudwatch, 'AWS/SNS', 'TopicName',
+                                     [name for name in topics if name in active], ['NumberOfMessagesPublished'])
+        return [{
+            'service': 'SNS',
+            'resource_id': name,
+            'region': region,
+            'instance_type': 'Topic',
+            'usage_type': 'SNS-Publish',
+            'requests_24h': int(published.get(name, 0))
+        } for name in topics]
+    
+    def _scan_queues(self, region, cloudwatch):
+        """SQS队列及过去24小时的请求数"""
+        sqs = self.get_client('sqs', region)
+        queues = []
+        for page in sqs.get_paginator('list_queues').paginate(PaginationConfig={'PageSize': 1000}):
+            queues.extend(url.split('/')[-1] for url in page.get('QueueUrls', []))
+        if not queues:
+            return []
+        
+        active = self._active_names(cloudwatch, 'AWS/SQS', 'NumberOfMessagesSent', 'QueueName')
+        requests = self._get_usage(cloudwatch, 'AWS/SQS', 'QueueName',
+                                   [name for name in queues if name in active], SQS_REQUEST_METRICS)
+        services = []
+        for name in queues:
+            fifo = name.endswith('.fifo')
+            services.append({
+                'service': 'SQS',
+                'resource_id': name,
+                'region': region,
+                'instance_type': 'Queue (FIFO)' if fifo else 'Queue (Standard)',
+                'usage_type': 'SQS-FIFO' if fifo else 'SQS-Standard',
+                'requests_24h': int(requests.get(name, 0))
+            })
+        return services
+    
     def scan_region(self, region):
-        """扫描单个区域的SNS和SQS资源"""
+        """扫描单个区域的SNS和SQS资源 (费用在scan_all_regions中按账号汇总后计算)"""
         services = []
+        cloudwatch = self.get_client('cloudwatch', region)
         
-        # SNS主题 - 按量付费，有免费额度
+        # SNS主题 - 按发布次数付费
         try:
-            sns = self.get_client('sns', region)
-            topics = sns.list_topics()
-            
-            for topic in topics['Topics']:
-                # SNS: 前100万次发布免费，超出部分$0.50/百万次
-                # 大部分小型应用在免费额度内
-                hourly_cost = 0.0  # 免费额度内
-                
-                services.append({
-                    'service': 'SNS',
-                    'resource_id': topic['TopicArn'].split(':')[-1],
-                    'region': region,
-                    'instance_type': 'Topic (Free Tier)',
-                    'hourly_cost': hourly_cost,
-                    'daily_cost': hourly_cost * 24
-                })
+            services.extend(self._scan_topics(region, cloudwatch))
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描SNS失败 ({region}): {e}")
         
-        # SQS队列 - 按量付费，有免费额度
+        # SQS队列 - 按请求次数付费
         try:
-            sqs = self.get_client('sqs', region)
-            queues = sqs.list_queues()
-            
-            for queue_url in queues.get('QueueUrls', []):
-                queue_name = queue_url.split('/')[-1]
-                
-                # SQS: 前100万次请求免费，超出部分$0.40/百万次
-                # 大部分小型应用在免费额度内
-                hourly_cost = 0.0  # 免费额度内
-                
-                services.append({
-                    'service': 'SQS',
-                    'resource_id': queue_name,
-                    'region': region,
-                    'instance_type': 'Queue (Free Tier)',
-                    'hourly_cost': hourly_cost,
-                    'daily_cost': hourly_cost * 24
-                })
+            services.extend(self._scan_queues(region, cloudwatch))
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描SQS失败 ({region}): {e}")
         
         return services
     
+    def _tiered_price(self, group, million_requests):
+        """一个 (账号, 用量类型) 分组每月总请求数的费用"""
+        _, usage_type = group
+        if usage_type == 'SNS-Publish':
+            return self.price_manager.get_sns_publish_price(million_requests)
+        return self.price_manager.get_sqs_price(million_requests, fifo=usage_type == 'SQS-FIFO')
+    
+    def _apply_tiered_pricing(self, services):
+        """免费额度按账号 (所有区域) 的每月总请求数扣除一次，剩余费用按请求数比例分摊到各主题/队列"""
+        # 按过去24小时的用量估算整月用量
+        allocations = allocate_tiered_costs(
+            [((self.account_id, item['usage_type']), item['requests_24h'] * 30 / 1000000) for item in services],
+            self._tiered_price
+        )
+        for item, (monthly_cost, group_requests) in zip(services, allocations):
+            item.pop('usage_type')
+            item['hourly_cost'] = monthly_cost / 30 / 24
+            item['daily_cost'] = monthly_cost / 30
+            item['account_monthly_requests'] = int(group_requests * 1000000)
+    
     def scan_all_regions(self):
         """扫描所有区域的SNS和SQS资源"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
-        return all_services
\ No newline at end of file
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
+        self._apply_tiered_pricing(all_services)
+        return all_services
@@ -5,14 +5,25 @@ AWS流量费用收集器
 """
 
 import boto3
-from datetime import datetime, timedelta
+import time
+from datetime import datetime
 from .base_collector import BaseCollector
+from .metric_store import MetricStore
+from pricing.tiers import allocate_tiered_costs
+from monitoring.instrumentation import observe_scan_duration
+from monitoring.tracing import span
 
 
 class TrafficCollector(BaseCollector):
+    # 流量指标按30天窗口统计，每小时变化很小
+    refresh_hours = 6
+    freshness_hours = 24
+    
     def __init__(self, session=None, price_manager=None):
         super().__init__(session, price_manager)
         self.traffic_costs = []
+        # 30天指标窗口的增量存储，第一次扫描时打开
+        self.metric_store = None
     
     def scan_region(self, region):
         """扫描单个区域的流量费用"""
@@ -40,20 +51,57 @@ class TrafficCollector(BaseCollector):
         """扫描所有区域的流量费用"""
         all_traffic = []
         
-        for region in self.regions:
+        for region in self.regions_to_scan():
             try:
-                region_traffic = self.scan_region(region)
+                region_traffic = self.timed_scan_region(region)
                 all_traffic.extend(region_traffic)
             except Exception as e:
                 print(f"扫描区域 {region} 流量费用失败: {e}")
         
         # 添加全球服务流量费用
-        global_traffic = self._get_global_traffic_costs()
+        self.failed_regions.discard('Global')
+        start = time.perf_counter()
+        with span('region Global', kind='region', collector=self.collector_name, region='Global'):
+            global_traffic = self._get_global_traffic_costs()
+        observe_scan_duration(self.collector_name, 'Global', time.perf_counter() - start)
         all_traffic.extend(global_traffic)
         
+        if self.metric_store is not None:
+            self.metric_store.prune()
+        self._apply_tiered_pricing(all_traffic)
         self.traffic_costs = all_traffic
         return all_traffic
     
+    def _tiered_price(self, group, volume_gb):
+        """一个 (账号, 区域, 用量类型) 分组总用量的月费用"""
+        _, region, usage_type = group
+        if usage_type == 'CloudFront-Out':
+            return self.price_manager.get_cloudfront_price(volume_gb, region)
+        return self.price_manager.get_data_transfer_price(volume_gb, region)
+    
+    def _apply_tiered_pricing(self, traffic_data):
+        """按 (账号, 区域, 用量类型) 汇总用量后一次性分层计价，再按用量比例分摊到各资源"""
+        tiered = [item for item in traffic_data if 'usage_type' in item]
+        allocations = allocate_tiered_costs(
+            [((self.account_id, item['region'], item['usage_type']), item['volume_gb']) for item in tiered],
+            self._tiered_price
+        )
+        for item, (monthly_cost, group_gb) in zip(tiered, allocations):
+            volume_gb = item.pop('volume_gb')
+            item.pop('usage_type')
+            item['hourly_cost'] = round(monthly_cost / 30 / 24, 6)
+            item['daily_cost'] = round(monthly_cost / 30, 4)
+            item['monthly_cost'] = round(monthly_cost, 4)
+            # 平均单价 (账号总用量所在的阶梯决定)
+            item['details']['unit_price'] = round(monthly_cost / volume_gb, 4) if volume_gb else 0
+            item['details']['account_volume_gb'] = round(group_gb, 2)
+    
+    def _metric_sum(self, cloudwatch, region, namespace, metric, dimensions):
+        """最近30天的指标合计 (只拉取上次之后的新数据点)"""
+        if self.metric_store is None:
+            self.metric_store = MetricStore()
+        return self.metric_store.window_sum(cloudwatch, self.account_id, region, namespace, metric, dimensions)
+    
     def _get_ec2_traffic(self, region):
         """获取EC2 Public IP流量费用"""
         traffic_data = []
@@ -77,47 +125,27 @@ class TrafficCollector(BaseCollector):
                     instance_id = instance['InstanceId']
                     instance_type = instance.get('InstanceType', 'unknown')
                     
-                    # 获取过去30天的网络流量数据
-                    end_time = datetime.utcnow()
-                    start_time = end_time - timedelta(days=30)
-                    
                     try:
-                        # 获取网络输出字节数
-                        network_out = cloudwatch.get_metric_statistics(
-                            Namespace='AWS/EC2',
-                            MetricName='NetworkOut',
-                            Dimensions=[{'Name': 'InstanceId', 'Value': instance_id}],
-                            StartTime=start_time,
-                            EndTime=end_time,
-                            Period=86400,  # 1天
-                            Statistics=['Sum']
+                        # 过去30天的网络输出字节数
+                        total_bytes_out = self._metric_sum(
+                            cloudwatch, region, 'AWS/EC2', 'NetworkOut',
+                            [{'Name': 'InstanceId', 'Value': instance_id}]
                         )
-                        
-                        total_bytes_out = sum([point['Sum'] for point in network_out['Datapoints']])
                         total_gb_out = total_bytes_out / (1024**3)  # 转换为GB
                         
-                        # 估算数据传输出费用（简化计算）
-                        # 前1GB免费，后续$0.09/GB
-                        if total_gb_out > 1:
-                            transfer_cost = (total_gb_out - 1) * 0.09
-                        else:
-                            transfer_cost = 0
-                        
-                        if total_gb_out > 0 or transfer_cost > 0:  # 只显示有流量的实例
+                        # 费用在所有区域扫描完后按账号+区域的总用量分层计算 (_apply_tiered_pricing)
+                        if total_gb_out > 0:  # 只显示有流量的实例
                             traffic_data.append({
                                 'service': 'EC2',
                                 'resource_id': instance_id,
                                 'region': region,
-                                'hourly_cost': round(transfer_cost / 30 / 24, 6),
-                                'daily_cost': round(transfer_cost / 30, 4),
-                                'monthly_cost': round(transfer_cost, 4),
+                                'usage_type': 'DataTransfer-Out',
+                                'volume_gb': total_gb_out,
                                 'details': {
                                     'traffic_type': 'Data Transfer Out',
                                     'volume_gb': round(total_gb_out, 2),
-                                    'unit_price': 0.09,
                                     'instance_type': instance_type,
-                                    'public_ip': public_ip,
-                                    'free_tier_used': min(total_gb_out, 1)
+                                    'public_ip': public_ip
                                 },
                                 'last_updated': datetime.now().isoformat()
                             })
@@ -126,6 +154,7 @@ class TrafficCollector(BaseCollector):
                         print(f"获取EC2 {instance_id} 流量数据失败: {e}")
                         
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"获取EC2流量费用失败 ({region}): {e}")
         
         return traffic_data
@@ -147,22 +176,11 @@ class TrafficCollector(BaseCollector):
                 
                 nat_id = nat['NatGatewayId']
                 
-                # 获取过去30天的流量数据
-                end_time = datetime.utcnow()
-                start_time = end_time - timedelta(days=30)
-                
-                # 获取字节处理量
-                bytes_response = cloudwatch.get_metric_statistics(
-                    Namespace='AWS/NATGateway',
-                    MetricName='BytesOutToDestination',
-                    Dimensions=[{'Name': 'NatGatewayId', 'Value': nat_id}],
-                    StartTime=start_time,
-                    EndTime=end_time,
-                    Period=86400,  # 1天
-                    Statistics=['Sum']
+                # 过去30天的字节处理量
+                total_bytes = self._metric_sum(
+                    cloudwatch, region, 'AWS/NATGateway', 'BytesOutToDestination',
+                    [{'Name': 'NatGatewayId', 'Value': nat_id}]
                 )
-                
-                total_bytes = sum([point['Sum'] for point in bytes_response['Datapoints']])
                 total_gb = total_bytes / (1024**3)  # 转换为GB
                 
                 # NAT Gateway 数据处理费用: $0.045/GB
@@ -186,6 +204,7 @@ class TrafficCollector(BaseCollector):
                 })
                 
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"获取NAT Gateway流量费用失败 ({region}): {e}")
         
         return traffic_data
@@ -215,22 +234,12 @@ class TrafficCollector(BaseCollector):
                     hourly_cost = hours_per_month * 0.01
                     
                     # 数据处理费用: $0.01/GB
-                    end_time = datetime.utcnow()
-                    start_time = end_time - timedelta(days=30)
-                    
                     try:
                         # 尝试获取流量数据（如果可用）
-                        bytes_response = cloudwatch.get_metric_statistics(
-                            Namespace='AWS/VPC',
-                            MetricName='BytesTransferred',
-                            Dimensions=[{'Name': 'VpcEndpointId', 'Value': endpoint_id}],
-                            StartTime=start_time,
-                            EndTime=end_time,
-                            Period=86400,
-                            Statistics=['Sum']
+                        total_bytes = self._metric_sum(
+                            cloudwatch, region, 'AWS/VPC', 'BytesTransferred',
+                            [{'Name': 'VpcEndpointId', 'Value': endpoint_id}]
                         )
-                        
-                        total_bytes = sum([point['Sum'] for point in bytes_response['Datapoints']])
                         total_gb = total_bytes / (1024**3)
                         data_processing_cost = total_gb * 0.01
                     except:
@@ -258,6 +267,7 @@ class TrafficCollector(BaseCollector):
                     })
                     
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"获取VPC端点流量费用失败 ({region}): {e}")
         
         return traffic_data
@@ -281,22 +291,11 @@ class TrafficCollector(BaseCollector):
                 lb_name = lb['LoadBalancerName']
                 lb_type = lb['Type']
                 
-                # 获取过去30天的流量数据
-                end_time = datetime.utcnow()
-                start_time = end_time - timedelta(days=30)
-                
-                # 获取处理的字节数
-                bytes_response = cloudwatch.get_metric_statistics(
-                    Namespace='AWS/ApplicationELB' if lb_type == 'application' else 'AWS/NetworkELB',
-                    MetricName='ProcessedBytes',
-                    Dimensions=[{'Name': 'LoadBalancer', 'Value': lb_name}],
-                    StartTime=start_time,
-                    EndTime=end_time,
-                    Period=86400,
-                    Statistics=['Sum']
+                # 过去30天处理的字节数
+                total_bytes = self._metric_sum(
+                    cloudwatch, region, 'AWS/ApplicationELB' if lb_type == 'application' else 'AWS/NetworkELB',
+                    'ProcessedBytes', [{'Name': 'LoadBalancer', 'Value': lb_name}]
                 )
-                
-                total_bytes = sum([point['Sum'] for point in bytes_response['Datapoints']])
                 total_gb = total_bytes / (1024**3)
                 
                 # ELB数据处理费用
@@ -330,6 +329,7 @@ class TrafficCollector(BaseCollector):
                 })
                 
         except Exception as e:
+            self.mark_region_failed(region)
             print(f"获取ELB流量费用失败 ({region}): {e}")
         
         return traffic_data
@@ -348,6 +348,7 @@ class TrafficCollector(BaseCollector):
             traffic_data.extend(route53_traffic)
             
         except Exception as e:
+            self.mark_region_failed('Global')
             print(f"获取全球流量费用失败: {e}")
         
         return traffic_data
@@ -370,45 +371,23 @@ class TrafficCollector(BaseCollector):
                 dist_id = dist['Id']
                 domain_name = dist['DomainName']
                 
-                # 获取过去30天的流量数据
-                end_time = datetime.utcnow()
-                start_time = end_time - timedelta(days=30)
-                
-                # 获取字节下载量
-                bytes_response = cloudwatch.get_metric_statistics(
-                    Namespace='AWS/CloudFront',
-                    MetricName='BytesDownloaded',
-                    Dimensions=[{'Name': 'DistributionId', 'Value': dist_id}],
-                    StartTime=start_time,
-                    EndTime=end_time,
-                    Period=86400,
-                    Statistics=['Sum']
+                # 过去30天的字节下载量
+                total_bytes = self._metric_sum(
+                    cloudwatch, 'us-east-1', 'AWS/CloudFront', 'BytesDownloaded',
+                    [{'Name': 'DistributionId', 'Value': dist_id}]
                 )
-                
-                total_bytes = sum([point['Sum'] for point in bytes_response['Datapoints']])
                 total_gb = total_bytes / (1024**3)
                 
-                # CloudFront 流量费用（简化定价）
-                # 前10TB: $0.085/GB, 后续更便宜
-                if total_gb <= 10240:  # 10TB
-                    unit_price = 0.085
-                    traffic_cost = total_gb * unit_price
-                else:
-                    # 简化计算，实际应该分层计算
-                    unit_price = 0.070
-                    traffic_cost = total_gb * unit_price
-                
+                # CloudFront阶梯价格按账号内所有分配的总用量计算 (_apply_tiered_pricing)
                 traffic_data.append({
                     'service': 'CloudFront',
                     'resource_id': dist_id,
                     'region': 'Global',
-                    'hourly_cost': round(traffic_cost / 30 / 24, 6),
-                    'daily_cost': round(traffic_cost / 30, 4),
-                    'monthly_cost': round(traffic_cost, 4),
+                    'usage_type': 'CloudFront-Out',
+                    'volume_gb': total_gb,
                     'details': {
                         'traffic_type': 'Data Transfer Out',
                         'volume_gb': round(total_gb, 2),
-                        'unit_price': unit_price,
                         'domain_name': domain_name,
                         'status': dist.get('Status', '')
                     },
@@ -416,6 +395,7 @@ class TrafficCollector(BaseCollector):
                 })
                 
         except Exception as e:
+            self.mark_region_failed('Global')
             print(f"获取CloudFront流量费用失败: {e}")
         
         return traffic_data
@@ -435,23 +415,13 @@ class TrafficCollector(BaseCollector):
                 zone_id = zone['Id'].split('/')[-1]
                 zone_name = zone['Name']
                 
-                # 获取过去30天的查询数据
-                end_time = datetime.utcnow()
-                start_time = end_time - timedelta(days=30)
-                
                 try:
-                    query_response = cloudwatch.get_metric_statistics(
-                        Namespace='AWS/Route53',
-                        MetricName='QueryCount',
-                        Dimensions=[{'Name': 'HostedZoneId', 'Value': zone_id}],
-                        StartTime=start_time,
-                        EndTime=end_time,
-                        Period=86400,
-                        Statistics=['Sum']
+                    # 过去30天的查询数
+                    total_queries = self._metric_sum(
+                        cloudwatch, 'us-east-1', 'AWS/Route53', 'QueryCount',
+                        [{'Name': 'HostedZoneId', 'Value': zone_id}]
                     )
                     
-                    total_queries = sum([point['Sum'] for point in query_response['Datapoints']])
-                    
                     # Route 53 查询费用: $0.40/百万次查询
                     query_cost = (total_queries / 1000000) * 0.40
                     
@@ -475,6 +445,7 @@ class TrafficCollector(BaseCollector):
                     print(f"获取Route 53区域 {zone_name} 查询数据失败: {e}")
                     
         except Exception as e:
+            self.mark_region_failed('Global')
             print(f"获取Route 53流量费用失败: {e}")
         
         return traffic_data
@@ -70,7 +70,7 @@ class VPCCollector(BaseCollector):
             
             for nat in nat_gateways:
                 # NAT Gateway基础价格
-                nat_hourly_cost = self.price_manager.get_nat_gateway_price(region)
+                nat_hourly_cost = self.price_manager.get_nat_gateway_price(region)['hourly_rate']
                 # NAT Gateway的Public IP也要收费
                 public_ip_cost = self.price_manager.get_public_ip_price(region)
                 total_hourly_cost = nat_hourly_cost + public_ip_cost
@@ -85,6 +85,7 @@ class VPCCollector(BaseCollector):
                 })
                 
         except Exception as e:
+            self.mark_region_failed(region)
             if hasattr(self, 'logger'):
                 self.logger.error(f"扫描VPC失败 ({region}): {e}")
             else:
@@ -94,6 +95,6 @@ class VPCCollector(BaseCollector):
     def scan_all_regions(self):
         """扫描所有区域的VPC资源"""
         all_services = []
-        for region in self.regions:
-            all_services.extend(self.scan_region(region))
+        for region in self.regions_to_scan():
+            all_services.extend(self.timed_scan_region(region))
         return all_services
\ No newline at end of file
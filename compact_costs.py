@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本明细压缩工具 - 按保留策略把过期的小时明细压缩为每日汇总
+
+示例:
+    python compact_costs.py --dry-run
+    python compact_costs.py --hourly-days 30 --daily-days 730
+    python compact_costs.py --enqueue
+    python compact_costs.py --rebuild-rollups
+"""
+
+import argparse
+import time
+
+from database.db_manager import DatabaseManager
+from database.retention import RetentionManager
+from jobs.job_queue import JobQueue
+from utils.db_config import get_db_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按保留策略压缩成本明细')
+    parser.add_argument('--hourly-days', type=int, help='小时明细保留天数 (默认RETENTION_HOURLY_DAYS)')
+    parser.add_argument('--daily-days', type=int, help='每日汇总保留天数 (默认RETENTION_DAILY_DAYS, 0为永久)')
+    parser.add_argument('--dry-run', action='store_true', help='只显示将要压缩的分区')
+    parser.add_argument('--enqueue', action='store_true', help='提交到任务队列，由scan_worker在后台执行')
+    parser.add_argument('--rebuild-rollups', action='store_true', help='从历史明细重建成本历史汇总表 (升级后首次启动时自动执行)')
+    args = parser.parse_args()
+
+    if args.rebuild_rollups:
+        started = time.perf_counter()
+        snapshots = DatabaseManager(get_db_config()).rebuild_cost_rollups()
+        print(f"汇总表重建完成: {snapshots} 个小时快照, 耗时 {time.perf_counter() - started:.1f}s")
+        return
+
+    if args.enqueue:
+        job_id = JobQueue().enqueue('compact', {
+            'source': 'manual', 'hourly_days': args.hourly_days, 'daily_days': args.daily_days
+        })
+        print(f"已提交压缩任务 #{job_id}" if job_id else "已有未完成的压缩任务")
+        return
+
+    manager = RetentionManager(DatabaseManager(get_db_config()), args.hourly_days, args.daily_days)
+    stats = manager.compact(dry_run=args.dry_run)
+    print(f"压缩完成: {stats['days']} 天, {stats['rollup_rows']} 条每日汇总, "
+          f"删除分区 {len(stats['dropped_partitions'])} 个, 清理每日汇总 {stats['purged_daily_rows']} 条")
+
+
+if __name__ == '__main__':
+    main()
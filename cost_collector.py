@@ -6,14 +6,20 @@ AWS成本数据收集器 V2 - 模块化版本
 
 import boto3
 import schedule
+import threading
 import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from pricing.price_manager import PriceManager
 from database.db_manager import DatabaseManager
+from database.retention import get_compaction_time
+from jobs.job_queue import JobQueue
 from utils.db_config import get_db_config
+from utils.accounts import AccountRegistry
 from utils.logger import setup_logger, get_log_config
+from monitoring.instrumentation import instrument_session, record_collection
+from monitoring.tracing import start_trace, end_trace, span, wrap_context, trace_session, get_trace_export_dir
 from collectors.ec2_collector import EC2Collector
 from collectors.vpc_collector import VPCCollector
 from collectors.rds_collector import RDSCollector
@@ -26,81 +32,258 @@ from collectors.route53_collector import Route53Collector
 from collectors.dynamodb_collector import DynamoDBCollector
 from collectors.sns_sqs_collector import SNSSQSCollector
 from collectors.traffic_collector import TrafficCollector
+from collectors.regions import RegionPlanner
+from collectors.cadence import ScanCadence
+from collectors.events import EventInventoryUpdater, get_event_config, get_event_feed
 
 
 class CostCollectorV2:
-    def __init__(self):
-        self.session = boto3.Session()
-        self.price_manager = PriceManager()
+    def __init__(self, session=None, accounts=None, session_hook=None):
+        """accounts: 要扫描的账号列表 (默认读取AWS_ACCOUNTS_FILE)；session_hook: 对AssumeRole得到的Session的额外处理"""
+        self.session = trace_session(instrument_session(session or boto3.Session()))
+        self.price_manager = PriceManager(session)
         # 设置日志
         log_config = get_log_config()
         self.logger = setup_logger('aws_cost_collector', log_config['path'], log_config['level'])
         
         self.db_manager = DatabaseManager(get_db_config())
         
-        # 初始化各种收集器
+        # 每个账号的Session同样接入监控和追踪
+        def prepare_session(account_session):
+            if session_hook:
+                account_session = session_hook(account_session)
+            return trace_session(instrument_session(account_session))
+        
+        self.account_registry = AccountRegistry(self.session, accounts, session_hook=prepare_session)
+        
+        # 当前凭证的收集器；其他账号的收集器在第一次扫描时创建
+        self.collectors = self._build_collectors(self.session)
+        self.account_collectors = {}
+        self.region_planners = {}
+        self.cadences = {}
+        self.event_feed = None
+        self._collectors_lock = threading.Lock()
+    
+    def _build_collectors(self, session):
+        """初始化各种收集器"""
         collectors = [
-            EC2Collector(self.session, self.price_manager),
-            VPCCollector(self.session, self.price_manager),
-            RDSCollector(self.session, self.price_manager),
-            EBSCollector(self.session, self.price_manager),
-            S3Collector(self.session, self.price_manager),
-            CloudFrontCollector(self.session, self.price_manager),
-            LambdaCollector(self.session, self.price_manager),
-            ELBCollector(self.session, self.price_manager),
-            Route53Collector(self.session, self.price_manager),
-            DynamoDBCollector(self.session, self.price_manager),
-            SNSSQSCollector(self.session, self.price_manager),
-            TrafficCollector(self.session, self.price_manager)
+            EC2Collector(session, self.price_manager),
+            VPCCollector(session, self.price_manager),
+            RDSCollector(session, self.price_manager),
+            EBSCollector(session, self.price_manager),
+            S3Collector(session, self.price_manager),
+            CloudFrontCollector(session, self.price_manager),
+            LambdaCollector(session, self.price_manager),
+            ELBCollector(session, self.price_manager),
+            Route53Collector(session, self.price_manager),
+            DynamoDBCollector(session, self.price_manager),
+            SNSSQSCollector(session, self.price_manager),
+            TrafficCollector(session, self.price_manager)
         ]
         
         # 传递logger给收集器
         for collector in collectors:
             collector.logger = self.logger
         
-        self.collectors = collectors
+        return collectors
     
-    def get_running_services(self):
-        """使用多线程获取所有运行中的服务"""
-        all_services = []
+    def get_account_collectors(self, account):
+        """账号对应的收集器和区域扫描计划 (缓存)"""
+        account_id = account['account_id']
+        with self._collectors_lock:
+            collectors = self.account_collectors.get(account_id)
+            if collectors is None:
+                session = self.account_registry.get_session(account)
+                collectors = self.collectors if session is self.session else self._build_collectors(session)
+                planner = RegionPlanner(session, account.get('regions'), logger=self.logger)
+                for collector in collectors:
+                    collector.region_planner = planner
+                    collector.account_id = account_id
+                self.account_collectors[account_id] = collectors
+                self.region_planners[account_id] = planner
+                self.cadences[account_id] = ScanCadence(account_id=account_id)
+            return collectors, self.region_planners[account_id]
+    
+    def get_running_services(self, force=False, now=None):
+        """并行扫描所有账号，每个账号内的收集器并发数受max_concurrency限制；force=True时忽略刷新节奏"""
+        accounts = self.account_registry.accounts
+        if len(accounts) == 1:
+            return self._scan_account(accounts[0], force, now)
         
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            
-            # 提交收集任务
-            for collector in self.collectors:
-                futures.append(executor.submit(collector.scan_all_regions))
-            
-            # 收集结果
+        all_services = []
+        with ThreadPoolExecutor(max_workers=self.account_registry.parallel_accounts) as executor:
+            futures = {
+                executor.submit(wrap_context(self._scan_account), account, force, now): account
+                for account in accounts
+            }
             for future in as_completed(futures):
                 try:
-                    services = future.result()
-                    all_services.extend(services)
+                    all_services.extend(future.result())
                 except Exception as e:
-                    print(f"扫描任务失败: {e}")
+                    self.logger.error(f"扫描账号失败 ({futures[future]['name']}): {e}")
         
         return all_services
     
-    def collect_and_save(self):
-        """收集并保存成本数据"""
-        self.logger.info("开始收集成本数据...")
+    def _scan_account(self, account, force=False, now=None):
+        """使用多线程获取一个账号中所有运行中的服务"""
+        all_services = []
+        collectors, planner = self.get_account_collectors(account)
+        cadence = self.cadences[account['account_id']]
         
-        # 检查月度重置
-        self.db_manager.check_monthly_reset()
+        # 未到刷新时间的收集器沿用上一次的结果
+        now = now or datetime.now()
+        due = []
+        reused = []
+        for collector in collectors:
+            cached = None if force or cadence.is_due(collector, now) else cadence.cached(collector, now)
+            if cached is None:
+                due.append(collector)
+            else:
+                all_services.extend(cached)
+                reused.append(collector.collector_name)
         
-        # 刷新价格缓存
-        self.price_manager.refresh_cache()
+        # 刷新启用的区域；非全量扫描时各收集器会跳过最近为空的区域
+        regions = planner.start_scan(now)
+        for collector in due:
+            collector.regions = regions
+            collector.failed_regions = set()
         
-        # 获取服务数据
-        services = self.get_running_services()
+        with span(f"account {account['name']}", kind='account', account_id=account['account_id']):
+            with ThreadPoolExecutor(max_workers=self.account_registry.max_concurrency(account)) as executor:
+                # 提交收集任务 (带上当前追踪上下文)
+                futures = {
+                    executor.submit(wrap_context(self._scan_collector), collector): collector
+                    for collector in due
+                }
+                
+                # 收集结果
+                for future in as_completed(futures):
+                    collector = futures[future]
+                    try:
+                        services = future.result()
+                        if collector.failed_regions:
+                            # 部分区域扫描失败: 不更新刷新节奏 (下次快照重新扫描)，失败区域沿用有效期内的旧结果
+                            cached = cadence.cached(collector, now)
+                            if cached is not None:
+                                failed = collector.failed_regions
+                                services = [s for s in services if s.get('region') not in failed] + [
+                                    s for s in cached if s.get('region') in failed
+                                ]
+                        else:
+                            cadence.store(collector, services, now)
+                        all_services.extend(services)
+                    except Exception as e:
+                        print(f"扫描任务失败: {e}")
+                        # 扫描失败时仍在有效期内的旧结果继续计入快照
+                        all_services.extend(cadence.cached(collector, now) or [])
         
-        # 保存到数据库
-        total_hourly, total_daily, service_breakdown = self.db_manager.save_cost_data(services)
+        if reused:
+            self.logger.info(f"账号 {account['name']}: 沿用上次结果 {', '.join(sorted(reused))}")
+        if planner.skipped:
+            self.logger.info(f"账号 {account['name']}: 跳过 {planner.skipped} 个最近为空的 (服务, 区域)")
+        
+        for service in all_services:
+            service['account_id'] = account['account_id']
+        return all_services
+    
+    def resolve_event_account(self, account_id):
+        """事件中的账号对应的 (记录用账号ID, 收集器)；单账号且账号ID未知时所有事件都归入该账号"""
+        accounts = self.account_registry.accounts
+        for account in accounts:
+            if account['account_id'] == account_id:
+                return account['account_id'], self.get_account_collectors(account)[0]
+        if len(accounts) == 1 and not accounts[0]['account_id']:
+            return '', self.get_account_collectors(accounts[0])[0]
+        return None
+    
+    def process_events(self, feed=None):
+        """处理一批资源生命周期事件，增量更新最新快照"""
+        if feed is None:
+            if self.event_feed is None:
+                self.event_feed = get_event_feed(self.session)
+            feed = self.event_feed
+        if feed is None:
+            return {}
         
-        self.logger.info(f"收集完成: {len(services)}个服务, 每小时${total_hourly:.2f}, 每日${total_daily:.2f}")
+        updater = EventInventoryUpdater(feed, self.db_manager, self.resolve_event_account, self.logger)
+        try:
+            return updater.process()
+        except Exception as e:
+            self.logger.error(f"处理资源事件失败: {e}")
+            return {'error': str(e)}
+    
+    def _scan_collector(self, collector):
+        with span(f"collector {collector.collector_name}", kind='collector', collector=collector.collector_name):
+            return collector.scan_all_regions()
+    
+    def collect_and_save(self, force=False, now=None):
+        """收集并保存成本数据；force=True时所有收集器都重新扫描，now用于按计划时间决定哪些收集器需要刷新"""
+        self.logger.info("开始收集成本数据...")
+        start = time.perf_counter()
+        started_at = datetime.now().isoformat()
+        trace = start_trace('collect_and_save')
+        success = False
+        error = None
+        resource_count = 0
         
-        # 更新月度统计
-        self.db_manager.update_monthly_summary(total_daily, service_breakdown)
+        try:
+            # 扫描期间暂停应用资源事件，扫描结果保存后再应用
+            self.db_manager.set_scan_in_progress(started_at)
+            
+            # 检查月度重置
+            with span('check_monthly_reset'):
+                self.db_manager.check_monthly_reset()
+            
+            # 刷新价格缓存
+            with span('refresh_cache'):
+                self.price_manager.refresh_cache()
+            
+            # 获取服务数据
+            with span('get_running_services'):
+                services = self.get_running_services(force, now)
+            resource_count = len(services)
+            
+            # 保存到数据库: 快照时间为扫描开始时间，扫描期间发生的资源事件晚于快照，之后仍会应用
+            with span('save_cost_data'):
+                total_hourly, total_daily, service_breakdown = self.db_manager.save_cost_data(services, started_at)
+            
+            self.logger.info(f"收集完成: {len(services)}个服务, 每小时${total_hourly:.2f}, 每日${total_daily:.2f}")
+            
+            # 更新月度统计
+            with span('update_monthly_summary'):
+                self.db_manager.update_monthly_summary(total_daily, service_breakdown)
+            success = True
+        except Exception as e:
+            error = e
+            try:
+                self.db_manager.set_scan_in_progress(None)
+            except Exception as clear_error:
+                self.logger.error(f"清除扫描状态失败: {clear_error}")
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            record_collection(duration, success)
+            end_trace(trace, error)
+            self._save_trace(trace, started_at, duration, success, resource_count)
+    
+    def _save_trace(self, trace, started_at, duration, success, resource_count):
+        """保存本次扫描的耗时分解，并按需导出追踪文件"""
+        try:
+            self.db_manager.save_scan_run(
+                trace.trace_id, started_at, duration,
+                'success' if success else 'error', resource_count, trace.summary()
+            )
+            export_dir = get_trace_export_dir()
+            if export_dir:
+                trace.export(export_dir)
+        except Exception as e:
+            self.logger.warning(f"保存扫描追踪失败: {e}")
+    
+    def enqueue_compaction(self):
+        """提交明细压缩任务到任务队列"""
+        job_id = JobQueue().enqueue('compact', {'source': 'schedule'})
+        if job_id:
+            self.logger.info(f"已提交明细压缩任务 #{job_id}")
     
     def start_scheduler(self):
         """启动定时任务"""
@@ -112,11 +295,22 @@ class CostCollectorV2:
         # 每小时执行
         schedule.every().hour.do(self.collect_and_save)
         
+        # 每天把过期明细的压缩交给后台worker，不占用收集进程
+        schedule.every().day.at(get_compaction_time()).do(self.enqueue_compaction)
+        
+        # 配置了事件来源时，在两次完整扫描之间按事件增量更新最新快照
+        poll_seconds = 60
+        self.event_feed = get_event_feed(self.session)
+        if self.event_feed is not None:
+            poll_seconds = min(poll_seconds, get_event_config()['poll_seconds'])
+            schedule.every(poll_seconds).seconds.do(self.process_events)
+            self.logger.info(f"事件驱动更新已启用 (每{poll_seconds}秒)")
+        
         self.logger.info("定时任务已设置 (每小时执行)")
         
         while True:
             schedule.run_pending()
-            time.sleep(60)
+            time.sleep(poll_seconds)
 
 
 if __name__ == '__main__':
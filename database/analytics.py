@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式分析存储 - 把每个快照镜像为按月分区的Parquet文件，用DuckDB执行历史聚合查询
+
+目录结构: {ANALYTICS_PATH}/cost_records/year_month=YYYY-MM/*.parquet
+每个快照写一个文件 (先写临时文件再改名，读取方不会看到半个文件)，
+月份结束后由压缩任务合并为单个文件。
+
+需要安装 duckdb 和 pyarrow；未安装或未启用时DatabaseManager回退到关系数据库查询。
+"""
+
+import glob
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+try:
+    import duckdb
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+
+SCHEMA_FIELDS = [
+    ('timestamp', 'timestamp'),
+    ('service_type', 'string'),
+    ('resource_id', 'string'),
+    ('region', 'string'),
+    ('instance_type', 'string'),
+    ('hourly_cost', 'float64'),
+    ('daily_cost', 'float64'),
+    ('account_id', 'string')
+]
+
+
+def get_analytics_config():
+    """分析存储配置: ANALYTICS_STORE=duckdb 时启用"""
+    return {
+        'enabled': os.getenv('ANALYTICS_STORE', '').lower() == 'duckdb',
+        'path': os.getenv('ANALYTICS_PATH', 'data/analytics')
+    }
+
+
+def get_analytics_store():
+    """按环境变量创建分析存储，未启用时返回None"""
+    config = get_analytics_config()
+    if not config['enabled']:
+        return None
+    if not DUCKDB_AVAILABLE:
+        print("警告: 已设置ANALYTICS_STORE=duckdb，但duckdb/pyarrow未安装，分析查询回退到关系数据库")
+        print("安装命令: pip install duckdb pyarrow")
+        return None
+    return AnalyticsStore(config['path'])
+
+
+class AnalyticsStore:
+    def __init__(self, path):
+        self.path = path
+        self.root = os.path.join(path, 'cost_records')
+        os.makedirs(self.root, exist_ok=True)
+        self.schema = pa.schema([
+            (name, pa.timestamp('s') if kind == 'timestamp' else getattr(pa, kind)())
+            for name, kind in SCHEMA_FIELDS
+        ])
+
+    def _month_dir(self, year_month):
+        return os.path.join(self.root, f'year_month={year_month}')
+
+    def mirror_snapshot(self, timestamp, records):
+        """写入一个快照: records为 (service_type, service字典) 列表"""
+        snapshot_time = datetime.fromisoformat(timestamp).replace(microsecond=0, tzinfo=None)
+        columns = {
+            'timestamp': [snapshot_time] * len(records),
+            'service_type': [service_type for service_type, _ in records],
+            'resource_id': [service['resource_id'] for _, service in records],
+            'region': [service['region'] for _, service in records],
+            'instance_type': [str(service.get('instance_type') or '') for _, service in records],
+            'hourly_cost': [float(service['hourly_cost']) for _, service in records],
+            'daily_cost': [float(service['daily_cost']) for _, service in records],
+            'account_id': [service.get('account_id') or '' for _, service in records]
+        }
+        table = pa.Table.from_pydict(columns, schema=self.schema)
+
+        month_dir = self._month_dir(timestamp[:7])
+        os.makedirs(month_dir, exist_ok=True)
+        path = os.path.join(month_dir, f"snapshot_{snapshot_time.strftime('%Y%m%dT%H%M%S')}.parquet")
+        pq.write_table(table, path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+        return path
+
+    def has_data(self):
+        return bool(glob.glob(os.path.join(self.root, '*', '*.parquet')))
+
+    def earliest_timestamp(self):
+        """最早的快照时间，没有数据时返回None
+        只看最早的月份分区: 未合并的快照文件名即快照时间，合并后的月份文件由DuckDB读取最小值"""
+        for month_dir in sorted(glob.glob(os.path.join(self.root, 'year_month=*'))):
+            snapshots = sorted(glob.glob(os.path.join(month_dir, 'snapshot_*.parquet')))
+            earliest = None
+            if snapshots:
+                name = os.path.basename(snapshots[0])[len('snapshot_'):-len('.parquet')]
+                earliest = datetime.strptime(name, '%Y%m%dT%H%M%S')
+            merged = os.path.join(month_dir, 'month.parquet')
+            if os.path.exists(merged):
+                conn = duckdb.connect()
+                try:
+                    value = conn.execute(f"SELECT MIN(timestamp) FROM read_parquet('{merged}')").fetchone()[0]
+                finally:
+                    conn.close()
+                if value is not None and (earliest is None or value < earliest):
+                    earliest = value
+            if earliest is not None:
+                return earliest
+        return None
+
+    def query(self, sql, params=None, months=None):
+        """在cost_records视图上执行查询；months为需要读取的月份下限 (分区裁剪)"""
+        if not self.has_data():
+            return []
+
+        conn = duckdb.connect()
+        try:
+            source = os.path.join(self.root, '*', '*.parquet')
+            month_filter = f"WHERE year_month >= '{months}'" if months else ''
+            conn.execute(f'''
+                CREATE VIEW cost_records AS
+                SELECT * FROM read_parquet('{source}', hive_partitioning = true, union_by_name = true) {month_filter}
+            ''')
+            return conn.execute(sql, params or []).fetchall()
+        finally:
+            conn.close()
+
+    def monthly_service_costs(self, months=12):
+        """按月、按服务汇总实际成本 (每个小时快照的hourly_cost之和)"""
+        since = _months_ago(months)
+        return self.query('''
+            SELECT year_month, service_type, SUM(hourly_cost) AS cost
+            FROM cost_records
+            GROUP BY year_month, service_type
+            ORDER BY year_month, cost DESC
+        ''', months=since)
+
+    def top_resources(self, days=90, limit=20, service_type=None):
+        """最近days天成本最高的资源 (不同账号的同名资源分别统计)"""
+        since = datetime.now() - timedelta(days=days)
+        sql = '''
+            SELECT service_type, resource_id, region, COALESCE(account_id, '') AS account_id,
+                   SUM(hourly_cost) AS cost, COUNT(*) AS hours
+            FROM cost_records WHERE timestamp >= ?
+        '''
+        params = [since]
+        if service_type:
+            sql += ' AND service_type = ?'
+            params.append(service_type)
+        sql += " GROUP BY service_type, resource_id, region, COALESCE(account_id, '') ORDER BY cost DESC LIMIT ?"
+        params.append(int(limit))
+        return self.query(sql, params, months=since.strftime('%Y-%m'))
+
+    def region_trend(self, days=30):
+        """最近days天每天各区域的成本"""
+        since = datetime.now() - timedelta(days=days)
+        return self.query('''
+            SELECT strftime(timestamp, '%Y-%m-%d') AS day, region, SUM(hourly_cost) AS cost
+            FROM cost_records WHERE timestamp >= ?
+            GROUP BY day, region
+            ORDER BY day, region
+        ''', [since], months=since.strftime('%Y-%m'))
+
+    def compact_partitions(self):
+        """把已结束月份的快照文件合并为单个文件，返回合并的月份"""
+        current_month = datetime.now().strftime('%Y-%m')
+        merged = []
+        for month_dir in sorted(glob.glob(os.path.join(self.root, 'year_month=*'))):
+            year_month = month_dir.rsplit('=', 1)[1]
+            files = sorted(glob.glob(os.path.join(month_dir, 'snapshot_*.parquet')))
+            if year_month >= current_month or not files:
+                continue
+
+            # 在分区目录之外合并 (DuckDB流式处理，内存占用与月份大小无关)，再整体替换目录
+            sources = files + glob.glob(os.path.join(month_dir, 'month.parquet'))
+            staging_dir = os.path.join(self.path, 'staging', f'year_month={year_month}')
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            os.makedirs(staging_dir)
+            conn = duckdb.connect()
+            try:
+                conn.execute(f'''
+                    COPY (SELECT * FROM read_parquet({sources!r}, union_by_name = true) ORDER BY timestamp)
+                    TO '{os.path.join(staging_dir, 'month.parquet')}' (FORMAT PARQUET, COMPRESSION ZSTD)
+                ''')
+            finally:
+                conn.close()
+
+            old_dir = os.path.join(self.path, 'staging', f'old_{year_month}')
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(month_dir, old_dir)
+            os.replace(staging_dir, month_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+            merged.append(year_month)
+        return merged
+
+    def backfill(self, db_manager, start_time=None, end_time=None):
+        """从关系数据库回填历史快照，返回写入的快照数"""
+        snapshots = 0
+        current_timestamp = None
+        records = []
+        for rows in db_manager.iter_cost_records(start_time, end_time):
+            for timestamp, service_type, resource_id, region, hourly_cost, daily_cost, details, account_id in rows:
+                if timestamp != current_timestamp:
+                    if records:
+                        self.mirror_snapshot(current_timestamp, records)
+                        snapshots += 1
+                    current_timestamp, records = timestamp, []
+                records.append((service_type, {
+                    'resource_id': resource_id, 'region': region, 'instance_type': _instance_type(details),
+                    'hourly_cost': hourly_cost, 'daily_cost': daily_cost, 'account_id': account_id
+                }))
+        if records:
+            self.mirror_snapshot(current_timestamp, records)
+            snapshots += 1
+        return snapshots
+
+
+def _months_ago(months):
+    """months个月前的月份 (YYYY-MM)，包含当月"""
+    now = datetime.now()
+    index = now.year * 12 + now.month - 1 - (months - 1)
+    return f'{index // 12}-{index % 12 + 1:02d}'
+
+
+def _instance_type(details):
+    try:
+        return json.loads(details).get('instance_type', '')
+    except (TypeError, ValueError, AttributeError):
+        return ''
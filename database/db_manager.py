@@ -5,11 +5,134 @@
 """
 
 import sqlite3
+import hashlib
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
 
+from monitoring.instrumentation import time_db_write, record_rows_written
+from database.analytics import get_analytics_store
+
+
+COST_RECORD_COLUMNS = [
+    'id', 'timestamp', 'service_type', 'resource_id', 'region', 'hourly_cost', 'daily_cost', 'details', 'resource_key',
+    'account_id'
+]
+
+# 每小时变化的成本字段，不计入资源属性
+COST_FIELDS = ('hourly_cost', 'daily_cost', 'monthly_cost')
+
+# 资源维度的标识字段
+RESOURCE_KEY_FIELDS = ('service', 'resource_id', 'region', 'account_id')
+
+# 计入资源维度的静态类型/配置字段 (白名单，流量记录的details中同名字段同样计入)；
+# 其余字段 (用量、指标、时间戳等) 每次扫描都可能变化，随每条成本记录保存在details中。
+# instance_type中带用量的收集器 (Lambda、S3等) 另外给出静态的resource_type，此时instance_type也按用量保存
+RESOURCE_CONFIG_FIELDS = (
+    'resource_type', 'engine', 'deployment', 'table_class', 'memory_mb', 'architecture', 'iops', 'throughput',
+    'traffic_type', 'load_balancer_type', 'vpc_id', 'subnet_id', 'public_ip', 'zone_name', 'domain_name'
+)
+
+# 进程内缓存的资源属性哈希数量上限
+RESOURCE_KEY_CACHE_SIZE = 200000
+
+# 预聚合的时间序列粒度 (每个粒度一张表: cost_rollup_hour/day/week)
+ROLLUP_RESOLUTIONS = ('hour', 'day', 'week')
+
+# 汇总表中每个时间桶的合计行 (所有服务和区域)，其samples为该时间桶内的快照数
+ROLLUP_TOTAL = '*'
+
+# 分析存储和关系数据库最早数据时间的缓存时间(秒)；回填在其他进程中运行，过期后重新读取
+ANALYTICS_COVERAGE_TTL = 300
+
+
+def next_month(year_month):
+    """'2024-12' -> '2025-01'"""
+    year, month = int(year_month[:4]), int(year_month[5:7])
+    return f"{year + month // 12}-{month % 12 + 1:02d}"
+
+
+def partition_table_name(year_month):
+    """月份对应的分区表名: cost_records_YYYYMM"""
+    return f"cost_records_{year_month.replace('-', '')}"
+
+
+def rollup_bucket(timestamp, resolution):
+    """快照时间所在的时间桶: 整点 / 日期 / 所在周的周一"""
+    if resolution == 'hour':
+        return f"{timestamp[:13]}:00:00"
+    day = datetime.fromisoformat(timestamp[:10])
+    if resolution == 'week':
+        day -= timedelta(days=day.weekday())
+    return day.strftime('%Y-%m-%d')
+
+
+def pick_rollup_resolution(hours):
+    """按查询范围选择粒度，使图表的点数保持在几百以内"""
+    if hours <= 72:
+        return 'hour'
+    if hours <= 24 * 180:
+        return 'day'
+    return 'week'
+
+
+def cost_service_type(service):
+    """成本记录的服务类型: 流量相关的服务统一归类为Traffic"""
+    service_type = service['service']
+    if service_type in ['NAT Gateway', 'VPC Endpoint', 'ELB', 'CloudFront', 'Route 53', 'EC2']:
+        # 检查是否为流量相关的EC2记录
+        if service_type == 'EC2':
+            details = service.get('details', {})
+            if details.get('traffic_type') == 'Data Transfer Out':
+                service_type = 'Traffic'
+        else:
+            service_type = 'Traffic'  # 其他流量服务统一归类
+    return service_type
+
+
+def _is_static_field(service, key):
+    if key in RESOURCE_KEY_FIELDS or key in RESOURCE_CONFIG_FIELDS:
+        return True
+    return key == 'instance_type' and 'resource_type' not in service
+
+
+def resource_attributes(service):
+    """拆分资源的字段，返回 (静态属性JSON, 内容哈希, 随成本记录保存的details JSON或None)"""
+    attributes = {}
+    details = {}
+    for key, value in service.items():
+        if key in COST_FIELDS:
+            continue
+        if key == 'details' and isinstance(value, dict):
+            static = {k: v for k, v in value.items() if k in RESOURCE_CONFIG_FIELDS}
+            if static:
+                attributes['details'] = static
+            if len(static) < len(value):
+                details['details'] = {k: v for k, v in value.items() if k not in RESOURCE_CONFIG_FIELDS}
+        elif _is_static_field(service, key):
+            attributes[key] = value
+        else:
+            details[key] = value
+    attributes_json = json.dumps(attributes, sort_keys=True, ensure_ascii=False, default=str)
+    details_json = json.dumps(details, sort_keys=True, ensure_ascii=False, default=str) if details else None
+    return attributes_json, hashlib.sha1(attributes_json.encode('utf-8')).hexdigest(), details_json
+
+
+def merge_details(attributes_json, details_json):
+    """合并资源的静态属性和成本记录自身的details (旧数据只有其中之一)，返回JSON"""
+    if not attributes_json or not details_json:
+        return attributes_json or details_json
+    try:
+        merged = json.loads(attributes_json)
+        details = json.loads(details_json)
+    except (TypeError, ValueError):
+        return attributes_json or details_json
+    if isinstance(merged.get('details'), dict) and isinstance(details.get('details'), dict):
+        details['details'] = {**merged['details'], **details['details']}
+    merged.update(details)
+    return json.dumps(merged, ensure_ascii=False)
+
 
 class DatabaseManager:
     def __init__(self, db_config=None):
@@ -24,7 +147,11 @@ class DatabaseManager:
             os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         elif self.db_type in ['postgresql', 'mysql']:
             self.db_url = self._build_db_url(db_config)
-            
+        
+        # 可选的列式分析存储 (ANALYTICS_STORE=duckdb)，覆盖查询范围的聚合查询路由到这里
+        self.analytics = get_analytics_store()
+        self._coverage = None
+        self._coverage_warned = False
         self.init_database()
     
     def _build_db_url(self, config):
@@ -78,25 +205,73 @@ class DatabaseManager:
             id_type = 'INTEGER PRIMARY KEY AUTOINCREMENT'
             text_type = 'TEXT'
             real_type = 'REAL'
+            sum_type = 'REAL'
         elif self.db_type == 'postgresql':
             id_type = 'SERIAL PRIMARY KEY'
             text_type = 'VARCHAR(255)'
             real_type = 'DECIMAL(10,4)'
+            sum_type = 'DECIMAL(18,4)'
         elif self.db_type == 'mysql':
             id_type = 'INT AUTO_INCREMENT PRIMARY KEY'
             text_type = 'VARCHAR(255)'
             real_type = 'DECIMAL(10,4)'
+            sum_type = 'DECIMAL(18,4)'
+        
+        self._init_cost_records(cursor, text_type, real_type)
         
+        # 资源维度表: 静态属性按内容哈希去重，cost_records通过resource_key引用
         cursor.execute(f'''
-            CREATE TABLE IF NOT EXISTS cost_records (
+            CREATE TABLE IF NOT EXISTS resources (
                 id {id_type},
-                timestamp {text_type} NOT NULL,
+                attr_hash {text_type} NOT NULL,
+                service {text_type} NOT NULL,
+                resource_id {text_type} NOT NULL,
+                region {text_type} NOT NULL,
+                instance_type {text_type},
+                attributes TEXT NOT NULL,
+                first_seen {text_type} NOT NULL
+            )
+        ''')
+        
+        # 按服务和区域预聚合的时间序列，与明细在同一事务中写入
+        # 合计列是时间桶内所有快照之和 (每周最多168个快照)，使用比单条成本更宽的类型
+        for resolution in ROLLUP_RESOLUTIONS:
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS cost_rollup_{resolution} (
+                    id {id_type},
+                    bucket {text_type} NOT NULL,
+                    service_type {text_type} NOT NULL,
+                    region {text_type} NOT NULL,
+                    hourly_cost_sum {sum_type} NOT NULL,
+                    daily_cost_sum {sum_type} NOT NULL,
+                    samples INTEGER NOT NULL
+                )
+            ''')
+            for column in ('hourly_cost_sum', 'daily_cost_sum'):
+                self._widen_decimal_column(cursor, f'cost_rollup_{resolution}', column, sum_type, 18)
+        
+        # 超过保留期的小时明细压缩为每日汇总 (每个账号的资源各一行)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS cost_records_daily (
+                id {id_type},
+                day {text_type} NOT NULL,
                 service_type {text_type} NOT NULL,
                 resource_id {text_type} NOT NULL,
                 region {text_type} NOT NULL,
                 hourly_cost {real_type} NOT NULL,
                 daily_cost {real_type} NOT NULL,
-                details TEXT
+                samples INTEGER NOT NULL,
+                account_id {text_type}
+            )
+        ''')
+        self._ensure_column(cursor, 'cost_records_daily', 'account_id', text_type)
+        
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS compaction_log (
+                id {id_type},
+                unit {text_type} NOT NULL,
+                rollup_rows INTEGER NOT NULL,
+                compacted_at {text_type} NOT NULL
             )
         ''')
         
@@ -118,13 +293,23 @@ class DatabaseManager:
                 region {text_type} NOT NULL,
                 hourly_cost {real_type} NOT NULL,
                 daily_cost {real_type} NOT NULL,
-                details TEXT
+                details TEXT,
+                account_id {text_type}
             )
         ''')
+        self._ensure_column(cursor, 'lambda_records', 'account_id', text_type)
         
         if self.db_type != 'sqlite':
+            # 不同账号可能有同名函数，唯一键包含账号
             try:
-                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_lambda_records_unique ON lambda_records(timestamp, resource_id, region)')
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_lambda_records_account_unique ON lambda_records(timestamp, account_id, resource_id, region)')
+            except:
+                pass
+            try:
+                if self.db_type == 'postgresql':
+                    cursor.execute('DROP INDEX IF EXISTS idx_lambda_records_unique')
+                else:
+                    cursor.execute('DROP INDEX idx_lambda_records_unique ON lambda_records')
             except:
                 pass
         
@@ -138,85 +323,490 @@ class DatabaseManager:
             )
         ''')
         
+        # 最新快照: 每个存活资源一行 + 指向最新快照的指针，当前视图只读这两张小表
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS latest_resources (
+                id {id_type},
+                timestamp {text_type} NOT NULL,
+                service_type {text_type} NOT NULL,
+                resource_id {text_type} NOT NULL,
+                region {text_type} NOT NULL,
+                hourly_cost {real_type} NOT NULL,
+                daily_cost {real_type} NOT NULL,
+                resource_key INTEGER,
+                details TEXT,
+                account_id {text_type}
+            )
+        ''')
+        self._ensure_column(cursor, 'latest_resources', 'account_id', text_type)
+        
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS latest_snapshot (
+                id {id_type},
+                timestamp {text_type} NOT NULL,
+                total_hourly_cost {real_type} NOT NULL,
+                total_daily_cost {real_type} NOT NULL,
+                service_breakdown TEXT,
+                resource_count INTEGER NOT NULL,
+                updated_at {text_type} NOT NULL,
+                scan_started_at {text_type}
+            )
+        ''')
+        self._ensure_column(cursor, 'latest_snapshot', 'scan_started_at', text_type)
+        
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS scan_runs (
+                id {id_type},
+                trace_id {text_type} NOT NULL,
+                started_at {text_type} NOT NULL,
+                duration_seconds {real_type} NOT NULL,
+                status {text_type} NOT NULL,
+                resource_count INTEGER,
+                breakdown TEXT
+            )
+        ''')
+        
         if self.db_type == 'mysql':
             try:
                 cursor.execute('CREATE UNIQUE INDEX idx_monthly_summary_year_month ON monthly_summary(year_month)')
             except:
                 pass
+            for index_sql in ['CREATE UNIQUE INDEX idx_resources_attr_hash ON resources(attr_hash)',
+                              'CREATE INDEX idx_latest_resources_service ON latest_resources(service_type)',
+                              'CREATE INDEX idx_latest_resources_account ON latest_resources(account_id)',
+                              'CREATE INDEX idx_cost_records_daily_day ON cost_records_daily(day)',
+                              'CREATE INDEX idx_compaction_log_unit ON compaction_log(unit)'] + [
+                              f'CREATE UNIQUE INDEX idx_cost_rollup_{r}_key ON cost_rollup_{r}(bucket, service_type, region)'
+                              for r in ROLLUP_RESOLUTIONS]:
+                try:
+                    cursor.execute(index_sql)
+                except:
+                    pass
+        else:
+            if self.db_type == 'postgresql':
+                try:
+                    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_monthly_summary_year_month ON monthly_summary(year_month)')
+                except:
+                    pass
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_resources_attr_hash ON resources(attr_hash)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_latest_resources_service ON latest_resources(service_type)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_latest_resources_account ON latest_resources(account_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_records_daily_day ON cost_records_daily(day)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_compaction_log_unit ON compaction_log(unit)')
+            for resolution in ROLLUP_RESOLUTIONS:
+                cursor.execute(f'''
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_cost_rollup_{resolution}_key
+                    ON cost_rollup_{resolution}(bucket, service_type, region)
+                ''')
+        
+        self._seed_latest_snapshot(cursor)
+        backfill_rollups = self._rollups_missing(cursor)
+        
+        conn.commit()
+        conn.close()
+        
+        if backfill_rollups:
+            print("汇总表为空，从已有历史重建成本历史汇总...")
+            self.rebuild_cost_rollups()
+    
+    def _rollups_missing(self, cursor):
+        """升级后第一次启动: 汇总表为空但已有历史 (快照汇总或压缩后的每日汇总)"""
+        cursor.execute('SELECT 1 FROM cost_rollup_week LIMIT 1')
+        if cursor.fetchone():
+            return False
+        cursor.execute('SELECT 1 FROM cost_summary LIMIT 1')
+        if cursor.fetchone():
+            return True
+        cursor.execute('SELECT 1 FROM cost_records_daily LIMIT 1')
+        return cursor.fetchone() is not None
+    
+    def _seed_latest_snapshot(self, cursor):
+        """升级后首次启动时，用历史中最新的快照初始化latest表"""
+        cursor.execute('SELECT COUNT(*) FROM latest_snapshot')
+        if cursor.fetchone()[0]:
+            return
+        
+        cursor.execute('''
+            SELECT timestamp, total_hourly_cost, total_daily_cost, service_breakdown
+            FROM cost_summary ORDER BY timestamp DESC LIMIT 1
+        ''')
+        summary = cursor.fetchone()
+        if not summary:
+            return
+        
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        timestamp = summary[0]
+        cursor.execute(f'''
+            INSERT INTO latest_resources
+            (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, resource_key, details, account_id)
+            SELECT timestamp, service_type, resource_id, region, hourly_cost, daily_cost, resource_key, details, account_id
+            FROM cost_records WHERE timestamp = {placeholder}
+        ''', (timestamp,))
+        cursor.execute(f'''
+            INSERT INTO latest_resources
+            (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, details, account_id)
+            SELECT timestamp, 'Lambda', resource_id, region, hourly_cost, daily_cost, details, account_id
+            FROM lambda_records WHERE timestamp = {placeholder}
+        ''', (timestamp,))
+        cursor.execute('SELECT COUNT(*) FROM latest_resources')
+        resource_count = cursor.fetchone()[0]
+        cursor.execute(f'''
+            INSERT INTO latest_snapshot
+            (timestamp, total_hourly_cost, total_daily_cost, service_breakdown, resource_count, updated_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ''', tuple(summary) + (resource_count, datetime.now().isoformat()))
+    
+    def _init_cost_records(self, cursor, text_type, real_type):
+        """创建按月分区的cost_records
+        
+        - PostgreSQL: 原生RANGE分区，每月一个子表 cost_records_YYYYMM
+        - MySQL: RANGE COLUMNS分区，每月一个分区 pYYYYMM
+        - SQLite: 每月一张表 cost_records_YYYYMM，cost_records是合并所有月表的视图
+        已存在的未分区表保持可读，由保留策略按天删除过期数据
+        """
+        self._cost_partitions = set()
+        self._resource_keys = {}
+        self._new_resource_rows = 0
+        
+        if self.db_type == 'sqlite':
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute("SELECT type FROM sqlite_master WHERE name = 'cost_records'")
+            existing = cursor.fetchone()
+            if existing and existing[0] == 'table':
+                # 旧版本的单表改名后作为视图的一部分
+                cursor.execute('ALTER TABLE cost_records RENAME TO cost_records_legacy')
+            for table in self._sqlite_partition_tables(cursor):
+                self._ensure_column(cursor, table, 'resource_key', 'INTEGER')
+                self._ensure_column(cursor, table, 'account_id', 'TEXT')
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_account ON {table}(account_id, timestamp)')
+            self.partitioning = 'tables'
+            self._refresh_cost_records_view(cursor)
         elif self.db_type == 'postgresql':
-            try:
-                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_monthly_summary_year_month ON monthly_summary(year_month)')
-            except:
-                pass
+            # 分区键使用C排序规则，保证按ISO时间字符串比较
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS cost_records (
+                    id SERIAL,
+                    timestamp {text_type} COLLATE "C" NOT NULL,
+                    service_type {text_type} NOT NULL,
+                    resource_id {text_type} NOT NULL,
+                    region {text_type} NOT NULL,
+                    hourly_cost {real_type} NOT NULL,
+                    daily_cost {real_type} NOT NULL,
+                    details TEXT,
+                    resource_key INTEGER,
+                    account_id {text_type},
+                    PRIMARY KEY (id, timestamp)
+                ) PARTITION BY RANGE (timestamp)
+            ''')
+            self._ensure_column(cursor, 'cost_records', 'resource_key', 'INTEGER')
+            self._ensure_column(cursor, 'cost_records', 'account_id', text_type)
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'cost_records'")
+            self.partitioning = 'native' if cursor.fetchone()[0] == 'p' else None
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_records_timestamp ON cost_records(timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_records_account ON cost_records(account_id, timestamp)')
+        elif self.db_type == 'mysql':
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS cost_records (
+                    id INT AUTO_INCREMENT,
+                    timestamp {text_type} NOT NULL,
+                    service_type {text_type} NOT NULL,
+                    resource_id {text_type} NOT NULL,
+                    region {text_type} NOT NULL,
+                    hourly_cost {real_type} NOT NULL,
+                    daily_cost {real_type} NOT NULL,
+                    details TEXT,
+                    resource_key INTEGER,
+                    account_id {text_type},
+                    PRIMARY KEY (id, timestamp),
+                    INDEX idx_cost_records_timestamp (timestamp),
+                    INDEX idx_cost_records_account (account_id, timestamp)
+                ) PARTITION BY RANGE COLUMNS(timestamp) (
+                    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+                )
+            ''')
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.PARTITIONS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'cost_records' AND PARTITION_NAME IS NOT NULL
+            ''')
+            self.partitioning = 'native' if cursor.fetchone()[0] else None
+            self._ensure_column(cursor, 'cost_records', 'resource_key', 'INTEGER')
+            if self._ensure_column(cursor, 'cost_records', 'account_id', text_type):
+                cursor.execute('CREATE INDEX idx_cost_records_account ON cost_records(account_id, timestamp)')
+            if self.partitioning is None:
+                try:
+                    cursor.execute('CREATE INDEX idx_cost_records_timestamp ON cost_records(timestamp)')
+                except:
+                    pass
+    
+    def _ensure_column(self, cursor, table, column, column_type):
+        """旧版本的表缺少列时补上，返回是否新增"""
+        if self.db_type == 'sqlite':
+            cursor.execute(f'PRAGMA table_info({table})')
+            exists = column in [row[1] for row in cursor.fetchall()]
+        elif self.db_type == 'postgresql':
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.columns WHERE table_name = %s AND column_name = %s
+            ''', (table, column))
+            exists = cursor.fetchone()[0] > 0
+        else:
+            cursor.execute('''
+                SELECT COUNT(*) FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            ''', (table, column))
+            exists = cursor.fetchone()[0] > 0
+        if not exists:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        return not exists
+    
+    def _widen_decimal_column(self, cursor, table, column, column_type, precision):
+        """旧版本创建的DECIMAL列精度小于precision时扩大为column_type (SQLite的REAL无需处理)"""
+        if self.db_type == 'sqlite':
+            return
+        if self.db_type == 'postgresql':
+            cursor.execute('''
+                SELECT numeric_precision FROM information_schema.columns WHERE table_name = %s AND column_name = %s
+            ''', (table, column))
+        else:
+            cursor.execute('''
+                SELECT NUMERIC_PRECISION FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+            ''', (table, column))
+        row = cursor.fetchone()
+        if not row or row[0] is None or row[0] >= precision:
+            return
+        if self.db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE {column_type}')
+        else:
+            cursor.execute(f'ALTER TABLE {table} MODIFY {column} {column_type} NOT NULL')
+    
+    def _create_sqlite_partition(self, cursor, year_month):
+        name = partition_table_name(year_month)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                service_type TEXT NOT NULL,
+                resource_id TEXT NOT NULL,
+                region TEXT NOT NULL,
+                hourly_cost REAL NOT NULL,
+                daily_cost REAL NOT NULL,
+                details TEXT,
+                resource_key INTEGER,
+                account_id TEXT
+            )
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_timestamp ON {name}(timestamp)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_account ON {name}(account_id, timestamp)')
+        return name
+    
+    def _sqlite_partition_tables(self, cursor):
+        cursor.execute('''
+            SELECT name FROM sqlite_master
+            WHERE type = 'table' AND (name = 'cost_records_legacy' OR name GLOB 'cost_records_[0-9][0-9][0-9][0-9][0-9][0-9]')
+            ORDER BY name
+        ''')
+        return [row[0] for row in cursor.fetchall()]
+    
+    def _cost_records_view_sql(self, tables):
+        columns = ', '.join(COST_RECORD_COLUMNS)
+        return 'CREATE VIEW cost_records AS ' + ' UNION ALL '.join(
+            f'SELECT {columns} FROM {table}' for table in tables
+        )
+    
+    def _current_view_sql(self, cursor):
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'cost_records'")
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _refresh_cost_records_view(self, cursor):
+        """按现有月表重建cost_records视图 (SQLite会把WHERE条件下推到每个月表)
+        
+        只有月表集合变化时才重建；DROP和CREATE在同一个BEGIN IMMEDIATE事务中 (调用方已开启事务时沿用)，
+        并发的读取方不会看到视图不存在，多个进程同时初始化时只有第一个会重建
+        """
+        tables = self._sqlite_partition_tables(cursor)
+        if tables and self._current_view_sql(cursor) == self._cost_records_view_sql(tables):
+            return
+        
+        conn = cursor.connection
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            cursor.execute('BEGIN IMMEDIATE')
+        try:
+            # 取得写锁后重新读取，其他进程可能已经重建
+            tables = self._sqlite_partition_tables(cursor)
+            if not tables:
+                tables = [self._create_sqlite_partition(cursor, datetime.now().strftime('%Y-%m'))]
+            view_sql = self._cost_records_view_sql(tables)
+            if self._current_view_sql(cursor) != view_sql:
+                cursor.execute('DROP VIEW IF EXISTS cost_records')
+                cursor.execute(view_sql)
+            if own_transaction:
+                cursor.execute('COMMIT')
+        except Exception:
+            if own_transaction and conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+    
+    def ensure_cost_partition(self, timestamp):
+        """确保timestamp所在月份的分区存在，返回写入用的表名"""
+        if self.partitioning is None:
+            return 'cost_records'
+        
+        year_month = timestamp[:7]
+        target = partition_table_name(year_month) if self.db_type == 'sqlite' else 'cost_records'
+        if year_month in self._cost_partitions:
+            return target
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            if self.db_type == 'sqlite':
+                if target not in self._sqlite_partition_tables(cursor):
+                    self._create_sqlite_partition(cursor, year_month)
+                    self._refresh_cost_records_view(cursor)
+            elif self.db_type == 'postgresql':
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {partition_table_name(year_month)}
+                    PARTITION OF cost_records FOR VALUES FROM (%s) TO (%s)
+                ''', (year_month, next_month(year_month)))
+            else:
+                # 新月份从p_future中拆分出来；更早的月份已被最早的分区覆盖
+                months = self._mysql_partition_months(cursor)
+                if not months or year_month > months[-1]:
+                    cursor.execute(f'''
+                        ALTER TABLE cost_records REORGANIZE PARTITION p_future INTO (
+                            PARTITION p{year_month.replace('-', '')} VALUES LESS THAN ('{next_month(year_month)}'),
+                            PARTITION p_future VALUES LESS THAN (MAXVALUE)
+                        )
+                    ''')
+            conn.commit()
+        finally:
+            conn.close()
+        
+        self._cost_partitions.add(year_month)
+        return target
+    
+    def _mysql_partition_months(self, cursor):
+        cursor.execute('''
+            SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'cost_records' AND PARTITION_NAME IS NOT NULL
+        ''')
+        names = [row[0] for row in cursor.fetchall()]
+        return sorted(f'{name[1:5]}-{name[5:7]}' for name in names if name != 'p_future')
+    
+    def list_cost_partitions(self):
+        """列出cost_records的分区 (按时间排序)
+        
+        每项包含: name 分区名, source 查询该分区用的表表达式, upper 上界(不含, None表示无上界)
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        partitions = []
+        
+        if self.db_type == 'sqlite':
+            for name in self._sqlite_partition_tables(cursor):
+                upper = None if name == 'cost_records_legacy' else next_month(f'{name[-6:-2]}-{name[-2:]}')
+                partitions.append({'name': name, 'source': name, 'upper': upper})
+        elif self.partitioning is None:
+            partitions.append({'name': 'cost_records', 'source': 'cost_records', 'upper': None})
+        elif self.db_type == 'postgresql':
+            cursor.execute('''
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                JOIN pg_class p ON p.oid = i.inhparent
+                WHERE p.relname = 'cost_records'
+                ORDER BY c.relname
+            ''')
+            for (name,) in cursor.fetchall():
+                upper = next_month(f'{name[-6:-2]}-{name[-2:]}')
+                partitions.append({'name': name, 'source': name, 'upper': upper})
+        else:
+            for year_month in self._mysql_partition_months(cursor):
+                name = f"p{year_month.replace('-', '')}"
+                partitions.append({
+                    'name': name, 'source': f'cost_records PARTITION ({name})', 'upper': next_month(year_month)
+                })
+            partitions.append({'name': 'p_future', 'source': 'cost_records PARTITION (p_future)', 'upper': None})
+        
+        conn.close()
+        partitions.sort(key=lambda p: p['upper'] or '9999')
+        return partitions
+    
+    def drop_cost_partition(self, partition):
+        """删除一个分区 (数据需已压缩)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        name = partition['name']
+        
+        if self.db_type == 'sqlite':
+            # 删除月表和重建视图在同一事务中，读取方不会看到引用已删除月表的视图
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'DROP TABLE IF EXISTS {name}')
+            self._refresh_cost_records_view(cursor)
+        elif self.db_type == 'postgresql':
+            cursor.execute(f'ALTER TABLE cost_records DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+        else:
+            cursor.execute(f'ALTER TABLE cost_records DROP PARTITION {name}')
         
         conn.commit()
         conn.close()
+        self._cost_partitions.clear()
     
     def save_cost_data(self, services, timestamp=None):
         """保存成本数据"""
+        with time_db_write('save_cost_data'):
+            return self._save_cost_data(services, timestamp)
+    
+    def _save_cost_data(self, services, timestamp=None):
         if timestamp is None:
             timestamp = datetime.now().isoformat()
         
+        records_table = self.ensure_cost_partition(timestamp)
         conn = self.get_connection()
         cursor = conn.cursor()
         
         total_hourly = 0
         total_daily = 0
+        record_rows = 0
+        lambda_rows = 0
         service_breakdown = defaultdict(float)
         
         placeholder = '?' if self.db_type == 'sqlite' else '%s'
         
         # 保存详细记录（排除Lambda）
+        records = []
         for service in services:
             if service['service'] != 'Lambda':
                 # 对于流量相关服务，使用统一的服务类型
-                service_type = service['service']
-                if service_type in ['NAT Gateway', 'VPC Endpoint', 'ELB', 'CloudFront', 'Route 53', 'EC2']:
-                    # 检查是否为流量相关的EC2记录
-                    if service_type == 'EC2':
-                        details = service.get('details', {})
-                        if details.get('traffic_type') == 'Data Transfer Out':
-                            service_type = 'Traffic'
-                    else:
-                        service_type = 'Traffic'  # 其他流量服务统一归类
-                
-                cursor.execute(f'''
-                    INSERT INTO cost_records 
-                    (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, details)
-                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
-                ''', (
-                    timestamp,
-                    service_type,
-                    service['resource_id'],
-                    service['region'],
-                    service['hourly_cost'],
-                    service['daily_cost'],
-                    json.dumps(service)
-                ))
-                
+                service_type = cost_service_type(service)
+                records.append((service_type, service))
                 total_hourly += service['hourly_cost']
                 total_daily += service['daily_cost']
                 service_breakdown[service_type] += service['daily_cost']
             else:
                 # Lambda数据单独保存
+                lambda_rows += 1
                 if self.db_type == 'sqlite':
                     cursor.execute(f'''
                         INSERT OR REPLACE INTO lambda_records 
-                        (timestamp, resource_id, region, hourly_cost, daily_cost, details)
-                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                        (timestamp, resource_id, region, hourly_cost, daily_cost, details, account_id)
+                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
                     ''', (
                         timestamp,
                         service['resource_id'],
                         service['region'],
                         service['hourly_cost'],
                         service['daily_cost'],
-                        json.dumps(service)
+                        json.dumps(service),
+                        service.get('account_id', '')
                     ))
                 elif self.db_type == 'mysql':
                     cursor.execute(f'''
                         INSERT INTO lambda_records 
-                        (timestamp, resource_id, region, hourly_cost, daily_cost, details)
-                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                        (timestamp, resource_id, region, hourly_cost, daily_cost, details, account_id)
+                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
                         ON DUPLICATE KEY UPDATE 
                         hourly_cost = VALUES(hourly_cost), daily_cost = VALUES(daily_cost), details = VALUES(details)
                     ''', (
@@ -225,14 +815,15 @@ class DatabaseManager:
                         service['region'],
                         service['hourly_cost'],
                         service['daily_cost'],
-                        json.dumps(service)
+                        json.dumps(service),
+                        service.get('account_id', '')
                     ))
                 else:  # postgresql
                     cursor.execute(f'''
                         INSERT INTO lambda_records 
-                        (timestamp, resource_id, region, hourly_cost, daily_cost, details)
-                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
-                        ON CONFLICT (timestamp, resource_id, region) DO UPDATE SET
+                        (timestamp, resource_id, region, hourly_cost, daily_cost, details, account_id)
+                        VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                        ON CONFLICT (timestamp, account_id, resource_id, region) DO UPDATE SET
                         hourly_cost = EXCLUDED.hourly_cost, daily_cost = EXCLUDED.daily_cost, details = EXCLUDED.details
                     ''', (
                         timestamp,
@@ -240,9 +831,27 @@ class DatabaseManager:
                         service['region'],
                         service['hourly_cost'],
                         service['daily_cost'],
-                        json.dumps(service)
+                        json.dumps(service),
+                        service.get('account_id', '')
                     ))
         
+        # 明细行只保存成本和资源引用，静态属性存入resources表
+        lambda_services = [service for service in services if service['service'] == 'Lambda']
+        latest_records = records + [('Lambda', service) for service in lambda_services]
+        self._new_resource_rows = 0
+        resource_keys = self._resolve_resource_keys(cursor, [service for _, service in latest_records], timestamp)
+        if records:
+            cursor.executemany(f'''
+                INSERT INTO {records_table} 
+                (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, resource_key, details, account_id)
+                VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+            ''', [
+                (timestamp, service_type, service['resource_id'], service['region'],
+                 service['hourly_cost'], service['daily_cost'], resource_key, details, service.get('account_id', ''))
+                for (service_type, service), (resource_key, details) in zip(records, resource_keys)
+            ])
+            record_rows = len(records)
+        
         # 保存汇总记录
         cursor.execute(f'''
             INSERT INTO cost_summary 
@@ -255,76 +864,528 @@ class DatabaseManager:
             json.dumps(dict(service_breakdown))
         ))
         
+        # 与明细在同一事务中替换最新快照，读取方只会看到完整的旧快照或新快照
+        self._replace_latest_snapshot(
+            cursor, timestamp, latest_records, resource_keys, total_hourly, total_daily, service_breakdown
+        )
+        self._add_to_rollups(cursor, timestamp, records)
+        
         conn.commit()
         conn.close()
         
+        record_rows_written('cost_records', record_rows)
+        record_rows_written('resources', self._new_resource_rows)
+        record_rows_written('lambda_records', lambda_rows)
+        record_rows_written('cost_summary', 1)
+        
+        if self.analytics:
+            try:
+                self.analytics.mirror_snapshot(timestamp, latest_records)
+            except Exception as e:
+                print(f"写入分析存储失败: {e}")
+        
         return total_hourly, total_daily, service_breakdown
     
-    def get_latest_summary(self):
-        """获取最新的成本汇总"""
+    def _replace_latest_snapshot(self, cursor, timestamp, records, resource_keys,
+                                 total_hourly, total_daily, service_breakdown):
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        
+        # 回填较早的快照时不覆盖最新状态
+        cursor.execute('SELECT timestamp FROM latest_snapshot')
+        current = cursor.fetchone()
+        if current and current[0] > timestamp:
+            return
+        
+        cursor.execute('DELETE FROM latest_resources')
+        cursor.executemany(f'''
+            INSERT INTO latest_resources
+            (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, resource_key, details, account_id)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ''', [
+            (timestamp, service_type, service['resource_id'], service['region'],
+             service['hourly_cost'], service['daily_cost'], resource_key, details, service.get('account_id', ''))
+            for (service_type, service), (resource_key, details) in zip(records, resource_keys)
+        ])
+        
+        cursor.execute('DELETE FROM latest_snapshot')
+        cursor.execute(f'''
+            INSERT INTO latest_snapshot
+            (timestamp, total_hourly_cost, total_daily_cost, service_breakdown, resource_count, updated_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ''', (timestamp, total_hourly, total_daily, json.dumps(dict(service_breakdown)),
+              len(records), datetime.now().isoformat()))
+    
+    def set_scan_in_progress(self, started_at):
+        """记录正在进行的完整扫描的开始时间 (None表示扫描结束)
+        
+        扫描期间事件暂不应用: 保存扫描结果时会整体替换最新快照，期间应用的事件会被覆盖
+        """
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
         conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'UPDATE latest_snapshot SET scan_started_at = {placeholder}', (started_at,))
+        conn.commit()
+        conn.close()
+    
+    def apply_inventory_changes(self, timestamp, added, removed):
+        """在两次完整扫描之间增量更新最新快照 (事件驱动)
         
-        if self.db_type == 'sqlite':
-            conn.row_factory = sqlite3.Row
+        added: 新增或变化的资源 (service字典)，removed: 已删除的资源 (service, resource_id, region, account_id)
+        只更新latest_resources和latest_snapshot，历史明细仍由下一次完整扫描写入
+        返回更新后的汇总
+        """
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT timestamp FROM latest_snapshot')
+            current = cursor.fetchone()
+            if not current:
+                # 还没有完整扫描，没有可以增量更新的快照
+                return None
+            
+            keys = [(cost_service_type({'service': service}), resource_id, region, account_id or '')
+                    for service, resource_id, region, account_id in removed]
+            records = [('Lambda' if service['service'] == 'Lambda' else cost_service_type(service), service)
+                       for service in added]
+            keys += [(service_type, service['resource_id'], service['region'], service.get('account_id') or '')
+                     for service_type, service in records]
+            cursor.executemany(f'''
+                DELETE FROM latest_resources
+                WHERE service_type = {placeholder} AND resource_id = {placeholder} AND region = {placeholder}
+                AND COALESCE(account_id, '') = {placeholder}
+            ''', keys)
+            
+            self._new_resource_rows = 0
+            if records:
+                resource_keys = self._resolve_resource_keys(cursor, [service for _, service in records], timestamp)
+                cursor.executemany(f'''
+                    INSERT INTO latest_resources
+                    (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, resource_key, details, account_id)
+                    VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+                ''', [
+                    (timestamp, service_type, service['resource_id'], service['region'],
+                     service['hourly_cost'], service['daily_cost'], resource_key, details, service.get('account_id', ''))
+                    for (service_type, service), (resource_key, details) in zip(records, resource_keys)
+                ])
+            
+            # 按与save_cost_data相同的口径重新计算汇总 (不含Lambda)
+            cursor.execute('''
+                SELECT service_type, SUM(hourly_cost), SUM(daily_cost), COUNT(*)
+                FROM latest_resources GROUP BY service_type
+            ''')
+            total_hourly = total_daily = 0
+            resource_count = 0
+            service_breakdown = {}
+            for service_type, hourly_cost, daily_cost, count in cursor.fetchall():
+                resource_count += count
+                if service_type == 'Lambda':
+                    continue
+                # PostgreSQL/MySQL的SUM返回Decimal，不能直接写入JSON
+                total_hourly += float(hourly_cost)
+                total_daily += float(daily_cost)
+                service_breakdown[service_type] = float(daily_cost)
+            
+            # 快照时间保持为上一次完整扫描的时间，updated_at记录增量更新的时间
+            cursor.execute(f'''
+                UPDATE latest_snapshot SET total_hourly_cost = {placeholder}, total_daily_cost = {placeholder},
+                service_breakdown = {placeholder}, resource_count = {placeholder}, updated_at = {placeholder}
+            ''', (total_hourly, total_daily, json.dumps(service_breakdown), resource_count, datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         
+        record_rows_written('resources', self._new_resource_rows)
+        return {
+            'timestamp': current[0],
+            'total_hourly_cost': total_hourly,
+            'total_daily_cost': total_daily,
+            'service_breakdown': service_breakdown,
+            'resource_count': resource_count
+        }
+    
+    def _rollup_rows(self, records):
+        """一个快照按 (服务, 区域) 汇总的行，外加一行合计"""
+        groups = defaultdict(lambda: [0.0, 0.0])
+        for service_type, service in records:
+            for key in ((service_type, service['region']), (ROLLUP_TOTAL, ROLLUP_TOTAL)):
+                groups[key][0] += service['hourly_cost']
+                groups[key][1] += service['daily_cost']
+        # 没有资源的快照也计入快照数
+        groups[(ROLLUP_TOTAL, ROLLUP_TOTAL)]
+        return groups
+    
+    def _add_to_rollups(self, cursor, timestamp, records):
+        """把一个快照累加到各粒度的汇总表"""
+        groups = self._rollup_rows(records)
+        for resolution in ROLLUP_RESOLUTIONS:
+            bucket = rollup_bucket(timestamp, resolution)
+            self._upsert_rollups(cursor, resolution, [
+                (bucket, service_type, region, hourly_cost, daily_cost, 1)
+                for (service_type, region), (hourly_cost, daily_cost) in groups.items()
+            ])
+    
+    def _upsert_rollups(self, cursor, resolution, rows):
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        table = f'cost_rollup_{resolution}'
+        if self.db_type == 'mysql':
+            conflict = '''ON DUPLICATE KEY UPDATE
+                hourly_cost_sum = hourly_cost_sum + VALUES(hourly_cost_sum),
+                daily_cost_sum = daily_cost_sum + VALUES(daily_cost_sum),
+                samples = samples + VALUES(samples)'''
+        else:
+            conflict = f'''ON CONFLICT (bucket, service_type, region) DO UPDATE SET
+                hourly_cost_sum = {table}.hourly_cost_sum + excluded.hourly_cost_sum,
+                daily_cost_sum = {table}.daily_cost_sum + excluded.daily_cost_sum,
+                samples = {table}.samples + excluded.samples'''
+        cursor.executemany(f'''
+            INSERT INTO {table} (bucket, service_type, region, hourly_cost_sum, daily_cost_sum, samples)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+            {conflict}
+        ''', rows)
+    
+    def rebuild_cost_rollups(self):
+        """从历史明细重建汇总表，返回处理的快照数 (升级后第一次启动时由init_database自动执行)
+        
+        已压缩为cost_records_daily的日期只重建日/周粒度
+        """
+        rows = {resolution: defaultdict(lambda: [0.0, 0.0, 0]) for resolution in ROLLUP_RESOLUTIONS}
+        snapshots = {resolution: defaultdict(set) for resolution in ROLLUP_RESOLUTIONS}
+        
+        for batch in self.iter_cost_records():
+            for timestamp, service_type, _, region, hourly_cost, daily_cost, _, _ in batch:
+                if service_type == 'Lambda':
+                    continue
+                for resolution in ROLLUP_RESOLUTIONS:
+                    bucket = rollup_bucket(timestamp, resolution)
+                    snapshots[resolution][bucket].add(timestamp)
+                    for key in ((bucket, service_type, region), (bucket, ROLLUP_TOTAL, ROLLUP_TOTAL)):
+                        # PostgreSQL/MySQL返回Decimal
+                        rows[resolution][key][0] += float(hourly_cost)
+                        rows[resolution][key][1] += float(daily_cost)
+        
+        conn = self.get_connection()
         cursor = conn.cursor()
+        # 每日汇总按账号分行，同一天各行的样本数都是当天的快照数 (取最大值)，成本按样本数还原后相加
         cursor.execute('''
-            SELECT * FROM cost_summary 
-            ORDER BY timestamp DESC LIMIT 1
+            SELECT day, service_type, region, SUM(hourly_cost * samples), SUM(daily_cost * samples), MAX(samples)
+            FROM cost_records_daily GROUP BY day, service_type, region
         ''')
+        compacted_samples = defaultdict(int)
+        for day, service_type, region, hourly_cost, daily_cost, samples in cursor.fetchall():
+            compacted_samples[day] = max(compacted_samples[day], samples)
+            for resolution in ('day', 'week'):
+                bucket = rollup_bucket(day, resolution)
+                for key in ((bucket, service_type, region), (bucket, ROLLUP_TOTAL, ROLLUP_TOTAL)):
+                    rows[resolution][key][0] += float(hourly_cost)
+                    rows[resolution][key][1] += float(daily_cost)
         
-        result = cursor.fetchone()
+        for resolution in ROLLUP_RESOLUTIONS:
+            samples = {bucket: len(timestamps) for bucket, timestamps in snapshots[resolution].items()}
+            if resolution != 'hour':
+                for day, count in compacted_samples.items():
+                    bucket = rollup_bucket(day, resolution)
+                    samples[bucket] = samples.get(bucket, 0) + count
+            
+            cursor.execute(f'DELETE FROM cost_rollup_{resolution}')
+            self._upsert_rollups(cursor, resolution, [
+                (bucket, service_type, region, hourly_cost, daily_cost,
+                 samples[bucket] if service_type == ROLLUP_TOTAL else 1)
+                for (bucket, service_type, region), (hourly_cost, daily_cost, _) in rows[resolution].items()
+            ])
+        conn.commit()
         conn.close()
+        return sum(len(timestamps) for timestamps in snapshots['hour'].values())
+    
+    def _lookup_resource_keys(self, cursor, hashes):
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            cursor.execute(f'''
+                SELECT attr_hash, id FROM resources 
+                WHERE attr_hash IN ({', '.join([placeholder] * len(chunk))})
+            ''', tuple(chunk))
+            self._resource_keys.update(cursor.fetchall())
+    
+    def _resolve_resource_keys(self, cursor, services, timestamp):
+        """返回每个资源的 (resources.id, 成本记录的details JSON)，新的静态属性组合写入resources表"""
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        attributes = [resource_attributes(service) for service in services]
         
-        if result:
+        missing = {}
+        for service, (attributes_json, attr_hash, _) in zip(services, attributes):
+            if attr_hash not in self._resource_keys:
+                missing[attr_hash] = (
+                    attr_hash, service['service'], service['resource_id'], service['region'],
+                    service.get('resource_type', service.get('instance_type')), attributes_json, timestamp
+                )
+        
+        if not missing:
+            return [(self._resource_keys[attr_hash], details) for _, attr_hash, details in attributes]
+        
+        if len(self._resource_keys) + len(missing) > RESOURCE_KEY_CACHE_SIZE:
+            self._resource_keys.clear()
+        
+        # 先查询已存在的哈希 (其他进程或之前的运行写入)，只插入真正新的属性组合
+        self._lookup_resource_keys(cursor, list(missing))
+        new_rows = [row for attr_hash, row in missing.items() if attr_hash not in self._resource_keys]
+        
+        if new_rows:
+            values = ', '.join([placeholder] * 7)
+            columns = '(attr_hash, service, resource_id, region, instance_type, attributes, first_seen)'
             if self.db_type == 'sqlite':
-                return dict(result)
+                sql = f'INSERT OR IGNORE INTO resources {columns} VALUES ({values})'
+            elif self.db_type == 'mysql':
+                sql = f'INSERT IGNORE INTO resources {columns} VALUES ({values})'
             else:
-                columns = ['id', 'timestamp', 'total_hourly_cost', 'total_daily_cost', 'service_breakdown']
-                return dict(zip(columns, result))
+                sql = f'INSERT INTO resources {columns} VALUES ({values}) ON CONFLICT (attr_hash) DO NOTHING'
+            cursor.executemany(sql, new_rows)
+            self._new_resource_rows = len(new_rows)
+            self._lookup_resource_keys(cursor, [row[0] for row in new_rows])
+        
+        return [(self._resource_keys[attr_hash], details) for _, attr_hash, details in attributes]
+    
+    def get_latest_summary(self):
+        """获取最新的成本汇总 (读取最新快照指针)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, timestamp, total_hourly_cost, total_daily_cost, service_breakdown, resource_count, updated_at,
+                   scan_started_at
+            FROM latest_snapshot
+        ''')
+        result = cursor.fetchone()
+        conn.close()
+        
+        if result:
+            columns = ['id', 'timestamp', 'total_hourly_cost', 'total_daily_cost', 'service_breakdown', 'resource_count',
+                       'updated_at', 'scan_started_at']
+            return dict(zip(columns, result))
         return None
     
-    def get_cost_history(self, hours=24):
-        """获取成本历史数据"""
+    def _query_records(self, table, conditions, params):
+        """读取明细记录并关联resources表
+        
+        details为资源静态属性与记录自身details (用量、指标等) 合并后的JSON (旧数据只有其中之一)；
+        instance_type优先使用记录当时的值，其次为resources表中的类型
+        """
+        columns = ['id', 'timestamp', 'service_type', 'resource_id', 'region', 'hourly_cost', 'daily_cost',
+                   'details', 'instance_type', 'account_id']
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT r.id, r.timestamp, r.service_type, r.resource_id, r.region, r.hourly_cost, r.daily_cost,
+                   res.attributes, r.details, res.instance_type, r.account_id
+            FROM {table} r LEFT JOIN resources res ON res.id = r.resource_key
+            WHERE {' AND '.join(conditions)}
+            ORDER BY r.service_type, r.daily_cost DESC
+        ''', tuple(params))
+        rows = cursor.fetchall()
+        conn.close()
         
+        records = []
+        for row in rows:
+            record = dict(zip(columns, row[:7] + (merge_details(row[7], row[8]),) + row[9:]))
+            try:
+                record['instance_type'] = json.loads(record['details']).get('instance_type') or record['instance_type']
+            except (TypeError, ValueError, AttributeError):
+                pass
+            if record['instance_type'] is None:
+                record['instance_type'] = ''
+            records.append(record)
+        return records
+    
+    def get_snapshot_records(self, timestamp, service_type=None, account_id=None):
+        """读取某个历史快照的明细记录 (不含Lambda)"""
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        conditions = [f'r.timestamp = {placeholder}']
+        params = [timestamp]
+        if service_type:
+            conditions.append(f'r.service_type = {placeholder}')
+            params.append(service_type)
+        if account_id:
+            conditions.append(f'r.account_id = {placeholder}')
+            params.append(account_id)
+        return self._query_records('cost_records', conditions, params)
+    
+    def get_latest_records(self, service_type=None, account_id=None):
+        """读取最新快照的资源；不指定服务时不含Lambda (与cost_records一致)"""
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        if service_type:
+            conditions, params = [f'r.service_type = {placeholder}'], [service_type]
+        else:
+            conditions, params = ["r.service_type <> 'Lambda'"], []
+        if account_id:
+            conditions.append(f'r.account_id = {placeholder}')
+            params.append(account_id)
+        return self._query_records('latest_resources', conditions, params)
+    
+    def _history_union(self, since, service_type=None):
+        """小时明细、Lambda记录和每日汇总的统一视图 (每日汇总按样本数还原为成本之和，按账号区分资源)"""
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        service_filter = f' AND service_type = {placeholder}' if service_type else ''
+        sql = f'''
+            SELECT timestamp, service_type, resource_id, region, COALESCE(account_id, '') AS account_id, hourly_cost AS cost, 1 AS hours
+            FROM cost_records WHERE timestamp >= {placeholder}{service_filter}
+            UNION ALL
+            SELECT day, service_type, resource_id, region, COALESCE(account_id, ''), hourly_cost * samples, samples
+            FROM cost_records_daily WHERE day >= {placeholder}{service_filter}
+        '''
+        params = [since, since[:10]]
+        if service_type:
+            params = [since, service_type, since[:10], service_type]
+        if not service_type or service_type == 'Lambda':
+            sql += f'''
+            UNION ALL
+            SELECT timestamp, 'Lambda', resource_id, region, COALESCE(account_id, ''), hourly_cost, 1
+            FROM lambda_records WHERE timestamp >= {placeholder}
+            '''
+            params.append(since)
+        return sql, params
+    
+    def _run_aggregate(self, sql, params):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, tuple(params))
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    def _earliest_history(self):
+        """关系数据库中最早的历史时间 (小时明细、每日汇总、Lambda记录)，没有数据时返回None"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         if self.db_type == 'sqlite':
-            time_filter = f"datetime(timestamp) >= datetime('now', '-{hours} hours')"
-        elif self.db_type == 'postgresql':
-            time_filter = f"timestamp >= NOW() - INTERVAL '{hours} hours'"
-        elif self.db_type == 'mysql':
-            time_filter = f"timestamp >= DATE_SUB(NOW(), INTERVAL {hours} HOUR)"
+            # 按月表依次查询 (每张表走时间索引)，视图上的MIN需要扫描所有月表
+            tables = self._sqlite_partition_tables(cursor)
+        else:
+            tables = ['cost_records']
+        values = []
+        for table in tables:
+            cursor.execute(f'SELECT MIN(timestamp) FROM {table}')
+            values.append(cursor.fetchone()[0])
+            # 月表按时间排序，第一个有数据的月表即最早 (旧版本的单表排在最前，需要继续比较)
+            if values[-1] is not None and table != 'cost_records_legacy':
+                break
+        cursor.execute('SELECT MIN(day) FROM cost_records_daily')
+        values.append(cursor.fetchone()[0])
+        cursor.execute('SELECT MIN(timestamp) FROM lambda_records')
+        values.append(cursor.fetchone()[0])
+        conn.close()
+        values = [datetime.fromisoformat(str(value)[:19]) for value in values if value is not None]
+        return min(values) if values else None
+    
+    def _use_analytics(self, since):
+        """分析存储是否完整覆盖从since (datetime) 开始的历史
         
-        cursor.execute(f'''
-            SELECT DISTINCT timestamp 
-            FROM cost_summary 
-            WHERE {time_filter}
-            ORDER BY timestamp ASC
-        ''')
-        timestamps = cursor.fetchall()
+        启用分析存储之前的历史只在关系数据库中，回填 (sync_analytics.py --backfill) 之前
+        这部分范围的查询仍由关系数据库执行，避免返回不完整的结果
+        """
+        if self.analytics is None:
+            return False
+        now = datetime.now()
+        if self._coverage is None or (now - self._coverage[0]).total_seconds() > ANALYTICS_COVERAGE_TTL:
+            self._coverage = (now, self.analytics.earliest_timestamp(), self._earliest_history())
+        _, analytics_earliest, relational_earliest = self._coverage
+        if analytics_earliest is None:
+            return False
+        # 按天比较: 压缩后的每日汇总只有日期
+        needed = max(since, relational_earliest or since)
+        if analytics_earliest.date() <= needed.date():
+            return True
+        if not self._coverage_warned:
+            self._coverage_warned = True
+            print(f"分析存储从 {analytics_earliest} 开始，早于此的历史仍由关系数据库查询; "
+                  f"运行 python sync_analytics.py --backfill 回填后即可使用DuckDB")
+        return False
+    
+    def get_monthly_service_costs(self, months=12):
+        """按月、按服务汇总的实际成本 (启用分析存储时由DuckDB执行)"""
+        now = datetime.now()
+        index = now.year * 12 + now.month - 1 - (months - 1)
+        since = datetime(index // 12, index % 12 + 1, 1)
+        if self._use_analytics(since):
+            rows = self.analytics.monthly_service_costs(months)
+        else:
+            union_sql, params = self._history_union(since.strftime('%Y-%m'))
+            rows = self._run_aggregate(f'''
+                SELECT substr(timestamp, 1, 7), service_type, SUM(cost) FROM ({union_sql}) t
+                GROUP BY substr(timestamp, 1, 7), service_type
+                ORDER BY 1, 3 DESC
+            ''', params)
+        return [{'year_month': m, 'service_type': s, 'cost': float(c or 0)} for m, s, c in rows]
+    
+    def get_top_resources(self, days=90, limit=20, service_type=None):
+        """最近days天成本最高的资源 (不同账号的同名资源分别统计)"""
+        since = datetime.now() - timedelta(days=days)
+        if self._use_analytics(since):
+            rows = self.analytics.top_resources(days, limit, service_type)
+        else:
+            union_sql, params = self._history_union(since.isoformat(), service_type)
+            rows = self._run_aggregate(f'''
+                SELECT service_type, resource_id, region, account_id, SUM(cost), SUM(hours) FROM ({union_sql}) t
+                GROUP BY service_type, resource_id, region, account_id
+                ORDER BY 5 DESC LIMIT {int(limit)}
+            ''', params)
+        return [
+            {'service_type': s, 'resource_id': r, 'region': region, 'account_id': account or '',
+             'cost': float(c or 0), 'hours': int(h)}
+            for s, r, region, account, c, h in rows
+        ]
+    
+    def get_region_trend(self, days=30):
+        """最近days天每天各区域的成本"""
+        since = datetime.now() - timedelta(days=days)
+        if self._use_analytics(since):
+            rows = self.analytics.region_trend(days)
+        else:
+            union_sql, params = self._history_union(since.isoformat())
+            rows = self._run_aggregate(f'''
+                SELECT substr(timestamp, 1, 10), region, SUM(cost) FROM ({union_sql}) t
+                GROUP BY substr(timestamp, 1, 10), region
+                ORDER BY 1, 2
+            ''', params)
+        return [{'day': d, 'region': r, 'cost': float(c or 0)} for d, r, c in rows]
+    
+    def get_cost_history(self, hours=24, resolution=None, service_type=None):
+        """获取成本历史数据 - 读取预聚合的汇总表，粒度按范围自动选择
         
-        history_data = []
+        每个点为时间桶内快照的平均小时/日成本
+        """
+        resolution = resolution or pick_rollup_resolution(hours)
         placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        since = rollup_bucket((datetime.now() - timedelta(hours=hours)).isoformat(), resolution)
+        table = f'cost_rollup_{resolution}'
         
-        for ts_row in timestamps:
-            timestamp = ts_row[0]
-            
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if service_type:
+            # 服务的成本除以时间桶内的快照总数，服务不存在的快照按0计算
             cursor.execute(f'''
-                SELECT SUM(hourly_cost) as total_hourly, SUM(daily_cost) as total_daily
-                FROM cost_records 
-                WHERE timestamp = {placeholder}
-            ''', (timestamp,))
-            costs = cursor.fetchone()
-            
-            history_data.append({
-                'timestamp': timestamp,
-                'total_hourly_cost': costs[0] or 0,
-                'total_daily_cost': costs[1] or 0
-            })
-        
+                SELECT t.bucket, SUM(s.hourly_cost_sum) / t.samples, SUM(s.daily_cost_sum) / t.samples
+                FROM {table} t JOIN {table} s ON s.bucket = t.bucket
+                WHERE t.service_type = {placeholder} AND t.bucket >= {placeholder} AND s.service_type = {placeholder}
+                GROUP BY t.bucket, t.samples
+                ORDER BY t.bucket ASC
+            ''', (ROLLUP_TOTAL, since, service_type))
+        else:
+            cursor.execute(f'''
+                SELECT bucket, hourly_cost_sum / samples, daily_cost_sum / samples
+                FROM {table}
+                WHERE service_type = {placeholder} AND bucket >= {placeholder}
+                ORDER BY bucket ASC
+            ''', (ROLLUP_TOTAL, since))
+        rows = cursor.fetchall()
         conn.close()
-        return history_data
+        
+        return [{
+            'timestamp': bucket,
+            'total_hourly_cost': float(total_hourly or 0),
+            'total_daily_cost': float(total_daily or 0)
+        } for bucket, total_hourly, total_daily in rows]
     
     def check_monthly_reset(self):
         """检查是否需要重置月度计费"""
@@ -400,4 +1461,125 @@ class DatabaseManager:
         ''', (actual_monthly_total, json.dumps(current_services), current_month))
         
         conn.commit()
-        conn.close()
\ No newline at end of file
+        conn.close()
+    
+    def save_scan_run(self, trace_id, started_at, duration_seconds, status, resource_count, breakdown):
+        """保存一次扫描的耗时分解"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        
+        cursor.execute(f'''
+            INSERT INTO scan_runs 
+            (trace_id, started_at, duration_seconds, status, resource_count, breakdown)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+        ''', (trace_id, started_at, duration_seconds, status, resource_count, json.dumps(breakdown)))
+        
+        conn.commit()
+        conn.close()
+    
+    def get_scan_runs(self, limit=20, run_ids=None):
+        """获取扫描记录 (最新的在前)，可指定ID列表用于对比"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        columns = ['id', 'trace_id', 'started_at', 'duration_seconds', 'status', 'resource_count', 'breakdown']
+        
+        if run_ids:
+            cursor.execute(f'''
+                SELECT {', '.join(columns)} FROM scan_runs 
+                WHERE id IN ({', '.join([placeholder] * len(run_ids))})
+                ORDER BY id DESC
+            ''', tuple(run_ids))
+        else:
+            cursor.execute(f'''
+                SELECT {', '.join(columns)} FROM scan_runs 
+                ORDER BY id DESC LIMIT {int(limit)}
+            ''')
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        runs = []
+        for row in rows:
+            run = dict(zip(columns, row))
+            run['duration_seconds'] = float(run['duration_seconds'])
+            try:
+                run['breakdown'] = json.loads(run['breakdown']) if run['breakdown'] else {}
+            except ValueError:
+                run['breakdown'] = {}
+            runs.append(run)
+        return runs
+    
+    def iter_cost_records(self, start_time=None, end_time=None, service_types=None, batch_size=5000):
+        """流式读取成本记录 - 使用服务端游标，按批返回，内存占用恒定
+        
+        返回的每一批为元组列表:
+        (timestamp, service_type, resource_id, region, hourly_cost, daily_cost, details, account_id)
+        Lambda记录来自lambda_records表，service_type统一为'Lambda'
+        """
+        placeholder = '?' if self.db_type == 'sqlite' else '%s'
+        
+        conditions = []
+        params = []
+        if start_time:
+            conditions.append(f'timestamp >= {placeholder}')
+            params.append(start_time)
+        if end_time:
+            conditions.append(f'timestamp < {placeholder}')
+            params.append(end_time)
+        
+        record_conditions = list(conditions)
+        record_params = list(params)
+        include_lambda = True
+        if service_types:
+            service_types = list(service_types)
+            include_lambda = any(s.upper() == 'LAMBDA' for s in service_types)
+            record_conditions.append(
+                f"service_type IN ({', '.join([placeholder] * len(service_types))})"
+            )
+            record_params.extend(service_types)
+        
+        record_where = f"WHERE {' AND '.join(record_conditions)}" if record_conditions else ''
+        sql = f'''
+            SELECT timestamp, service_type, cost_records.resource_id, cost_records.region, hourly_cost, daily_cost,
+                   resources.attributes, details, account_id
+            FROM cost_records LEFT JOIN resources ON resources.id = cost_records.resource_key {record_where}
+        '''
+        query_params = record_params
+        
+        if include_lambda:
+            lambda_where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            sql += f'''
+            UNION ALL
+            SELECT timestamp, 'Lambda', resource_id, region, hourly_cost, daily_cost, NULL, details, account_id
+            FROM lambda_records {lambda_where}
+            '''
+            query_params = record_params + params
+        
+        sql += ' ORDER BY timestamp ASC'
+        
+        conn = self.get_connection()
+        try:
+            if self.db_type == 'postgresql':
+                # 命名游标即PostgreSQL服务端游标
+                cursor = conn.cursor(name='cost_records_export')
+                cursor.itersize = batch_size
+            elif self.db_type == 'mysql':
+                import pymysql
+                cursor = conn.cursor(pymysql.cursors.SSCursor)
+            else:
+                # SQLite按需逐步读取结果，不会一次性加载
+                cursor = conn.cursor()
+            
+            cursor.execute(sql, tuple(query_params))
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield [row[:6] + (merge_details(row[6], row[7]), row[8] or '') for row in rows]
+            
+            cursor.close()
+        finally:
+            conn.close()
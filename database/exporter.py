@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本历史导出器 - 流式导出CSV/NDJSON/Parquet
+"""
+
+import csv
+import io
+import json
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+EXPORT_COLUMNS = [
+    'timestamp', 'service_type', 'resource_id', 'region', 'hourly_cost', 'daily_cost', 'details', 'account_id'
+]
+
+EXPORT_FORMATS = {
+    'csv': {'mimetype': 'text/csv', 'extension': 'csv'},
+    'ndjson': {'mimetype': 'application/x-ndjson', 'extension': 'ndjson'},
+    'parquet': {'mimetype': 'application/vnd.apache.parquet', 'extension': 'parquet'}
+}
+
+
+class _ChunkSink:
+    """供ParquetWriter写入的缓冲区，每写完一个行组即可取出字节"""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffer.write(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """取出已写入的字节并清空缓冲区"""
+        data = self.buffer.getvalue()
+        self.buffer = io.BytesIO()
+        return data
+
+
+class CostExporter:
+    def __init__(self, db_manager, batch_size=5000):
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+
+    def _iter_batches(self, start_time, end_time, service_types):
+        """读取记录批次，并把DECIMAL转换为float"""
+        for rows in self.db_manager.iter_cost_records(start_time, end_time, service_types, self.batch_size):
+            yield [
+                tuple(float(v) if isinstance(v, Decimal) else v for v in row)
+                for row in rows
+            ]
+
+    def stream(self, fmt='csv', start_time=None, end_time=None, service_types=None):
+        """按指定格式流式生成导出内容 (bytes块)"""
+        fmt = fmt.lower()
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt == 'parquet' and not PARQUET_AVAILABLE:
+            raise RuntimeError("pyarrow未安装，无法导出Parquet。安装命令: pip install pyarrow")
+
+        batches = self._iter_batches(start_time, end_time, service_types)
+
+        if fmt == 'csv':
+            return self._stream_csv(batches)
+        elif fmt == 'ndjson':
+            return self._stream_ndjson(batches)
+        return self._stream_parquet(batches)
+
+    def _stream_csv(self, batches):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+
+        for rows in batches:
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        remaining = buffer.getvalue()
+        if remaining:
+            yield remaining.encode('utf-8')
+
+    def _stream_ndjson(self, batches):
+        for rows in batches:
+            lines = []
+            for row in rows:
+                record = dict(zip(EXPORT_COLUMNS, row))
+                try:
+                    record['details'] = json.loads(record['details']) if record['details'] else None
+                except (TypeError, ValueError):
+                    pass
+                lines.append(json.dumps(record, ensure_ascii=False))
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _stream_parquet(self, batches):
+        schema = pa.schema([
+            ('timestamp', pa.string()),
+            ('service_type', pa.string()),
+            ('resource_id', pa.string()),
+            ('region', pa.string()),
+            ('hourly_cost', pa.float64()),
+            ('daily_cost', pa.float64()),
+            ('details', pa.string()),
+            ('account_id', pa.string())
+        ])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+
+        try:
+            # 每一批写成一个行组，写完立即输出
+            for rows in batches:
+                columns = list(zip(*rows))
+                table = pa.Table.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                    schema=schema
+                )
+                writer.write_table(table)
+                data = sink.drain()
+                if data:
+                    yield data
+        finally:
+            writer.close()
+
+        data = sink.drain()
+        if data:
+            yield data
+
+    def export_to_file(self, path, fmt='csv', start_time=None, end_time=None, service_types=None):
+        """导出到文件，返回写入的字节数"""
+        total_bytes = 0
+        with open(path, 'wb') as f:
+            for chunk in self.stream(fmt, start_time, end_time, service_types):
+                f.write(chunk)
+                total_bytes += len(chunk)
+        return total_bytes
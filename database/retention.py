@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本明细保留策略 - 超过保留期的小时明细压缩为每日汇总 (cost_records_daily)
+
+- 按天分批压缩，每批一个短事务，不会长时间阻塞每小时的写入
+- 整月都超过保留期的分区直接删除 (原生分区 / SQLite月表)，无需逐行DELETE
+- 未分区的旧表按天删除已压缩的数据
+- 每一批都记录在compaction_log中，中断后重新执行不会重复汇总
+"""
+
+import os
+from datetime import date, datetime, timedelta
+
+
+def get_retention_config():
+    """保留策略配置 (天数为0表示不限制)"""
+    return {
+        'hourly_days': int(os.getenv('RETENTION_HOURLY_DAYS', 90)),
+        'daily_days': int(os.getenv('RETENTION_DAILY_DAYS', 0))
+    }
+
+
+def get_compaction_time():
+    """每天执行压缩的时间 (HH:MM)"""
+    return os.getenv('COMPACTION_TIME', '03:30')
+
+
+class RetentionManager:
+    def __init__(self, db_manager, hourly_days=None, daily_days=None, logger=None):
+        config = get_retention_config()
+        self.db_manager = db_manager
+        self.hourly_days = config['hourly_days'] if hourly_days is None else hourly_days
+        self.daily_days = config['daily_days'] if daily_days is None else daily_days
+        self.logger = logger
+        self.placeholder = '?' if db_manager.db_type == 'sqlite' else '%s'
+
+    def _log(self, message):
+        if self.logger:
+            self.logger.info(message)
+        else:
+            print(message)
+
+    def plan(self, now=None):
+        """计算需要压缩的分区和日期: [(分区, [日期], 是否删除分区)]"""
+        if self.hourly_days <= 0:
+            return []
+
+        cutoff = ((now or datetime.now()) - timedelta(days=self.hourly_days)).strftime('%Y-%m-%d')
+        plan = []
+        for partition in self.db_manager.list_cost_partitions():
+            upper = partition['upper']
+            if upper is not None and upper > cutoff:
+                # 分区中仍有保留期内的数据，整月过期后再处理
+                continue
+
+            drop = upper is not None
+            days = self._pending_days(partition, upper if drop else cutoff)
+            if days or drop:
+                plan.append((partition, days, drop))
+        return plan
+
+    def _pending_days(self, partition, end):
+        """分区中早于end、尚未压缩的日期"""
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT MIN(timestamp) FROM {partition['source']} WHERE timestamp < {self.placeholder}
+        ''', (end,))
+        first = cursor.fetchone()[0]
+        cursor.execute(f'''
+            SELECT unit FROM compaction_log WHERE unit LIKE {self.placeholder}
+        ''', (f"{partition['name']}:%",))
+        done = {row[0].split(':', 1)[1] for row in cursor.fetchall()}
+        conn.close()
+
+        if not first:
+            return []
+
+        days = []
+        day = date.fromisoformat(first[:10])
+        while day.isoformat() < end:
+            if day.isoformat() not in done:
+                days.append(day.isoformat())
+            day += timedelta(days=1)
+        return days
+
+    def _compact_day(self, partition, day, delete):
+        """把一天的小时明细按 (服务, 资源, 区域, 账号) 汇总到cost_records_daily；delete=True时同时删除明细"""
+        p = self.placeholder
+        next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f'''
+                INSERT INTO cost_records_daily
+                (day, service_type, resource_id, region, account_id, hourly_cost, daily_cost, samples)
+                SELECT {p}, service_type, resource_id, region, account_id, AVG(hourly_cost), AVG(daily_cost), COUNT(*)
+                FROM {partition['source']}
+                WHERE timestamp >= {p} AND timestamp < {p}
+                GROUP BY service_type, resource_id, region, account_id
+            ''', (day, day, next_day))
+            rollup_rows = cursor.rowcount
+
+            if delete:
+                cursor.execute(f'''
+                    DELETE FROM {partition['source']} WHERE timestamp >= {p} AND timestamp < {p}
+                ''', (day, next_day))
+
+            # 删除明细与汇总在同一事务中，空日期无需记录；保留分区的日期需要记录以便中断后继续
+            if rollup_rows or not delete:
+                cursor.execute(f'''
+                    INSERT INTO compaction_log (unit, rollup_rows, compacted_at)
+                    VALUES ({p}, {p}, {p})
+                ''', (f"{partition['name']}:{day}", rollup_rows, datetime.now().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return rollup_rows
+
+    def _finish_partition(self, partition, rollup_rows):
+        """删除已全部压缩的分区，并把按天的压缩记录合并为一条"""
+        self.db_manager.drop_cost_partition(partition)
+
+        p = self.placeholder
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'DELETE FROM compaction_log WHERE unit LIKE {p}', (f"{partition['name']}:%",))
+        cursor.execute(f'''
+            INSERT INTO compaction_log (unit, rollup_rows, compacted_at)
+            VALUES ({p}, {p}, {p})
+        ''', (partition['name'], rollup_rows, datetime.now().isoformat()))
+        conn.commit()
+        conn.close()
+
+    def purge_daily(self, now=None):
+        """删除超过保留期的每日汇总"""
+        if self.daily_days <= 0:
+            return 0
+
+        cutoff = ((now or datetime.now()) - timedelta(days=self.daily_days)).strftime('%Y-%m-%d')
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'DELETE FROM cost_records_daily WHERE day < {self.placeholder}', (cutoff,))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
+
+    def purge_hourly_rollups(self, now=None):
+        """小时粒度的汇总与小时明细保留相同天数 (日/周汇总永久保留)"""
+        if self.hourly_days <= 0:
+            return 0
+
+        cutoff = ((now or datetime.now()) - timedelta(days=self.hourly_days)).strftime('%Y-%m-%d')
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'DELETE FROM cost_rollup_hour WHERE bucket < {self.placeholder}', (cutoff,))
+        purged = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return purged
+
+    def compact(self, now=None, dry_run=False):
+        """执行保留策略，返回统计信息"""
+        stats = {'days': 0, 'rollup_rows': 0, 'dropped_partitions': [], 'purged_daily_rows': 0,
+                 'purged_hourly_rollups': 0}
+
+        for partition, days, drop in self.plan(now):
+            if dry_run:
+                action = '删除分区' if drop else '删除明细'
+                self._log(f"[dry-run] {partition['name']}: 压缩 {len(days)} 天后{action}")
+                stats['days'] += len(days)
+                continue
+
+            partition_rows = 0
+            for day in days:
+                partition_rows += self._compact_day(partition, day, delete=not drop)
+            stats['days'] += len(days)
+            stats['rollup_rows'] += partition_rows
+
+            if drop:
+                self._finish_partition(partition, partition_rows)
+                stats['dropped_partitions'].append(partition['name'])
+            if days or drop:
+                self._log(f"已压缩 {partition['name']}: {len(days)} 天, {partition_rows} 条每日汇总")
+
+        if not dry_run:
+            stats['purged_daily_rows'] = self.purge_daily(now)
+            stats['purged_hourly_rollups'] = self.purge_hourly_rollups(now)
+            # 分析存储中已结束的月份合并为单个Parquet文件
+            if self.db_manager.analytics is not None:
+                stats['analytics_merged_months'] = self.db_manager.analytics.compact_partitions()
+        return stats
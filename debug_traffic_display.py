@@ -6,7 +6,7 @@
 
 import sqlite3
 import json
-from database.db_manager import DatabaseManager
+from database.db_manager import DatabaseManager, merge_details
 from utils.db_config import get_db_config
 
 def debug_traffic_display():
@@ -68,12 +68,13 @@ def debug_traffic_display():
     
     # 6. 检查具体的Traffic记录
     cursor.execute('''
-        SELECT resource_id, daily_cost, details 
-        FROM cost_records 
-        WHERE timestamp = ? AND service_type = 'Traffic'
-        ORDER BY daily_cost DESC
+        SELECT r.resource_id, r.daily_cost, res.attributes, r.details
+        FROM cost_records r LEFT JOIN resources res ON res.id = r.resource_key 
+        WHERE r.timestamp = ? AND r.service_type = 'Traffic'
+        ORDER BY r.daily_cost DESC
     ''', (timestamp,))
-    traffic_records = cursor.fetchall()
+    traffic_records = [(resource_id, daily_cost, merge_details(attributes, details))
+                       for resource_id, daily_cost, attributes, details in cursor.fetchall()]
     
     print(f"\nTraffic记录详情 ({len(traffic_records)}条):")
     for resource_id, daily_cost, details_json in traffic_records:
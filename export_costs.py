@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本历史导出工具
+
+示例:
+    python export_costs.py --format csv --start 2024-01-01 --end 2025-01-01 -o costs.csv
+    python export_costs.py --format parquet --service EC2,RDS -o ec2_rds.parquet
+    python export_costs.py --format ndjson --start 2024-06-01 > june.ndjson
+"""
+
+import argparse
+import sys
+
+from database.db_manager import DatabaseManager
+from database.exporter import CostExporter, EXPORT_FORMATS
+from utils.db_config import get_db_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式导出成本历史记录')
+    parser.add_argument('--format', default='csv', choices=list(EXPORT_FORMATS), help='导出格式')
+    parser.add_argument('--start', help='开始时间 (ISO格式, 包含)')
+    parser.add_argument('--end', help='结束时间 (ISO格式, 不包含)')
+    parser.add_argument('--service', default='', help='服务类型过滤, 逗号分隔 (如 EC2,RDS,Lambda)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='每批读取的行数')
+    parser.add_argument('-o', '--output', help='输出文件 (默认输出到stdout)')
+    args = parser.parse_args()
+
+    service_types = [s.strip() for s in args.service.split(',') if s.strip()] or None
+    exporter = CostExporter(DatabaseManager(get_db_config()), batch_size=args.batch_size)
+
+    try:
+        if args.output:
+            total_bytes = exporter.export_to_file(args.output, args.format, args.start, args.end, service_types)
+            print(f"导出完成: {args.output} ({total_bytes / 1024 / 1024:.2f} MB)", file=sys.stderr)
+        else:
+            for chunk in exporter.stream(args.format, args.start, args.end, service_types):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+    except (ValueError, RuntimeError) as e:
+        print(f"导出失败: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
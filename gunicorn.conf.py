@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gunicorn生产配置
+
+仪表板请求主要是短小的数据库读取 (I/O密集)，使用gthread worker:
+多进程避免GIL竞争，每个进程内多线程处理并发请求。
+扫描任务不在Web进程中执行 (见scan_worker.py)，因此无需长超时。
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', '0.0.0.0:80')
+workers = int(os.getenv('WEB_WORKERS', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+timeout = int(os.getenv('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# 定期回收worker，防止长期运行的内存增长
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+# 预加载应用: 模块只导入一次 (Web进程不持有数据库连接，fork安全)
+preload_app = True
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+
+
+def post_fork(server, worker):
+    """每个worker启动后预热自己的进程内缓存"""
+    from app import warm_caches
+    warm_caches()
+
+
+def child_exit(server, worker):
+    """多进程指标模式下清理已退出worker的指标文件"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+资源事件消费工具 - 从事件来源读取资源生命周期事件，增量更新最新成本快照
+
+设置EVENT_FEED后收集器 (cost_collector.py) 会在定时任务中自动消费事件；
+本工具用于单独运行消费进程或回放事件文件。
+
+示例:
+    python ingest_events.py --feed file:data/events.jsonl --once
+    python ingest_events.py --feed sqs:https://sqs.us-east-1.amazonaws.com/123456789012/cost-events
+"""
+
+import argparse
+import time
+
+from collectors.events import get_event_config, get_event_feed
+
+
+def main():
+    config = get_event_config()
+    parser = argparse.ArgumentParser(description='消费资源生命周期事件，增量更新最新快照')
+    parser.add_argument('--feed', default=config['feed'], help='事件来源 file:<路径> 或 sqs:<队列URL> (默认EVENT_FEED)')
+    parser.add_argument('--interval', type=int, default=config['poll_seconds'], help='轮询间隔(秒)')
+    parser.add_argument('--once', action='store_true', help='只处理当前已有的事件')
+    args = parser.parse_args()
+
+    if not args.feed:
+        parser.error('请通过--feed或EVENT_FEED指定事件来源')
+
+    from cost_collector import CostCollectorV2
+    collector = CostCollectorV2()
+    feed = get_event_feed(collector.session, args.feed)
+
+    while True:
+        stats = collector.process_events(feed)
+        if stats.get('events'):
+            print(f"处理事件: {stats}")
+        if args.once and not stats.get('events'):
+            break
+        if not stats.get('events'):
+            time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
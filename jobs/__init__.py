@@ -0,0 +1 @@
+# 任务队列模块
\ No newline at end of file
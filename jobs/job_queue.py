@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描任务队列 - 基于本地SQLite，Web进程入队，独立的worker进程执行
+"""
+
+import json
+import os
+import socket
+import sqlite3
+from datetime import datetime, timedelta
+
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+def get_queue_path():
+    """获取任务队列数据库路径"""
+    return os.getenv('JOB_QUEUE_PATH', 'data/job_queue.db')
+
+
+def get_worker_id(index=0):
+    """生成worker标识: 主机名:进程号:序号"""
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+class JobQueue:
+    def __init__(self, path=None):
+        self.path = path or get_queue_path()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.init_queue()
+
+    def get_connection(self):
+        """获取队列连接 (WAL模式，允许Web和worker并发读写)"""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def init_queue(self):
+        """初始化队列表"""
+        conn = self.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS scan_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_scan_jobs_status ON scan_jobs(status, id)')
+        conn.close()
+
+    def enqueue(self, job_type='collect', payload=None, dedupe=True):
+        """提交任务，dedupe=True时若已有同类型未完成任务则返回None"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if dedupe:
+                active = conn.execute('''
+                    SELECT id FROM scan_jobs
+                    WHERE job_type = ? AND status IN (?, ?)
+                    LIMIT 1
+                ''', (job_type, JOB_PENDING, JOB_RUNNING)).fetchone()
+                if active:
+                    conn.execute('ROLLBACK')
+                    return None
+
+            cursor = conn.execute('''
+                INSERT INTO scan_jobs (job_type, status, payload, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (job_type, JOB_PENDING, json.dumps(payload or {}), datetime.now().isoformat()))
+            conn.execute('COMMIT')
+            return cursor.lastrowid
+        except Exception:
+            # 与claim相同: BEGIN IMMEDIATE失败时没有打开的事务
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, worker_id, job_types=None):
+        """原子地领取最早的待执行任务，没有任务时返回None"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            sql = 'SELECT * FROM scan_jobs WHERE status = ?'
+            params = [JOB_PENDING]
+            if job_types:
+                sql += f" AND job_type IN ({', '.join('?' * len(job_types))})"
+                params.extend(job_types)
+            row = conn.execute(sql + ' ORDER BY id ASC LIMIT 1', params).fetchone()
+
+            if not row:
+                conn.execute('ROLLBACK')
+                return None
+
+            started_at = datetime.now().isoformat()
+            conn.execute('''
+                UPDATE scan_jobs SET status = ?, worker = ?, started_at = ?
+                WHERE id = ?
+            ''', (JOB_RUNNING, worker_id, started_at, row['id']))
+            conn.execute('COMMIT')
+
+            job = self._row_to_job(row)
+            job.update({'status': JOB_RUNNING, 'worker': worker_id, 'started_at': started_at})
+            return job
+        except Exception:
+            # BEGIN IMMEDIATE本身失败 (数据库被锁) 时没有打开的事务，不能ROLLBACK，否则会掩盖原始错误
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, job_id, result=None):
+        """标记任务完成"""
+        self._finish(job_id, JOB_DONE, result=json.dumps(result or {}))
+
+    def fail(self, job_id, error):
+        """标记任务失败"""
+        self._finish(job_id, JOB_FAILED, error=str(error))
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = self.get_connection()
+        conn.execute('''
+            UPDATE scan_jobs SET status = ?, result = ?, error = ?, finished_at = ?
+            WHERE id = ?
+        ''', (status, result, error, datetime.now().isoformat(), job_id))
+        conn.close()
+
+    def requeue_stale(self, timeout_minutes=120):
+        """把超时仍处于running的任务 (worker崩溃) 重新放回队列"""
+        cutoff = (datetime.now() - timedelta(minutes=timeout_minutes)).isoformat()
+        conn = self.get_connection()
+        cursor = conn.execute('''
+            UPDATE scan_jobs SET status = ?, worker = NULL, started_at = NULL
+            WHERE status = ? AND started_at < ?
+        ''', (JOB_PENDING, JOB_RUNNING, cutoff))
+        conn.close()
+        return cursor.rowcount
+
+    def get_job(self, job_id):
+        """获取指定任务"""
+        conn = self.get_connection()
+        row = conn.execute('SELECT * FROM scan_jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        return self._row_to_job(row) if row else None
+
+    def get_latest_job(self, job_type='collect'):
+        """获取某类型最近提交的任务"""
+        conn = self.get_connection()
+        row = conn.execute('''
+            SELECT * FROM scan_jobs WHERE job_type = ?
+            ORDER BY id DESC LIMIT 1
+        ''', (job_type,)).fetchone()
+        conn.close()
+        return self._row_to_job(row) if row else None
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        for key in ('payload', 'result'):
+            if job.get(key):
+                try:
+                    job[key] = json.loads(job[key])
+                except ValueError:
+                    pass
+        return job
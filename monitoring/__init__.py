@@ -0,0 +1 @@
+# 监控与可观测性模块
\ No newline at end of file
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本指标Collector - 仅在最新快照变化时重建指标，抓取时直接输出缓存
+
+与逐个调用Gauge.labels().set()不同，每次快照变化都重新生成完整的指标族，
+已删除资源的标签序列会自然消失，不会无限增长。
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from prometheus_client.core import GaugeMetricFamily, InfoMetricFamily
+
+
+OTHER_RESOURCE_ID = 'other'
+
+
+def get_top_n_config():
+    """每个服务保留的资源序列数 (0表示不限制)"""
+    return int(os.getenv('PROMETHEUS_TOP_N_RESOURCES', 0))
+
+
+class CostMetricsCollector:
+    def __init__(self, db_manager, top_n=None, check_interval=15):
+        self.db_manager = db_manager
+        self.top_n = get_top_n_config() if top_n is None else top_n
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.snapshot_key = None
+        self.last_check = 0
+        self.families = []
+        self.status = {'collection_status': 'pending'}
+
+    def describe(self):
+        """避免注册时触发数据库查询"""
+        return []
+
+    def collect(self):
+        self.refresh()
+        for family in self.families:
+            yield family
+        info = InfoMetricFamily('aws_cost_collection', 'AWS成本收集信息')
+        info.add_metric([], self.status)
+        yield info
+
+    def refresh(self, force=False):
+        """检查最新快照，变化时重建指标；check_interval内最多检查一次"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and now - self.last_check < self.check_interval:
+                return False
+            self.last_check = now
+
+            try:
+                key, summary, monthly_total = self._load_snapshot_key()
+                if summary is None:
+                    return False
+                if not force and key == self.snapshot_key:
+                    return False
+
+                self.families, resource_count = self._build_families(summary, monthly_total)
+                self.snapshot_key = key
+                self.status = {
+                    'last_update': summary['timestamp'],
+                    'total_resources': str(resource_count),
+                    'collection_status': 'success'
+                }
+                return True
+            except Exception as e:
+                self.status = {'collection_status': 'error', 'error_message': str(e)}
+                return False
+
+    def _load_snapshot_key(self):
+        """读取最新汇总和当月总成本，作为快照是否变化的依据"""
+        summary = self.db_manager.get_latest_summary()
+        if not summary:
+            return None, None, None
+
+        current_month = datetime.now().strftime('%Y-%m')
+        placeholder = '?' if self.db_manager.db_type == 'sqlite' else '%s'
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT total_monthly_cost FROM monthly_summary WHERE year_month = {placeholder}', (current_month,))
+        monthly_result = cursor.fetchone()
+        conn.close()
+
+        monthly_total = float(monthly_result[0]) if monthly_result else None
+        return (summary['timestamp'], summary.get('updated_at'), current_month, monthly_total), summary, monthly_total
+
+    def _load_resources(self):
+        """最新快照的资源 (不含Lambda)，直接读取latest_resources表"""
+        conn = self.db_manager.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT service_type, resource_id, region, daily_cost
+            FROM latest_resources WHERE service_type <> 'Lambda'
+        ''')
+        resources = cursor.fetchall()
+        conn.close()
+        return resources
+
+    def _limit_cardinality(self, resources):
+        """每个服务只保留成本最高的top_n个资源，其余合并为other"""
+        if not self.top_n:
+            return [(s, r, region, float(cost)) for s, r, region, cost in resources]
+
+        by_service = defaultdict(list)
+        for service_type, resource_id, region, daily_cost in resources:
+            by_service[service_type].append((float(daily_cost), resource_id, region))
+
+        limited = []
+        for service_type, items in by_service.items():
+            items.sort(key=lambda item: item[0], reverse=True)
+            for daily_cost, resource_id, region in items[:self.top_n]:
+                limited.append((service_type, resource_id, region, daily_cost))
+            rest = items[self.top_n:]
+            if rest:
+                limited.append((service_type, OTHER_RESOURCE_ID, 'all', sum(item[0] for item in rest)))
+        return limited
+
+    def _build_families(self, summary, monthly_total):
+        daily_total = GaugeMetricFamily('aws_cost_daily_total_usd', 'AWS每日总成本(美元)')
+        daily_total.add_metric([], float(summary['total_daily_cost']))
+
+        hourly_total = GaugeMetricFamily('aws_cost_hourly_total_usd', 'AWS每小时总成本(美元)')
+        hourly_total.add_metric([], float(summary['total_hourly_cost']))
+
+        families = [daily_total, hourly_total]
+
+        if monthly_total is not None:
+            monthly = GaugeMetricFamily('aws_cost_monthly_total_usd', 'AWS当月总成本(美元)')
+            monthly.add_metric([], monthly_total)
+            families.append(monthly)
+
+        by_service = GaugeMetricFamily('aws_cost_daily_by_service_usd', 'AWS每日服务成本(美元)', labels=['service'])
+        if summary.get('service_breakdown'):
+            try:
+                for service, cost in json.loads(summary['service_breakdown']).items():
+                    by_service.add_metric([service], float(cost))
+            except (TypeError, ValueError):
+                pass
+        families.append(by_service)
+
+        resources = self._load_resources()
+        by_resource = GaugeMetricFamily(
+            'aws_cost_daily_by_resource_usd', 'AWS每日资源成本(美元)',
+            labels=['service', 'resource_id', 'region']
+        )
+        for service_type, resource_id, region, daily_cost in self._limit_cardinality(resources):
+            by_resource.add_metric([service_type, resource_id, region], daily_cost)
+        families.append(by_resource)
+
+        return families, len(resources)
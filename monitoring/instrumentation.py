@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描流水线自监控指标 - 收集器耗时、AWS API调用、价格缓存、数据库写入
+
+未安装prometheus_client时所有记录函数都是空操作。
+多进程部署 (Web/收集器/worker) 时设置PROMETHEUS_MULTIPROC_DIR，
+各进程的指标写入共享目录，由/metrics统一汇总输出。
+"""
+
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+# AWS返回的限流错误码
+THROTTLE_ERROR_CODES = {
+    'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottledException',
+    'TooManyRequestsException', 'RequestLimitExceeded', 'ProvisionedThroughputExceededException',
+    'RequestThrottled', 'SlowDown', 'PriorRequestNotComplete', 'EC2ThrottledException'
+}
+
+SCAN_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+API_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+if PROMETHEUS_AVAILABLE:
+    COLLECTION_DURATION = Histogram(
+        'aws_cost_collection_duration_seconds', '完整一次collect_and_save的耗时(秒)', buckets=SCAN_BUCKETS
+    )
+    COLLECTION_RUNS = Counter('aws_cost_collection_runs_total', '成本收集执行次数', ['status'])
+    LAST_COLLECTION = Gauge(
+        'aws_cost_last_collection_timestamp_seconds', '最近一次成功收集的Unix时间戳',
+        multiprocess_mode='max'
+    )
+    SCAN_DURATION = Histogram(
+        'aws_cost_scan_duration_seconds', '收集器扫描单个区域的耗时(秒)', ['collector', 'region'],
+        buckets=SCAN_BUCKETS
+    )
+    API_CALLS = Counter('aws_cost_aws_api_calls_total', 'AWS API调用次数', ['service', 'operation', 'status'])
+    API_LATENCY = Histogram(
+        'aws_cost_aws_api_call_duration_seconds', 'AWS API调用耗时(秒, 含重试)', ['service', 'operation'],
+        buckets=API_BUCKETS
+    )
+    API_THROTTLES = Counter('aws_cost_aws_api_throttles_total', 'AWS API限流次数', ['service', 'operation'])
+    PRICE_CACHE_REQUESTS = Counter(
+        'aws_cost_price_cache_requests_total', '价格缓存查询次数', ['price_type', 'result']
+    )
+    DB_WRITE_DURATION = Histogram(
+        'aws_cost_db_write_duration_seconds', '数据库写入耗时(秒)', ['operation'], buckets=DB_BUCKETS
+    )
+    DB_ROWS_WRITTEN = Counter('aws_cost_db_rows_written_total', '写入的数据库行数', ['table'])
+
+
+def observe_scan_duration(collector, region, seconds):
+    """记录收集器单个区域的扫描耗时"""
+    if PROMETHEUS_AVAILABLE:
+        SCAN_DURATION.labels(collector=collector, region=region).observe(seconds)
+
+
+def record_collection(seconds, success):
+    """记录一次完整收集的耗时和结果"""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    COLLECTION_RUNS.labels(status='success' if success else 'error').inc()
+    if success:
+        COLLECTION_DURATION.observe(seconds)
+        LAST_COLLECTION.set(time.time())
+
+
+def record_price_cache(price_type, hit):
+    """记录价格缓存命中/未命中"""
+    if PROMETHEUS_AVAILABLE:
+        PRICE_CACHE_REQUESTS.labels(price_type=price_type, result='hit' if hit else 'miss').inc()
+
+
+def record_rows_written(table, count):
+    """记录写入的行数"""
+    if PROMETHEUS_AVAILABLE and count:
+        DB_ROWS_WRITTEN.labels(table=table).inc(count)
+
+
+@contextmanager
+def time_db_write(operation):
+    """统计数据库写入耗时"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if PROMETHEUS_AVAILABLE:
+            DB_WRITE_DURATION.labels(operation=operation).observe(time.perf_counter() - start)
+
+
+def _before_call(model, context, **kwargs):
+    context['instrumentation_start'] = time.perf_counter()
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    service = model.service_model.service_name
+    operation = model.name
+    error_code = (parsed or {}).get('Error', {}).get('Code')
+    status = 'error' if error_code else 'success'
+
+    API_CALLS.labels(service=service, operation=operation, status=status).inc()
+    start = context.get('instrumentation_start')
+    if start is not None:
+        API_LATENCY.labels(service=service, operation=operation).observe(time.perf_counter() - start)
+
+
+def _needs_retry(response, operation, **kwargs):
+    # 每次尝试都会触发，用于统计被限流的请求 (包括随后重试成功的)
+    if not response:
+        return None
+    parsed = response[1] or {}
+    if parsed.get('Error', {}).get('Code') in THROTTLE_ERROR_CODES:
+        service = operation.service_model.service_name
+        API_THROTTLES.labels(service=service, operation=operation.name).inc()
+    return None
+
+
+def instrument_session(session):
+    """给boto3 Session注册事件钩子，统计该会话创建的所有客户端的API调用"""
+    if not PROMETHEUS_AVAILABLE or getattr(session, '_cost_instrumented', False):
+        return session
+
+    session.events.register('before-call.*.*', _before_call, unique_id='cost-instrumentation-before-call')
+    session.events.register('after-call.*.*', _after_call, unique_id='cost-instrumentation-after-call')
+    session.events.register('needs-retry.*.*', _needs_retry, unique_id='cost-instrumentation-needs-retry')
+    session._cost_instrumented = True
+    return session
+
+
+def build_registry(*collectors):
+    """构建用于输出的Registry: 多进程模式下汇总所有进程的指标，并附加自定义collector"""
+    from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in collectors:
+        registry.register(collector)
+    return registry
+
+
+def reset_multiprocess_dir():
+    """启动时清空多进程指标目录 (由启动脚本在派生子进程前调用)"""
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if not path:
+        return None
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描链路追踪 - 记录collect_and_save各阶段、收集器、区域和AWS调用的嵌套耗时
+
+导出格式:
+- OpenTelemetry OTLP/JSON (可导入Jaeger、Tempo等)
+- folded stacks (可直接交给flamegraph.pl / speedscope生成火焰图)
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+# 当前上下文中的 (trace, span)，线程池中需要通过wrap_context传递
+_current = contextvars.ContextVar('cost_scan_span', default=None)
+
+
+class Span:
+    def __init__(self, trace, name, kind, parent, attributes):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes)
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """耗时(秒)"""
+        end_ns = self.end_ns or time.time_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def finish(self, error=None):
+        self.end_ns = time.time_ns()
+        self.error = str(error) if error else None
+
+
+class ScanTrace:
+    def __init__(self, name):
+        self.trace_id = secrets.token_hex(16)
+        self.lock = threading.Lock()
+        self.spans = []
+        self.root = self._new_span(name, 'scan', None, {})
+
+    def _new_span(self, name, kind, parent, attributes):
+        span = Span(self, name, kind, parent, attributes)
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    def finish(self, error=None):
+        self.root.finish(error)
+
+    def summary(self):
+        """按阶段、账号、收集器、区域和AWS调用汇总耗时"""
+        result = {
+            'phases': {},
+            'accounts': {},
+            'collectors': {},
+            'regions': {},
+            'aws_calls': defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'errors': 0})
+        }
+        with self.lock:
+            spans = list(self.spans)
+
+        for span in spans:
+            if span.kind == 'phase':
+                result['phases'][span.name] = round(span.duration, 4)
+            elif span.kind == 'account':
+                result['accounts'][span.attributes['account_id']] = round(span.duration, 4)
+            elif span.kind == 'collector':
+                result['collectors'][span.attributes['collector']] = round(span.duration, 4)
+            elif span.kind == 'region':
+                key = f"{span.attributes['collector']}/{span.attributes['region']}"
+                result['regions'][key] = round(span.duration, 4)
+            elif span.kind == 'aws_call':
+                call = result['aws_calls'][span.name]
+                call['count'] += 1
+                call['seconds'] += span.duration
+                if span.error:
+                    call['errors'] += 1
+
+        for call in result['aws_calls'].values():
+            call['seconds'] = round(call['seconds'], 4)
+        result['aws_calls'] = dict(result['aws_calls'])
+        return result
+
+    def to_otlp(self, service_name='aws-cost-monitor'):
+        """导出为OpenTelemetry OTLP/JSON结构"""
+        with self.lock:
+            spans = list(self.spans)
+
+        otlp_spans = []
+        for span in spans:
+            attributes = [{'key': 'kind', 'value': {'stringValue': span.kind}}]
+            attributes += [
+                {'key': key, 'value': {'stringValue': str(value)}}
+                for key, value in span.attributes.items()
+            ]
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': 3 if span.kind == 'aws_call' else 1,  # CLIENT / INTERNAL
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or time.time_ns()),
+                'attributes': attributes,
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1}
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            otlp_spans.append(otlp_span)
+
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+                'scopeSpans': [{'scope': {'name': 'aws_cost_monitor.tracing'}, 'spans': otlp_spans}]
+            }]
+        }
+
+    def to_folded(self):
+        """导出为folded stacks格式 (每行: 调用栈;分号分隔 自身耗时毫秒)"""
+        with self.lock:
+            spans = list(self.spans)
+
+        by_id = {span.span_id: span for span in spans}
+        child_time = defaultdict(int)
+        for span in spans:
+            if span.parent_id:
+                child_time[span.parent_id] += (span.end_ns or time.time_ns()) - span.start_ns
+
+        stacks = defaultdict(int)
+        for span in spans:
+            path = []
+            node = span
+            while node:
+                path.append(node.name.replace(';', ':').replace(' ', '_'))
+                node = by_id.get(node.parent_id)
+            total_ns = (span.end_ns or time.time_ns()) - span.start_ns
+            # 并发的子span总时长可能超过父span，自身耗时最小为0
+            self_ms = max(0, total_ns - child_time[span.span_id]) // 1_000_000
+            if self_ms:
+                stacks[';'.join(reversed(path))] += self_ms
+
+        return '\n'.join(f"{stack} {value}" for stack, value in stacks.items()) + '\n'
+
+    def export(self, directory):
+        """写出OTLP JSON和folded文件，返回文件路径"""
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(directory, f"scan_{time.strftime('%Y%m%d_%H%M%S')}_{self.trace_id[:8]}")
+        with open(f"{prefix}.otlp.json", 'w', encoding='utf-8') as f:
+            json.dump(self.to_otlp(), f, ensure_ascii=False)
+        with open(f"{prefix}.folded", 'w', encoding='utf-8') as f:
+            f.write(self.to_folded())
+        return [f"{prefix}.otlp.json", f"{prefix}.folded"]
+
+
+def start_trace(name='collect_and_save'):
+    """开始一次扫描追踪，并把根span设为当前上下文"""
+    trace = ScanTrace(name)
+    _current.set(trace.root)
+    return trace
+
+
+def end_trace(trace, error=None):
+    """结束追踪并清除当前上下文"""
+    trace.finish(error)
+    _current.set(None)
+
+
+@contextmanager
+def span(name, kind='phase', **attributes):
+    """在当前追踪下创建子span；没有活动追踪时不做任何事"""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+
+    child = parent.trace._new_span(name, kind, parent, attributes)
+    token = _current.set(child)
+    error = None
+    try:
+        yield child
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        child.finish(error)
+        _current.reset(token)
+
+
+def wrap_context(func):
+    """把当前追踪上下文带入线程池任务"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def _before_call(model, context, **kwargs):
+    parent = _current.get()
+    if parent is None:
+        return
+    service = model.service_model.service_name
+    context['trace_span'] = parent.trace._new_span(
+        f"{service}.{model.name}", 'aws_call', parent, {'service': service, 'operation': model.name}
+    )
+
+
+def _after_call(parsed, context, **kwargs):
+    trace_span = context.pop('trace_span', None)
+    if trace_span is not None:
+        trace_span.finish((parsed or {}).get('Error', {}).get('Code'))
+
+
+def trace_session(session):
+    """给boto3 Session注册钩子，为每次AWS API调用生成span"""
+    if getattr(session, '_cost_traced', False):
+        return session
+    session.events.register('before-call.*.*', _before_call, unique_id='cost-tracing-before-call')
+    session.events.register('after-call.*.*', _after_call, unique_id='cost-tracing-after-call')
+    session._cost_traced = True
+    return session
+
+
+def get_trace_export_dir():
+    """追踪文件导出目录，未设置时不导出文件"""
+    return os.getenv('TRACE_EXPORT_DIR')
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地价格目录 - 从AWS Price List批量下载整个区域的价格表，保存到本地SQLite (PRICE_CATALOG_PATH)
+
+每个 (服务, 区域) 的价格表通过 list_price_lists / get_price_list_file_url 下载一次 (CSV逐行流式解析)，
+PRICE_CATALOG_REFRESH_DAYS 天后重新下载；查价只读本地数据，不再为每个实例调用 get_products。
+目前收录RDS: 实例 (引擎、版本、许可、实例类型、部署方式)、Serverless v2、存储、预置IOPS/吞吐量和Aurora I/O。
+"""
+
+import csv
+import io
+import os
+import sqlite3
+import threading
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+
+# Price List中的Volume Type -> RDS存储类型 (describe_db_instances的StorageType)
+RDS_VOLUME_TYPES = {
+    'General Purpose': 'gp2',
+    'General Purpose-GP3': 'gp3',
+    'Provisioned IOPS': 'io1',
+    'Provisioned IOPS-IO2': 'io2',
+    'Magnetic': 'standard',
+    'General Purpose-Aurora': 'aurora',
+    'IO Optimized-Aurora': 'aurora-iopt1'
+}
+
+# describe_db_instances的Engine -> Price List的 (Database Engine, Database Edition)
+RDS_ENGINES = {
+    'mysql': ('MySQL', ''),
+    'mariadb': ('MariaDB', ''),
+    'postgres': ('PostgreSQL', ''),
+    'aurora': ('Aurora MySQL', ''),
+    'aurora-mysql': ('Aurora MySQL', ''),
+    'aurora-postgresql': ('Aurora PostgreSQL', ''),
+    'oracle-ee': ('Oracle', 'Enterprise'),
+    'oracle-ee-cdb': ('Oracle', 'Enterprise'),
+    'oracle-se2': ('Oracle', 'Standard Two'),
+    'oracle-se2-cdb': ('Oracle', 'Standard Two'),
+    'sqlserver-ee': ('SQL Server', 'Enterprise'),
+    'sqlserver-se': ('SQL Server', 'Standard'),
+    'sqlserver-ex': ('SQL Server', 'Express'),
+    'sqlserver-web': ('SQL Server', 'Web'),
+    'db2-se': ('Db2', 'Standard'),
+    'db2-ae': ('Db2', 'Advanced')
+}
+
+# describe_db_instances的LicenseModel -> Price List的License Model
+RDS_LICENSE_MODELS = {
+    'license-included': 'License included',
+    'bring-your-own-license': 'Bring your own license',
+    'general-public-license': 'No license required',
+    'postgresql-license': 'No license required',
+    'marketplace-license': 'Bring your own license'
+}
+
+
+def get_price_catalog_config():
+    """价格目录配置"""
+    return {
+        'path': os.getenv('PRICE_CATALOG_PATH', 'data/price_catalog.db'),
+        'refresh_days': float(os.getenv('PRICE_CATALOG_REFRESH_DAYS', 7))
+    }
+
+
+def _rds_storage_dimension(family, usage_type, volume_type):
+    """存储类价格行对应的 (存储类型, 计价维度)；无关的行返回None"""
+    if family == 'Database Storage':
+        storage_type = RDS_VOLUME_TYPES.get(volume_type)
+        return (storage_type, 'storage') if storage_type else None
+    if family == 'Provisioned IOPS':
+        if 'GP3' in usage_type:
+            return 'gp3', 'iops'
+        return ('io2' if 'IO2' in usage_type else 'io1'), 'iops'
+    if family == 'Provisioned Throughput':
+        return 'gp3', 'throughput'
+    if family == 'System Operation' and usage_type.endswith('StorageIOUsage'):
+        return 'aurora', 'io'
+    return None
+
+
+class PriceCatalog:
+    def __init__(self, session, path=None, refresh_days=None):
+        config = get_price_catalog_config()
+        self.session = session
+        self.path = path or config['path']
+        self.refresh_days = config['refresh_days'] if refresh_days is None else refresh_days
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA busy_timeout=30000')
+        if self.path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._lock = threading.Lock()
+        # 同一区域只由一个线程下载
+        self._load_lock = threading.Lock()
+        # 区域 -> (过期时间, 内存中的RDS价格)；过期前不再读取SQLite
+        self._rds = {}
+        self.init_catalog()
+
+    def init_catalog(self):
+        """初始化价格表"""
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS rds_instance_prices (
+                region TEXT NOT NULL,
+                engine TEXT NOT NULL,
+                edition TEXT NOT NULL,
+                license TEXT NOT NULL,
+                instance_class TEXT NOT NULL,
+                deployment TEXT NOT NULL,
+                io_optimized INTEGER NOT NULL,
+                hourly REAL NOT NULL,
+                PRIMARY KEY (region, engine, edition, license, instance_class, deployment, io_optimized)
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS rds_storage_prices (
+                region TEXT NOT NULL,
+                storage_type TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                deployment TEXT NOT NULL,
+                price REAL NOT NULL,
+                PRIMARY KEY (region, storage_type, dimension, deployment)
+            )
+        ''')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_loads (
+                service TEXT NOT NULL,
+                region TEXT NOT NULL,
+                loaded_at TEXT NOT NULL,
+                rows INTEGER NOT NULL,
+                PRIMARY KEY (service, region)
+            )
+        ''')
+
+    def _loaded_at(self, service, region):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT loaded_at FROM catalog_loads WHERE service = ? AND region = ?', (service, region)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def _price_list_rows(self, service_code, region):
+        """下载区域的价格表 (CSV)，逐行返回表头之后的记录"""
+        pricing = self.session.client('pricing', region_name='us-east-1')
+        price_lists = pricing.list_price_lists(
+            ServiceCode=service_code, EffectiveDate=datetime.now(timezone.utc),
+            RegionCode=region, CurrencyCode='USD'
+        )['PriceLists']
+        if not price_lists:
+            return
+        url = pricing.get_price_list_file_url(PriceListArn=price_lists[0]['PriceListArn'], FileFormat='csv')['Url']
+
+        with urllib.request.urlopen(url, timeout=300) as response:
+            header = None
+            for row in csv.reader(io.TextIOWrapper(response, encoding='utf-8', newline='')):
+                # 表头之前是几行版本信息
+                if header is None:
+                    if row and row[0] == 'SKU':
+                        header = row
+                    continue
+                yield dict(zip(header, row))
+
+    def _download_rds(self, region):
+        """下载并保存一个区域的RDS按需价格"""
+        instances = {}
+        storage = {}
+        for row in self._price_list_rows('AmazonRDS', region):
+            if row.get('TermType') != 'OnDemand' or row.get('Location Type', 'AWS Region') != 'AWS Region':
+                continue
+            try:
+                price = float(row['PricePerUnit'])
+            except (KeyError, ValueError):
+                continue
+            family = row.get('Product Family', '')
+            usage_type = row.get('usageType', '')
+
+            if family in ('Database Instance', 'ServerlessV2'):
+                instance_class = row.get('Instance Type') if family == 'Database Instance' else 'db.serverless'
+                if not instance_class or not row.get('Database Engine'):
+                    continue
+                key = (row['Database Engine'], row.get('Database Edition', ''), row.get('License Model', ''),
+                       instance_class, row.get('Deployment Option', 'Single-AZ'), int('IOOptimized' in usage_type))
+                instances.setdefault(key, price)
+            else:
+                dimension = _rds_storage_dimension(family, usage_type, row.get('Volume Type', ''))
+                if dimension:
+                    storage.setdefault(dimension + (row.get('Deployment Option') or 'Single-AZ',), price)
+
+        with self._lock:
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM rds_instance_prices WHERE region = ?', (region,))
+                conn.execute('DELETE FROM rds_storage_prices WHERE region = ?', (region,))
+                conn.executemany(
+                    'INSERT INTO rds_instance_prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(region,) + key + (price,) for key, price in instances.items()]
+                )
+                conn.executemany(
+                    'INSERT INTO rds_storage_prices VALUES (?, ?, ?, ?, ?)',
+                    [(region,) + key + (price,) for key, price in storage.items()]
+                )
+                conn.execute('''
+                    INSERT INTO catalog_loads (service, region, loaded_at, rows) VALUES ('rds', ?, ?, ?)
+                    ON CONFLICT (service, region) DO UPDATE SET loaded_at = excluded.loaded_at, rows = excluded.rows
+                ''', (region, datetime.now().isoformat(), len(instances) + len(storage)))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        print(f"已下载RDS价格表 ({region}): {len(instances)} 个实例价格, {len(storage)} 个存储价格")
+
+    def rds_prices(self, region):
+        """区域的RDS价格: {'instances': {(引擎, 版本, 实例类型, 部署方式, I/O优化): {许可: $/小时}},
+        'storage': {(存储类型, 维度): {部署方式: 价格}}}；价格表过期时重新下载，下载失败时沿用旧数据"""
+        cached = self._rds.get(region)
+        if cached is not None and datetime.now() < cached[0]:
+            return cached[1]
+
+        with self._load_lock:
+            cached = self._rds.get(region)
+            if cached is not None and datetime.now() < cached[0]:
+                return cached[1]
+            return self._load_rds(region)
+
+    def _load_rds(self, region):
+        refresh = timedelta(days=self.refresh_days)
+        loaded_at = self._loaded_at('rds', region)
+        if loaded_at is None or datetime.now() - loaded_at > refresh:
+            try:
+                self._download_rds(region)
+                loaded_at = datetime.now()
+            except Exception as e:
+                # 下载失败时一小时后重试
+                print(f"下载RDS价格表失败 ({region}): {e}")
+                loaded_at = datetime.now() - refresh + timedelta(hours=1)
+
+        prices = {'instances': {}, 'storage': {}}
+        with self._lock:
+            for engine, edition, license_model, instance_class, deployment, io_optimized, hourly in self._conn.execute('''
+                SELECT engine, edition, license, instance_class, deployment, io_optimized, hourly
+                FROM rds_instance_prices WHERE region = ?
+            ''', (region,)):
+                key = (engine, edition, instance_class, deployment, bool(io_optimized))
+                prices['instances'].setdefault(key, {})[license_model] = hourly
+            for storage_type, dimension, deployment, price in self._conn.execute('''
+                SELECT storage_type, dimension, deployment, price FROM rds_storage_prices WHERE region = ?
+            ''', (region,)):
+                prices['storage'].setdefault((storage_type, dimension), {})[deployment] = price
+        self._rds[region] = (loaded_at + refresh, prices)
+        return prices
@@ -9,12 +9,22 @@ import json
 import threading
 from datetime import datetime, timedelta
 
+from monitoring.instrumentation import instrument_session, record_price_cache
+from monitoring.tracing import trace_session
+from pricing.catalog import PriceCatalog, RDS_ENGINES, RDS_LICENSE_MODELS
+from pricing.tiers import (
+    CLOUDFRONT_TIERS, DATA_TRANSFER_OUT_TIERS, IO2_IOPS_TIERS, SNS_PUBLISH_TIERS, SQS_FIFO_TIERS, SQS_STANDARD_TIERS, tiered_cost
+)
+
 
 class PriceManager:
-    def __init__(self):
-        self.session = boto3.Session()
+    def __init__(self, session=None):
+        self.session = trace_session(instrument_session(session or boto3.Session()))
         self.price_cache = {}
         self.cache_expiry = {}
+        # 本地价格目录 (pricing.catalog)，第一次查价时打开
+        self.catalog = None
+        self._catalog_lock = threading.Lock()
         
     def _get_location_name(self, region):
         """将AWS区域代码转换为价格API使用的位置名称"""
@@ -38,8 +48,10 @@ class PriceManager:
         
         if cache_key in self.price_cache:
             if datetime.now() < self.cache_expiry.get(cache_key, datetime.min):
+                record_price_cache('ec2', True)
                 return self.price_cache[cache_key]
         
+        record_price_cache('ec2', False)
         real_price = self._get_real_price_sync(instance_type, region, 'ec2')
         
         if real_price > 0:
@@ -50,21 +62,52 @@ class PriceManager:
             return self._get_ec2_price_fallback(instance_type, region)
     
     def get_rds_price(self, instance_type, region='us-east-1'):
-        """获取RDS实时价格"""
-        cache_key = f"rds_{instance_type}_{region}"
+        """获取RDS价格 (MySQL单可用区)"""
+        return self.get_rds_instance_price('mysql', instance_type, region)
+    
+    def _get_catalog(self):
+        with self._catalog_lock:
+            if self.catalog is None:
+                self.catalog = PriceCatalog(self.session)
+            return self.catalog
+    
+    def get_rds_instance_price(self, engine, instance_class, region='us-east-1', multi_az=False,
+                               license_model=None, io_optimized=False):
+        """从本地价格目录获取RDS实例每小时价格 (db.serverless为每ACU小时)"""
+        engine_name, edition = RDS_ENGINES.get(engine, ('MySQL', ''))
+        instances = self._get_catalog().rds_prices(region)['instances']
         
-        if cache_key in self.price_cache:
-            if datetime.now() < self.cache_expiry.get(cache_key, datetime.min):
-                return self.price_cache[cache_key]
+        deployment = 'Multi-AZ' if multi_az else 'Single-AZ'
+        prices = instances.get((engine_name, edition, instance_class, deployment, io_optimized))
+        multiplier = 1
+        if not prices and multi_az:
+            # 没有多可用区价格时按两个单可用区实例计算
+            prices = instances.get((engine_name, edition, instance_class, 'Single-AZ', io_optimized))
+            multiplier = 2
         
-        real_price = self._get_real_price_sync(instance_type, region, 'rds')
+        record_price_cache('rds', bool(prices))
+        if prices:
+            license_name = RDS_LICENSE_MODELS.get(license_model)
+            return prices.get(license_name, min(prices.values())) * multiplier
+        return self._get_rds_price_fallback(instance_class) * (2 if multi_az else 1)
+    
+    def get_rds_storage_price(self, storage_type='gp2', region='us-east-1', multi_az=False):
+        """获取RDS存储价格: storage $/GB/月, iops $/IOPS/月, throughput $/MBps/月, io $/次 (Aurora)"""
+        storage = self._get_catalog().rds_prices(region)['storage']
+        fallback = self._get_rds_storage_price_fallback(storage_type)
         
-        if real_price > 0:
-            self.price_cache[cache_key] = real_price
-            self.cache_expiry[cache_key] = datetime.now() + timedelta(hours=4)
-            return real_price
-        else:
-            return self._get_rds_price_fallback(instance_type)
+        prices = {}
+        for dimension, fallback_price in fallback.items():
+            by_deployment = storage.get((storage_type, dimension), {})
+            if multi_az and 'Multi-AZ' in by_deployment:
+                prices[dimension] = by_deployment['Multi-AZ']
+            elif 'Single-AZ' in by_deployment:
+                prices[dimension] = by_deployment['Single-AZ'] * (2 if multi_az else 1)
+            elif by_deployment:
+                prices[dimension] = next(iter(by_deployment.values()))
+            else:
+                prices[dimension] = fallback_price * (2 if multi_az else 1)
+        return prices
     
     def get_ebs_price(self, volume_type, region='us-east-1'):
         """获取EBS实时价格"""
@@ -72,8 +115,10 @@ class PriceManager:
         
         if cache_key in self.price_cache:
             if datetime.now() < self.cache_expiry.get(cache_key, datetime.min):
+                record_price_cache('ebs', True)
                 return self.price_cache[cache_key]
         
+        record_price_cache('ebs', False)
         real_price = self._get_real_price_sync(volume_type, region, 'ebs')
         
         if real_price > 0:
@@ -83,15 +128,40 @@ class PriceManager:
         else:
             return self._get_ebs_price_fallback(volume_type, region)
     
+    def get_ebs_iops_price(self, volume_type, iops, region='us-east-1'):
+        """计算EBS预置IOPS的月费用 (iops为需要付费的IOPS，gp3已扣除3000基准)"""
+        if volume_type == 'io2':
+            return tiered_cost(iops, IO2_IOPS_TIERS)
+        rates = {'io1': 0.065, 'gp3': 0.005}
+        return iops * rates.get(volume_type, 0.0)
+    
+    def get_ebs_throughput_price(self, region='us-east-1'):
+        """获取gp3超出125MB/s基准的吞吐量价格 ($/MBps/月)"""
+        return 0.04
+    
+    def get_ebs_snapshot_price(self, storage_tier='standard', region='us-east-1'):
+        """获取EBS快照价格 ($/GB/月)；标准层按增量块计费，归档层按完整快照计费"""
+        return 0.0125 if storage_tier == 'archive' else 0.05
+    
     def get_s3_price(self, storage_class='Standard', region='us-east-1'):
-        """获取S3价格"""
-        fallback_prices = {'Standard': 0.023, 'IA': 0.0125, 'Glacier': 0.004}
+        """获取S3价格 ($/GB/月)"""
+        fallback_prices = {
+            'Standard': 0.023,
+            'ReducedRedundancy': 0.024,
+            'IA': 0.0125,
+            'OneZoneIA': 0.01,
+            'GlacierIR': 0.004,
+            'Glacier': 0.0036,
+            'DeepArchive': 0.00099,
+            # 智能分层各访问层
+            'IntelligentTiering-FA': 0.023,
+            'IntelligentTiering-IA': 0.0125,
+            'IntelligentTiering-AIA': 0.004,
+            'IntelligentTiering-AA': 0.0036,
+            'IntelligentTiering-DAA': 0.00099
+        }
         return fallback_prices.get(storage_class, 0.023)
     
-    def get_nat_gateway_price(self, region='us-east-1'):
-        """获取NAT Gateway价格"""
-        return 0.045  # 基础价格
-    
     def get_public_ip_price(self, region='us-east-1'):
         """获取Public IP价格 - 2024年2月1日起统一收费"""
         return 0.005  # $0.005/小时
@@ -111,15 +181,6 @@ class PriceManager:
                         {'Type': 'TERM_MATCH', 'Field': 'operating-system', 'Value': 'Linux'}
                     ]
                 )
-            elif service_type == 'rds':
-                response = pricing_client.get_products(
-                    ServiceCode='AmazonRDS',
-                    Filters=[
-                        {'Type': 'TERM_MATCH', 'Field': 'instanceType', 'Value': instance_type},
-                        {'Type': 'TERM_MATCH', 'Field': 'location', 'Value': self._get_location_name(region)},
-                        {'Type': 'TERM_MATCH', 'Field': 'databaseEngine', 'Value': 'MySQL'}
-                    ]
-                )
             elif service_type == 'ebs':
                 response = pricing_client.get_products(
                     ServiceCode='AmazonEC2',
@@ -167,10 +228,24 @@ class PriceManager:
         """备用RDS价格表"""
         prices = {
             'db.t3.micro': 0.017, 'db.t3.small': 0.034, 'db.m5.large': 0.192,
-            'db.t2.micro': 0.017, 'db.t2.small': 0.034, 'db.m4.large': 0.175
+            'db.t2.micro': 0.017, 'db.t2.small': 0.034, 'db.m4.large': 0.175,
+            'db.serverless': 0.12  # Aurora Serverless v2 每ACU小时
         }
         return prices.get(instance_type, 0.05)
     
+    def _get_rds_storage_price_fallback(self, storage_type):
+        """备用RDS存储价格表 (单可用区)"""
+        prices = {
+            'gp2': {'storage': 0.115},
+            'gp3': {'storage': 0.115, 'iops': 0.02, 'throughput': 0.08},
+            'io1': {'storage': 0.125, 'iops': 0.10},
+            'io2': {'storage': 0.125, 'iops': 0.10},
+            'standard': {'storage': 0.10},
+            'aurora': {'storage': 0.10, 'io': 0.0000002},
+            'aurora-iopt1': {'storage': 0.225}
+        }
+        return prices.get(storage_type, prices['gp2'])
+    
     def _get_ebs_price_fallback(self, volume_type, region='us-east-1'):
         """备用EBS价格表"""
         base_prices = {
@@ -185,16 +260,9 @@ class PriceManager:
         return base_price * region_multiplier.get(region, 1.0)
     
     def get_data_transfer_price(self, volume_gb, region='us-east-1'):
-        """计算数据传输出费用"""
-        # AWS数据传输出定价（美国东部）
-        if volume_gb <= 1:  # 前1GB免费
-            return 0
-        elif volume_gb <= 10240:  # 1GB-10TB: $0.09/GB
-            return (volume_gb - 1) * 0.09
-        elif volume_gb <= 51200:  # 10TB-50TB: $0.085/GB (前10TB) + $0.070/GB
-            return 10239 * 0.09 + (volume_gb - 10240) * 0.070
-        else:  # 50TB+: 更复杂的分层计算
-            return 10239 * 0.09 + 40960 * 0.070 + (volume_gb - 51200) * 0.050
+        """计算数据传输出费用 (volume_gb为账号在该区域的总用量)"""
+        # AWS数据传输出定价（美国东部）: 前1GB免费，1GB-10TB $0.09/GB，10TB-50TB $0.070/GB，50TB以上 $0.050/GB
+        return tiered_cost(volume_gb, DATA_TRANSFER_OUT_TIERS)
     
     def get_nat_gateway_price(self, region='us-east-1'):
         """获取NAT Gateway价格"""
@@ -221,14 +289,43 @@ class PriceManager:
         return prices.get(lb_type, 0.008)
     
     def get_cloudfront_price(self, volume_gb, region='Global'):
-        """计算CloudFront流量费用"""
-        # CloudFront 全球定价（简化）
-        if volume_gb <= 10240:  # 前10TB: $0.085/GB
-            return volume_gb * 0.085
-        elif volume_gb <= 51200:  # 10TB-50TB: $0.070/GB
-            return 10240 * 0.085 + (volume_gb - 10240) * 0.070
-        else:  # 50TB+: $0.060/GB
-            return 10240 * 0.085 + 40960 * 0.070 + (volume_gb - 51200) * 0.060
+        """计算CloudFront流量费用 (volume_gb为账号的总用量)"""
+        # CloudFront 全球定价（简化）: 前10TB $0.085/GB，10TB-50TB $0.070/GB，50TB以上 $0.060/GB
+        return tiered_cost(volume_gb, CLOUDFRONT_TIERS)
+    
+    def get_lambda_price(self, architecture='x86_64', region='us-east-1'):
+        """获取Lambda价格 (计算按GB-秒，Arm架构便宜20%)"""
+        return {
+            'gb_second': 0.0000133334 if architecture == 'arm64' else 0.0000166667,
+            'request': 0.0000002,              # $0.20/百万次请求
+            'ephemeral_gb_second': 0.0000000309  # 超过512MB的临时存储
+        }
+    
+    def get_dynamodb_price(self, table_class='STANDARD', region='us-east-1'):
+        """获取DynamoDB价格 (按需请求单位、预置容量单位/小时、存储$/GB/月)"""
+        if table_class == 'STANDARD_INFREQUENT_ACCESS':
+            return {
+                'read_request_unit': 0.000000155,
+                'write_request_unit': 0.00000078,
+                'rcu_hour': 0.00016,
+                'wcu_hour': 0.00081,
+                'storage_gb_month': 0.10
+            }
+        return {
+            'read_request_unit': 0.000000125,   # $0.125/百万读取请求单位
+            'write_request_unit': 0.000000625,  # $0.625/百万写入请求单位
+            'rcu_hour': 0.00013,
+            'wcu_hour': 0.00065,
+            'storage_gb_month': 0.25
+        }
+    
+    def get_sqs_price(self, million_requests, fifo=False, region='us-east-1'):
+        """计算SQS每月请求费用 (million_requests为账号的每月总请求数，单位百万次)"""
+        return tiered_cost(million_requests, SQS_FIFO_TIERS if fifo else SQS_STANDARD_TIERS)
+    
+    def get_sns_publish_price(self, million_publishes, region='us-east-1'):
+        """计算SNS每月发布费用 (million_publishes为账号的每月总发布数，单位百万次)"""
+        return tiered_cost(million_publishes, SNS_PUBLISH_TIERS)
     
     def get_route53_price(self, query_count):
         """计算Route 53查询费用"""
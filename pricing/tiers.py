@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分层计价 - 阶梯价格 (含免费额度) 按账号内同一用量类型的总用量计算，再按用量比例分摊回各个资源
+
+例如两台实例各传出6TB: 整个账号12TB，前10TB按$0.09/GB、其余按$0.070/GB计价，
+两台实例各分摊一半，而不是各自从第一档重新计算。
+"""
+
+from collections import defaultdict
+
+
+# 阶梯价格: (该档上限GB, 单价$/GB)，上限None表示以上所有用量
+DATA_TRANSFER_OUT_TIERS = (
+    (1, 0.0),          # 前1GB免费
+    (10240, 0.09),     # 1GB-10TB
+    (51200, 0.070),    # 10TB-50TB
+    (None, 0.050)      # 50TB以上
+)
+
+CLOUDFRONT_TIERS = (
+    (10240, 0.085),    # 前10TB
+    (51200, 0.070),    # 10TB-50TB
+    (None, 0.060)      # 50TB以上
+)
+
+# 请求类阶梯价格: (该档上限百万次, 单价$/百万次)，免费额度按账号在所有区域的总量计算
+SQS_STANDARD_TIERS = (
+    (1, 0.0),          # 每月前100万次请求免费 (标准队列和FIFO队列共用，这里计入标准队列)
+    (100000, 0.40),    # 100万-1000亿次
+    (200000, 0.30),    # 1000亿-2000亿次
+    (None, 0.24)       # 2000亿次以上
+)
+
+SQS_FIFO_TIERS = (
+    (100000, 0.50),
+    (200000, 0.40),
+    (None, 0.35)
+)
+
+SNS_PUBLISH_TIERS = (
+    (1, 0.0),          # 每月前100万次发布免费
+    (None, 0.50)
+)
+
+# io2卷的预置IOPS按单个卷阶梯计价: (该档上限IOPS, $/IOPS/月)
+IO2_IOPS_TIERS = (
+    (32000, 0.065),
+    (64000, 0.0455),
+    (None, 0.032)
+)
+
+
+def tiered_cost(volume_gb, tiers):
+    """按阶梯价格计算总用量的费用"""
+    cost = 0.0
+    lower = 0
+    for upper, rate in tiers:
+        if volume_gb <= lower:
+            break
+        top = volume_gb if upper is None else min(volume_gb, upper)
+        cost += (top - lower) * rate
+        if upper is None:
+            break
+        lower = upper
+    return cost
+
+
+def allocate_tiered_costs(usages, price):
+    """usages: [(分组键, 用量GB)]，分组键通常为 (账号, 区域, 用量类型)
+    price(分组键, 总用量GB): 返回该分组总用量的费用
+
+    每个分组只计价一次，按用量比例分摊，返回与usages顺序一致的 (费用, 分组总用量) 列表
+    """
+    totals = defaultdict(float)
+    for key, volume in usages:
+        totals[key] += volume
+
+    group_costs = {key: price(key, total) for key, total in totals.items()}
+    return [
+        (group_costs[key] * volume / totals[key] if totals[key] > 0 else 0.0, totals[key])
+        for key, volume in usages
+    ]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+扫描任务Worker - 从任务队列领取扫描任务并在独立进程中执行
+
+示例:
+    python scan_worker.py --workers 2
+"""
+
+import argparse
+import multiprocessing
+import time
+
+from jobs.job_queue import JobQueue, get_worker_id
+from utils.logger import setup_logger, get_log_config
+
+
+def run_collect(collector, payload):
+    """执行一次收集并保存 (payload中force=true时忽略各收集器的刷新节奏)"""
+    collector.collect_and_save(force=bool(payload.get('force')))
+    return {'message': '数据收集完成'}
+
+
+def run_compact(collector, payload):
+    """按保留策略压缩过期的小时明细"""
+    from database.retention import RetentionManager
+    manager = RetentionManager(
+        collector.db_manager, payload.get('hourly_days'), payload.get('daily_days'), logger=collector.logger
+    )
+    return manager.compact()
+
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS = {
+    'collect': run_collect,
+    'compact': run_compact
+}
+
+
+# 领取任务失败 (例如数据库暂时被锁) 后的最长等待时间(秒)
+MAX_CLAIM_BACKOFF = 60
+
+# 检查超时running任务的间隔(秒)，worker崩溃或无法标记结果的任务超时后重新入队
+REQUEUE_CHECK_INTERVAL = 300
+
+
+def worker_loop(index, poll_interval=2, stale_minutes=120):
+    """单个worker进程的主循环"""
+    log_config = get_log_config()
+    logger = setup_logger(f'aws_cost_worker_{index}', log_config['path'], log_config['level'])
+
+    queue = JobQueue()
+    worker_id = get_worker_id(index)
+    collector = None
+    claim_failures = 0
+    last_requeue_check = time.monotonic()
+
+    logger.info(f"Worker {worker_id} 已启动")
+
+    while True:
+        if time.monotonic() - last_requeue_check >= REQUEUE_CHECK_INTERVAL:
+            last_requeue_check = time.monotonic()
+            try:
+                requeued = queue.requeue_stale(stale_minutes)
+                if requeued:
+                    logger.warning(f"重新入队 {requeued} 个超时任务")
+            except Exception as e:
+                logger.error(f"检查超时任务失败: {e}")
+
+        try:
+            job = queue.claim(worker_id, list(JOB_HANDLERS))
+            claim_failures = 0
+        except Exception as e:
+            # 队列的临时错误不退出worker，按指数退避后重试
+            claim_failures += 1
+            backoff = min(MAX_CLAIM_BACKOFF, poll_interval * 2 ** claim_failures)
+            logger.error(f"领取任务失败 (第{claim_failures}次，{backoff:.0f}秒后重试): {e}")
+            time.sleep(backoff)
+            continue
+        if not job:
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"开始执行任务 #{job['id']} ({job['job_type']})")
+        try:
+            # 收集器只在真正执行任务时才构建，且在进程内复用
+            if collector is None:
+                from cost_collector import CostCollectorV2
+                collector = CostCollectorV2()
+
+            result = JOB_HANDLERS[job['job_type']](collector, job.get('payload') or {})
+            queue.complete(job['id'], result)
+            logger.info(f"任务 #{job['id']} 完成")
+        except Exception as e:
+            logger.error(f"任务 #{job['id']} 失败: {e}")
+            try:
+                queue.fail(job['id'], e)
+            except Exception as mark_error:
+                # 无法标记的任务保持running，超过stale_minutes后由requeue_stale重新入队
+                logger.error(f"标记任务 #{job['id']} 失败时出错: {mark_error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AWS成本扫描任务Worker')
+    parser.add_argument('--workers', type=int, default=1, help='worker进程数')
+    parser.add_argument('--poll-interval', type=float, default=2, help='队列轮询间隔(秒)')
+    parser.add_argument('--stale-minutes', type=int, default=120, help='running任务超时重新入队(分钟)')
+    args = parser.parse_args()
+
+    requeued = JobQueue().requeue_stale(args.stale_minutes)
+    if requeued:
+        print(f"重新入队 {requeued} 个超时任务")
+
+    processes = []
+    for index in range(args.workers):
+        process = multiprocessing.Process(
+            target=worker_loop, args=(index, args.poll_interval, args.stale_minutes), daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    print(f"已启动 {len(processes)} 个扫描worker")
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
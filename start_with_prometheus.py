@@ -9,6 +9,8 @@ import threading
 import time
 import os
 
+from monitoring.instrumentation import reset_multiprocess_dir
+
 def start_collector():
     """启动成本数据收集器"""
     print("启动成本数据收集器...")
@@ -17,12 +19,24 @@ def start_collector():
     except Exception as e:
         print(f"数据收集器启动失败: {e}")
 
+def start_scan_worker():
+    """启动扫描任务worker (执行Web端提交的手动扫描)"""
+    print("启动扫描任务worker...")
+    try:
+        subprocess.run(['python', 'scan_worker.py'])
+    except Exception as e:
+        print(f"扫描worker启动失败: {e}")
+
 def start_web_app():
-    """启动Web界面"""
+    """启动Web界面 (WEB_SERVER=gunicorn 时使用生产服务器)"""
     print("启动Web界面...")
     time.sleep(2)
+    if os.getenv('WEB_SERVER', 'flask').lower() == 'gunicorn':
+        command = ['gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        command = ['python', 'app.py']
     try:
-        subprocess.run(['python', 'app.py'])
+        subprocess.run(command)
     except Exception as e:
         print(f"Web界面启动失败: {e}")
 
@@ -40,16 +54,23 @@ def main():
     
     os.makedirs('data', exist_ok=True)
     
+    # 所有子进程共享多进程指标目录，/metrics汇总收集器和worker的自监控指标
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.abspath('data/prometheus_multiproc'))
+    reset_multiprocess_dir()
+    
     # 启动各个组件
     collector_thread = threading.Thread(target=start_collector, daemon=True)
     prometheus_thread = threading.Thread(target=start_prometheus_exporter, daemon=True)
+    worker_thread = threading.Thread(target=start_scan_worker, daemon=True)
     
     collector_thread.start()
     prometheus_thread.start()
+    worker_thread.start()
     
     print("\n[Web] Web界面: http://localhost")
     print("[Prometheus] 指标端点: http://localhost:9090/metrics")
     print("[数据] 数据收集器每小时运行")
+    print("[任务] 手动扫描由独立worker进程执行")
     print("[指标] Prometheus指标每分钟更新")
     
     start_web_app()
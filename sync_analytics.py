@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析存储同步工具 - 把关系数据库中的历史快照回填到Parquet分析存储
+
+示例:
+    ANALYTICS_STORE=duckdb python sync_analytics.py --backfill
+    ANALYTICS_STORE=duckdb python sync_analytics.py --backfill --start 2024-01-01 --end 2024-07-01
+    ANALYTICS_STORE=duckdb python sync_analytics.py --compact
+"""
+
+import argparse
+import sys
+
+from database.db_manager import DatabaseManager
+from utils.db_config import get_db_config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='同步Parquet分析存储')
+    parser.add_argument('--backfill', action='store_true', help='从关系数据库回填历史快照')
+    parser.add_argument('--start', help='回填开始时间 (ISO格式, 包含)')
+    parser.add_argument('--end', help='回填结束时间 (ISO格式, 不包含)')
+    parser.add_argument('--compact', action='store_true', help='合并已结束月份的快照文件')
+    args = parser.parse_args()
+
+    db_manager = DatabaseManager(get_db_config())
+    if db_manager.analytics is None:
+        print("分析存储未启用: 设置 ANALYTICS_STORE=duckdb 并安装 duckdb、pyarrow")
+        sys.exit(1)
+
+    if args.backfill:
+        snapshots = db_manager.analytics.backfill(db_manager, args.start, args.end)
+        print(f"回填完成: {snapshots} 个快照")
+    if args.compact:
+        merged = db_manager.analytics.compact_partitions()
+        print(f"合并完成: {', '.join(merged) or '无需合并'}")
+    if not args.backfill and not args.compact:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聚合查询路由: 分析存储只在覆盖查询范围时使用
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('duckdb')
+pytest.importorskip('pyarrow')
+
+from database.analytics import AnalyticsStore
+from database.db_manager import DatabaseManager
+
+
+def _services(cost):
+    return [{'service': 'EC2', 'resource_id': 'i-1', 'region': 'us-east-1', 'instance_type': 't3.micro',
+             'hourly_cost': cost, 'daily_cost': cost * 24}]
+
+
+def test_history_before_enabling_is_not_lost(tmp_path, monkeypatch):
+    monkeypatch.delenv('ANALYTICS_STORE', raising=False)
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    old = datetime.now() - timedelta(days=60)
+    for hour in range(3):
+        db.save_cost_data(_services(1.0), (old + timedelta(hours=hour)).isoformat())
+
+    # 在已有数据的安装上启用分析存储，之后只镜像新的快照
+    db.analytics = AnalyticsStore(str(tmp_path / 'analytics'))
+    db.save_cost_data(_services(2.0), datetime.now().isoformat())
+
+    calls = []
+    original = db.analytics.top_resources
+    db.analytics.top_resources = lambda *args: calls.append(args) or original(*args)
+
+    top = db.get_top_resources(days=90)
+    assert top[0]['cost'] == pytest.approx(5.0) and top[0]['hours'] == 4
+    assert calls == []
+
+    # 回填后由DuckDB执行，结果相同
+    db.analytics.backfill(db)
+    db._coverage = None
+    top = db.get_top_resources(days=90)
+    assert len(calls) == 1
+    assert top[0]['cost'] == pytest.approx(5.0) and top[0]['hours'] == 4
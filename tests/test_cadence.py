@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ScanCadence: 刷新间隔、结果有效期和跨进程共享
+"""
+
+import random
+from datetime import datetime, timedelta
+
+from collectors.cadence import ScanCadence
+
+
+NOW = datetime(2026, 3, 10, 12, 0)
+
+
+class FakeCollector:
+    def __init__(self, name, refresh_hours=1, freshness_hours=3):
+        self.collector_name = name
+        self.refresh_hours = refresh_hours
+        self.freshness_hours = freshness_hours
+
+
+def _cadence(path=':memory:', jitter=0.0, refresh=None):
+    config = {'snapshot_hours': 1, 'refresh_hours': refresh or {}, 'jitter': jitter, 'path': path}
+    return ScanCadence(config, rng=random.Random(1), account_id='111111111111')
+
+
+def test_slow_collector_reuses_results_until_due():
+    cadence = _cadence()
+    s3 = FakeCollector('S3', refresh_hours=24, freshness_hours=48)
+    assert cadence.is_due(s3, NOW)
+
+    cadence.store(s3, [{'resource_id': 'bucket'}], NOW)
+    assert not cadence.is_due(s3, NOW + timedelta(hours=1))
+    assert cadence.cached(s3, NOW + timedelta(hours=1)) == [{'resource_id': 'bucket'}]
+    # 允许调度误差: 提前几分钟的快照也视为到期
+    assert cadence.is_due(s3, NOW + timedelta(hours=24) - timedelta(minutes=3))
+
+
+def test_results_expire_after_freshness():
+    cadence = _cadence()
+    ec2 = FakeCollector('EC2')
+    cadence.store(ec2, [{'resource_id': 'i-1'}], NOW)
+    assert cadence.cached(ec2, NOW + timedelta(hours=3)) is not None
+    assert cadence.cached(ec2, NOW + timedelta(hours=3, minutes=1)) is None
+
+
+def test_refresh_override_and_jitter_bounds():
+    traffic = FakeCollector('Traffic', refresh_hours=6, freshness_hours=24)
+    assert _cadence(refresh={'Traffic': 12}).refresh_hours(traffic) == 12
+
+    for seed in range(20):
+        cadence = _cadence(jitter=0.1)
+        cadence.rng = random.Random(seed)
+        cadence.store(traffic, [], NOW)
+        next_due = cadence.status()['Traffic']['next_due']
+        hours = (datetime.fromisoformat(next_due) - NOW).total_seconds() / 3600
+        assert 5.4 <= hours <= 6.6
+
+
+def test_state_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'cadence.db')
+    scheduler = _cadence(path)
+    worker = _cadence(path)
+    s3 = FakeCollector('S3', refresh_hours=24, freshness_hours=48)
+
+    scheduler.store(s3, [{'resource_id': 'bucket', 'daily_cost': 1.5}], NOW)
+    assert not worker.is_due(s3, NOW + timedelta(hours=2))
+    assert worker.cached(s3, NOW + timedelta(hours=2)) == [{'resource_id': 'bucket', 'daily_cost': 1.5}]
+
+    # 重启后的新实例同样沿用结果
+    assert not _cadence(path).is_due(s3, NOW + timedelta(hours=2))
+
+    worker.store(s3, [{'resource_id': 'bucket', 'daily_cost': 2.0}], NOW + timedelta(hours=25))
+    assert scheduler.cached(s3, NOW + timedelta(hours=26)) == [{'resource_id': 'bucket', 'daily_cost': 2.0}]
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+事件驱动的资源清单更新: 文件事件来源 + SQLite最新快照
+"""
+
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from collectors.events import EventInventoryUpdater, FileEventFeed
+from database.db_manager import DatabaseManager
+
+ACCOUNT = '111111111111'
+
+
+class FakeEC2:
+    """按实例类型固定价格计算成本的EC2收集器"""
+
+    collector_name = 'EC2'
+
+    def build_service(self, instance, region):
+        return {'service': 'EC2', 'resource_id': instance['InstanceId'], 'region': region,
+                'instance_type': instance['InstanceType'], 'hourly_cost': 0.5, 'daily_cost': 12.0}
+
+
+def _scanned(instance_id):
+    service = FakeEC2().build_service({'InstanceId': instance_id, 'InstanceType': 't3.micro'}, 'us-east-1')
+    service['account_id'] = ACCOUNT
+    return service
+
+
+def _event_time(local_time):
+    return local_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _run_instances(instance_id, when, account=ACCOUNT):
+    return {'eventName': 'RunInstances', 'awsRegion': 'us-east-1', 'eventTime': _event_time(when),
+            'recipientAccountId': account,
+            'responseElements': {'instancesSet': {'items': [{'instanceId': instance_id, 'instanceType': 't3.micro'}]}}}
+
+
+def _terminate_instances(instance_id, when):
+    return {'eventName': 'TerminateInstances', 'awsRegion': 'us-east-1', 'eventTime': _event_time(when),
+            'recipientAccountId': ACCOUNT,
+            'requestParameters': {'instancesSet': {'items': [{'instanceId': instance_id}]}}}
+
+
+def _append(path, *events):
+    with open(path, 'a', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+
+def _resource_ids(db):
+    return sorted(record['resource_id'] for record in db.get_latest_records())
+
+
+@pytest.fixture
+def setup(tmp_path):
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    snapshot_time = datetime.now().replace(microsecond=0) - timedelta(minutes=30)
+    db.save_cost_data([_scanned('i-old')], snapshot_time.isoformat())
+    path = str(tmp_path / 'events.jsonl')
+    updater = EventInventoryUpdater(FileEventFeed(path), db,
+                                    lambda account: (account, [FakeEC2()]) if account == ACCOUNT else None)
+    return db, path, updater, snapshot_time
+
+
+def test_launch_and_terminate_update_latest_snapshot(setup):
+    db, path, updater, snapshot_time = setup
+    _append(path, _run_instances('i-new', snapshot_time + timedelta(minutes=5)))
+    assert updater.process() == {'events': 1, 'applied': 1, 'added': 1, 'removed': 0}
+    assert _resource_ids(db) == ['i-new', 'i-old']
+    assert db.get_latest_summary()['total_daily_cost'] == 24.0
+
+    _append(path, _terminate_instances('i-old', snapshot_time + timedelta(minutes=10)))
+    assert updater.process() == {'events': 1, 'applied': 1, 'added': 0, 'removed': 1}
+    assert _resource_ids(db) == ['i-new']
+
+
+def test_stale_and_unknown_account_events_are_skipped(setup):
+    db, path, updater, snapshot_time = setup
+    _append(path,
+            _terminate_instances('i-old', snapshot_time - timedelta(minutes=5)),
+            _run_instances('i-other', snapshot_time + timedelta(minutes=5), account='999999999999'))
+    assert updater.process() == {'events': 2, 'stale': 1, 'unknown_account': 1}
+    assert _resource_ids(db) == ['i-old']
+
+
+def test_offset_is_acked_only_after_success(setup, monkeypatch):
+    db, path, updater, snapshot_time = setup
+    _append(path, _run_instances('i-new', snapshot_time + timedelta(minutes=5)))
+
+    def fail(*args):
+        raise RuntimeError('database is locked')
+    monkeypatch.setattr(db, 'apply_inventory_changes', fail)
+    with pytest.raises(RuntimeError):
+        updater.process()
+    assert not os.path.exists(updater.feed.offset_path)
+
+    # 失败的批次没有确认，下次重新读取
+    monkeypatch.undo()
+    assert updater.process()['added'] == 1
+    assert _resource_ids(db) == ['i-new', 'i-old']
+    with open(path, encoding='utf-8') as f:
+        size = len(f.read().encode('utf-8'))
+    with open(updater.feed.offset_path, encoding='utf-8') as f:
+        assert int(f.read()) == size
+    assert updater.process() == {'events': 0}
+
+
+def test_events_wait_while_scan_is_running(setup):
+    db, path, updater, snapshot_time = setup
+    scan_started_at = datetime.now().replace(microsecond=0) - timedelta(minutes=1)
+    db.set_scan_in_progress(scan_started_at.isoformat())
+    _append(path, _run_instances('i-new', scan_started_at + timedelta(seconds=30)))
+    assert updater.process() == {'events': 0, 'deferred': 1}
+
+    # 扫描结果保存后，扫描期间的事件仍晚于新快照的时间 (扫描开始时间)，不会被当作过期
+    assert db.get_latest_summary()['scan_started_at'] == scan_started_at.isoformat()
+    db.save_cost_data([_scanned('i-old')], scan_started_at.isoformat())
+    assert updater.process()['added'] == 1
+    assert _resource_ids(db) == ['i-new', 'i-old']
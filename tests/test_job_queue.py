@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JobQueue: 领取任务的并发与锁冲突
+"""
+
+import sqlite3
+
+import pytest
+
+from jobs.job_queue import JobQueue
+
+
+class NoWaitQueue(JobQueue):
+    """数据库被锁时立即失败，不等待busy_timeout"""
+
+    def get_connection(self):
+        conn = super().get_connection()
+        conn.execute('PRAGMA busy_timeout=0')
+        return conn
+
+
+def test_claim_takes_oldest_pending_job_once(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    first = queue.enqueue('collect')
+    queue.enqueue('compact')
+
+    job = queue.claim('worker-1', ['collect', 'compact'])
+    assert job['id'] == first and job['status'] == 'running'
+    assert queue.claim('worker-2', ['collect']) is None
+
+
+def test_claim_reports_lock_error(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = NoWaitQueue(path)
+    queue.enqueue('collect')
+
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            queue.claim('worker-1', ['collect'])
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+
+    assert queue.claim('worker-1', ['collect']) is not None
+
+
+def test_enqueue_reports_lock_error(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = NoWaitQueue(path)
+
+    holder = sqlite3.connect(path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            queue.enqueue('collect')
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+
+    assert queue.enqueue('collect') is not None
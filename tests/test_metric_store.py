@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MetricStore窗口合计的增量维护
+"""
+
+from datetime import datetime, timedelta, timezone
+
+from collectors.metric_store import MetricStore
+
+
+NOW = datetime(2026, 3, 10, 12, 0, tzinfo=timezone.utc)
+DIMENSIONS = [{'Name': 'NatGatewayId', 'Value': 'nat-1'}]
+
+
+class FakeCloudWatch:
+    """每天一个数据点，值为日期的日 (day of month)；before_return在返回前调用 (模拟并发更新)"""
+
+    def __init__(self, before_return=None):
+        self.before_return = before_return
+
+    def get_metric_statistics(self, StartTime, EndTime, **kwargs):
+        points = []
+        day = StartTime
+        while day <= EndTime:
+            points.append({'Timestamp': day, 'Sum': float(day.day)})
+            day += timedelta(days=1)
+        if self.before_return:
+            callback, self.before_return = self.before_return, None
+            callback()
+        return {'Datapoints': points}
+
+
+def _expected(now):
+    return sum(float((now - timedelta(days=n)).day) for n in range(30))
+
+
+def test_concurrent_updates_do_not_drift(tmp_path):
+    path = str(tmp_path / 'metrics.db')
+    scheduler = MetricStore(path)
+    worker = MetricStore(path)
+    scheduler.window_sum(FakeCloudWatch(), 'acct', 'us-east-1', 'AWS/NATGateway', 'BytesOut', DIMENSIONS, now=NOW)
+
+    # 调度器拉取期间，worker完成了同一序列的更新
+    later = NOW + timedelta(days=2)
+    other = lambda: worker.window_sum(FakeCloudWatch(), 'acct', 'us-east-1', 'AWS/NATGateway', 'BytesOut',
+                                      DIMENSIONS, now=later)
+    total = scheduler.window_sum(FakeCloudWatch(other), 'acct', 'us-east-1', 'AWS/NATGateway', 'BytesOut',
+                                 DIMENSIONS, now=later)
+    assert total == _expected(later)
+
+    again = worker.window_sum(FakeCloudWatch(), 'acct', 'us-east-1', 'AWS/NATGateway', 'BytesOut',
+                              DIMENSIONS, now=later)
+    assert again == _expected(later)
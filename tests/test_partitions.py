@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SQLite按月分区: cost_records视图只在月表变化时重建
+"""
+
+from database.db_manager import DatabaseManager, partition_table_name
+
+
+def _traced(db, statements):
+    """记录DatabaseManager执行的SQL"""
+    get_connection = db.get_connection
+
+    def connect():
+        conn = get_connection()
+        conn.set_trace_callback(statements.append)
+        return conn
+    db.get_connection = connect
+
+
+def _view_tables(db):
+    conn = db.get_connection()
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view' AND name = 'cost_records'").fetchone()[0]
+    conn.close()
+    return [part.rsplit(' FROM ', 1)[1] for part in sql.split(' UNION ALL ')]
+
+
+def test_view_is_not_rebuilt_on_every_init(tmp_path):
+    config = {'type': 'sqlite', 'path': str(tmp_path / 'cost.db')}
+    DatabaseManager(config)
+
+    statements = []
+    db = DatabaseManager.__new__(DatabaseManager)
+    _traced(db, statements)
+    DatabaseManager.__init__(db, config)
+    assert not [sql for sql in statements if sql.startswith(('DROP VIEW', 'CREATE VIEW', 'BEGIN'))]
+
+
+def test_view_follows_partition_changes(tmp_path):
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    services = [{'service': 'EC2', 'resource_id': 'i-1', 'region': 'us-east-1', 'instance_type': 't3.micro',
+                 'hourly_cost': 1.0, 'daily_cost': 24.0}]
+    db.save_cost_data(services, '2020-01-15T00:00:00')
+    assert partition_table_name('2020-01') in _view_tables(db)
+
+    statements = []
+    _traced(db, statements)
+    partition = next(p for p in db.list_cost_partitions() if p['name'] == partition_table_name('2020-01'))
+    db.drop_cost_partition(partition)
+    assert partition_table_name('2020-01') not in _view_tables(db)
+    # 删除月表和重建视图在同一个事务中
+    begin = statements.index('BEGIN IMMEDIATE')
+    assert [sql.split()[0] for sql in statements[begin + 1:] if sql.split()[0] in ('DROP', 'CREATE', 'COMMIT')] == [
+        'DROP', 'DROP', 'CREATE', 'COMMIT'
+    ]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RegionPlanner: 区域发现、空区域跳过和全量扫描
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from collectors.base_collector import BaseCollector
+from collectors.regions import RegionPlanner
+
+
+NOW = datetime(2026, 3, 10, 12, 0)
+CONFIG = {'regions': None, 'discovery_hours': 24, 'empty_rescan_hours': 6, 'full_sweep_hours': 24}
+
+
+class FakeEC2:
+    def __init__(self, regions):
+        self.regions = regions
+        self.calls = 0
+
+    def describe_regions(self):
+        self.calls += 1
+        if self.regions is None:
+            raise RuntimeError('AccessDenied')
+        return {'Regions': [{'RegionName': name} for name in self.regions]}
+
+
+class FakeSession:
+    region_name = 'us-east-1'
+
+    def __init__(self, regions):
+        self.ec2 = FakeEC2(regions)
+
+    def client(self, service, region_name=None):
+        return self.ec2
+
+
+def test_discovery_is_cached_and_picks_up_new_regions():
+    session = FakeSession(['us-west-2', 'us-east-1'])
+    planner = RegionPlanner(session, config=CONFIG, logger=None)
+    assert planner.start_scan(NOW) == ['us-east-1', 'us-west-2']
+    planner.start_scan(NOW + timedelta(hours=1))
+    assert session.ec2.calls == 1
+
+    session.ec2.regions = ['us-east-1', 'us-west-2', 'ap-east-1']
+    assert planner.start_scan(NOW + timedelta(hours=24)) == ['ap-east-1', 'us-east-1', 'us-west-2']
+
+
+def test_discovery_failure_keeps_previous_regions():
+    session = FakeSession(['us-east-1'])
+    planner = RegionPlanner(session, config=CONFIG)
+    planner.start_scan(NOW)
+    session.ec2.regions = None
+    assert planner.start_scan(NOW + timedelta(hours=25)) == ['us-east-1']
+
+
+def test_fixed_regions_skip_discovery():
+    session = FakeSession(['us-east-1'])
+    planner = RegionPlanner(session, regions=['eu-west-1'], config=CONFIG)
+    assert planner.start_scan(NOW) == ['eu-west-1']
+    assert session.ec2.calls == 0
+
+
+def test_empty_regions_are_rescanned_periodically_and_on_full_sweep():
+    planner = RegionPlanner(FakeSession(['us-east-1', 'us-west-2']), config=CONFIG)
+    regions = planner.start_scan(NOW)
+    assert planner.full_sweep
+    assert planner.filter_regions('RDS', regions) == regions
+    planner.record('RDS', 'us-east-1', 3)
+    planner.record('RDS', 'us-west-2', 0)
+
+    # 最近为空的区域被跳过，其他收集器不受影响
+    regions = planner.start_scan(NOW + timedelta(hours=1))
+    assert not planner.full_sweep
+    assert planner.filter_regions('RDS', regions) == ['us-east-1']
+    assert planner.filter_regions('EC2', regions) == regions
+    assert planner.skipped == 1
+    assert planner.empty_regions() == {'RDS/us-west-2': NOW.isoformat()}
+
+    # 超过EMPTY_REGION_RESCAN_HOURS后重新扫描一次
+    regions = planner.start_scan(NOW + timedelta(hours=6))
+    assert planner.filter_regions('RDS', regions) == regions
+    planner.record('RDS', 'us-west-2', 0)
+    regions = planner.start_scan(NOW + timedelta(hours=7))
+    assert planner.filter_regions('RDS', regions) == ['us-east-1']
+
+    # 全量扫描不跳过任何区域；出现资源后不再视为空区域
+    regions = planner.start_scan(NOW + timedelta(hours=24))
+    assert planner.full_sweep
+    assert planner.filter_regions('RDS', regions) == regions
+    planner.record('RDS', 'us-west-2', 1)
+    assert planner.empty_regions() == {}
+
+
+class FlakyCollector(BaseCollector):
+    """按区域返回固定资源数；throttled中的区域模拟被限流 (捕获错误并返回空结果)"""
+
+    def __init__(self, session, counts):
+        super().__init__(session)
+        self.counts = counts
+        self.throttled = set()
+
+    def scan_region(self, region):
+        if region in self.throttled:
+            self.mark_region_failed(region)
+            return []
+        return [{'resource_id': f'{region}-{i}'} for i in range(self.counts.get(region, 0))]
+
+    def scan_all_regions(self):
+        return [service for region in self.regions_to_scan() for service in self.timed_scan_region(region)]
+
+
+def test_failed_scans_do_not_mark_regions_empty():
+    session = FakeSession(['us-east-1', 'us-west-2'])
+    planner = RegionPlanner(session, config=CONFIG)
+    collector = FlakyCollector(session, {'us-east-1': 2})
+    collector.region_planner = planner
+    collector.regions = planner.start_scan(NOW)
+
+    # 被限流的区域不记录为空，下次扫描时照常扫描
+    collector.throttled = {'us-west-2'}
+    assert len(collector.scan_all_regions()) == 2
+    assert collector.failed_regions == {'us-west-2'}
+    assert planner.empty_regions() == {}
+
+    # 成功扫描后确实为空才跳过；之后的失败不改变已记录的状态
+    collector.throttled = set()
+    collector.regions = planner.start_scan(NOW + timedelta(hours=1))
+    assert collector.regions_to_scan() == ['us-east-1', 'us-west-2']
+    collector.scan_all_regions()
+    assert collector.failed_regions == set()
+    assert planner.empty_regions() == {'Flaky/us-west-2': (NOW + timedelta(hours=1)).isoformat()}
+    planner.record('Flaky', 'us-west-2', 0, succeeded=False)
+    assert planner.empty_regions() == {'Flaky/us-west-2': (NOW + timedelta(hours=1)).isoformat()}
+
+
+def test_scan_region_exceptions_mark_region_failed():
+    session = FakeSession(['us-east-1'])
+    planner = RegionPlanner(session, config=CONFIG)
+    collector = FlakyCollector(session, {})
+    collector.region_planner = planner
+    planner.start_scan(NOW)
+
+    def scan_region(region):
+        raise RuntimeError('AccessDenied')
+
+    collector.scan_region = scan_region
+    with pytest.raises(RuntimeError):
+        collector.timed_scan_region('us-east-1')
+    assert collector.failed_regions == {'us-east-1'}
+    assert planner.empty_regions() == {}
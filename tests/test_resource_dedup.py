@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+resources维度表去重: 用量变化不产生新的资源行
+"""
+
+import json
+
+from database.db_manager import DatabaseManager, resource_attributes
+
+
+def _lambda(invocations):
+    return {
+        'service': 'Lambda',
+        'resource_id': 'fn',
+        'region': 'us-east-1',
+        'instance_type': f"128MB x86_64 ({invocations}次/24h)",
+        'resource_type': '128MB x86_64',
+        'memory_mb': 128,
+        'hourly_cost': invocations / 1e6,
+        'daily_cost': invocations * 24 / 1e6,
+        'invocations': invocations
+    }
+
+
+def _traffic(volume_gb, last_updated):
+    return {
+        'service': 'NAT Gateway',
+        'resource_id': 'nat-1',
+        'region': 'us-east-1',
+        'instance_type': 'NAT Gateway',
+        'hourly_cost': volume_gb * 0.045 / 24,
+        'daily_cost': volume_gb * 0.045,
+        'details': {'traffic_type': 'Data Processing', 'vpc_id': 'vpc-1', 'volume_gb': volume_gb},
+        'last_updated': last_updated
+    }
+
+
+def _s3(size_gb):
+    return {
+        'service': 'S3',
+        'resource_id': 'bucket',
+        'region': 'us-east-1',
+        'instance_type': f"{size_gb:.2f}GB",
+        'resource_type': 'Bucket',
+        'hourly_cost': size_gb * 0.023 / 720,
+        'daily_cost': size_gb * 0.023 / 30,
+        'storage_classes': {'Standard': size_gb}
+    }
+
+
+def test_usage_fields_do_not_change_hash():
+    _, first_hash, first_details = resource_attributes(_traffic(10, '2026-01-01T00:00:00'))
+    _, second_hash, second_details = resource_attributes(_traffic(25, '2026-01-01T01:00:00'))
+    assert first_hash == second_hash
+    assert json.loads(second_details)['details'] == {'volume_gb': 25}
+
+
+def test_config_change_creates_new_resource():
+    changed = dict(_lambda(5), resource_type='256MB x86_64', memory_mb=256)
+    assert resource_attributes(_lambda(5))[1] != resource_attributes(changed)[1]
+
+
+def test_two_scans_share_resource_rows(tmp_path):
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    db.save_cost_data([_lambda(100), _traffic(10, '2026-01-01T00:00:00'), _s3(5.5)], '2026-01-01T00:00:00')
+    db.save_cost_data([_lambda(900), _traffic(42, '2026-01-01T01:00:00'), _s3(7.25)], '2026-01-01T01:00:00')
+
+    conn = db.get_connection()
+    rows = conn.execute('SELECT service, resource_id FROM resources ORDER BY service').fetchall()
+    conn.close()
+    assert rows == [('Lambda', 'fn'), ('NAT Gateway', 'nat-1'), ('S3', 'bucket')]
+
+    # 每次扫描的用量随成本记录保存，读取时与静态属性合并
+    first = {r['resource_id']: r for r in db.get_snapshot_records('2026-01-01T00:00:00')}
+    latest = {r['resource_id']: r for r in db.get_latest_records()}
+    assert json.loads(first['nat-1']['details'])['details']['volume_gb'] == 10
+    assert json.loads(latest['nat-1']['details'])['details'] == {
+        'traffic_type': 'Data Processing', 'vpc_id': 'vpc-1', 'volume_gb': 42
+    }
+    assert first['bucket']['instance_type'] == '5.50GB'
+    assert latest['bucket']['instance_type'] == '7.25GB'
+    assert json.loads(latest['bucket']['details'])['storage_classes'] == {'Standard': 7.25}
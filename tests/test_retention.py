@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+保留策略: 压缩后的每日汇总按账号区分资源
+"""
+
+from datetime import datetime, timedelta
+
+from database.db_manager import DatabaseManager
+from database.retention import RetentionManager
+
+
+def _ec2(account_id, hourly_cost):
+    return {'service': 'EC2', 'resource_id': 'i-shared', 'region': 'us-east-1', 'instance_type': 't3.micro',
+            'hourly_cost': hourly_cost, 'daily_cost': hourly_cost * 24, 'account_id': account_id}
+
+
+def test_compaction_keeps_accounts_apart(tmp_path):
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    old = (datetime.now() - timedelta(days=100)).replace(hour=0, minute=0, second=0, microsecond=0)
+    for hour in range(3):
+        db.save_cost_data([_ec2('111111111111', 1.0), _ec2('222222222222', 3.0)],
+                          (old + timedelta(hours=hour)).isoformat())
+
+    stats = RetentionManager(db, hourly_days=30, daily_days=0, logger=None).compact()
+    assert stats['rollup_rows'] == 2
+
+    conn = db.get_connection()
+    rows = conn.execute('''
+        SELECT account_id, hourly_cost, samples FROM cost_records_daily ORDER BY account_id
+    ''').fetchall()
+    conn.close()
+    assert rows == [('111111111111', 1.0, 3), ('222222222222', 3.0, 3)]
+
+    top = db.get_top_resources(days=365)
+    assert [(r['account_id'], r['cost'], r['hours']) for r in top] == [
+        ('222222222222', 9.0, 3), ('111111111111', 3.0, 3)
+    ]
+
+    # 从压缩后的历史重建的汇总与压缩前一致: 每个快照两台实例合计 $4/小时
+    db.rebuild_cost_rollups()
+    history = db.get_cost_history(hours=24 * 365, resolution='day')
+    assert [point['total_hourly_cost'] for point in history] == [4.0]
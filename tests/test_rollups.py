@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成本历史汇总表: 自动回填和从历史重建
+"""
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from database.db_manager import DatabaseManager, ROLLUP_RESOLUTIONS
+
+
+def _ec2(resource_id, hourly_cost):
+    return {
+        'service': 'EC2',
+        'resource_id': resource_id,
+        'region': 'us-east-1',
+        'instance_type': 't3.micro',
+        'hourly_cost': hourly_cost,
+        'daily_cost': hourly_cost * 24
+    }
+
+
+def test_empty_rollups_are_backfilled_on_startup(tmp_path):
+    config = {'type': 'sqlite', 'path': str(tmp_path / 'cost.db')}
+    db = DatabaseManager(config)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    db.save_cost_data([_ec2('i-1', 0.5)], (now - timedelta(hours=2)).isoformat())
+    db.save_cost_data([_ec2('i-1', 0.5), _ec2('i-2', 1.0)], (now - timedelta(hours=1)).isoformat())
+    expected = db.get_cost_history(hours=24)
+
+    # 模拟升级前的数据库: 有历史但汇总表为空
+    conn = db.get_connection()
+    for resolution in ROLLUP_RESOLUTIONS:
+        conn.execute(f'DELETE FROM cost_rollup_{resolution}')
+    conn.commit()
+    conn.close()
+    assert db.get_cost_history(hours=24) == []
+
+    assert DatabaseManager(config).get_cost_history(hours=24) == expected
+    assert [point['total_hourly_cost'] for point in expected] == [0.5, 1.5]
+
+
+def test_rebuild_accepts_decimal_costs(tmp_path, monkeypatch):
+    db = DatabaseManager({'type': 'sqlite', 'path': str(tmp_path / 'cost.db')})
+    timestamp = datetime.now().replace(minute=0, second=0, microsecond=0).isoformat()
+    # PostgreSQL/MySQL的DECIMAL列读出为Decimal
+    batches = [[(timestamp, 'EC2', 'i-1', 'us-east-1', Decimal('0.1250'), Decimal('3.0000'), None, '')]]
+    monkeypatch.setattr(db, 'iter_cost_records', lambda: iter(batches))
+
+    assert db.rebuild_cost_rollups() == 1
+    assert db.get_cost_history(hours=24) == [
+        {'timestamp': timestamp[:13] + ':00:00', 'total_hourly_cost': 0.125, 'total_daily_cost': 3.0}
+    ]
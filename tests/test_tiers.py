@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+阶梯计价与按账号分摊
+"""
+
+import pytest
+
+from pricing.price_manager import PriceManager
+from pricing.tiers import (CLOUDFRONT_TIERS, DATA_TRANSFER_OUT_TIERS, IO2_IOPS_TIERS, SQS_STANDARD_TIERS,
+                           allocate_tiered_costs, tiered_cost)
+
+
+def legacy_data_transfer_price(volume_gb):
+    """阶梯表之前手写的 get_data_transfer_price"""
+    if volume_gb <= 1:
+        return 0
+    elif volume_gb <= 10240:
+        return (volume_gb - 1) * 0.09
+    elif volume_gb <= 51200:
+        return 10239 * 0.09 + (volume_gb - 10240) * 0.070
+    else:
+        return 10239 * 0.09 + 40960 * 0.070 + (volume_gb - 51200) * 0.050
+
+
+def legacy_cloudfront_price(volume_gb):
+    """阶梯表之前手写的 get_cloudfront_price"""
+    if volume_gb <= 10240:
+        return volume_gb * 0.085
+    elif volume_gb <= 51200:
+        return 10240 * 0.085 + (volume_gb - 10240) * 0.070
+    else:
+        return 10240 * 0.085 + 40960 * 0.070 + (volume_gb - 51200) * 0.060
+
+
+BOUNDARIES = [0, 0.5, 1, 1.5, 100, 10239, 10240, 10241, 30000, 51199, 51200, 51201, 200000]
+
+
+@pytest.mark.parametrize('volume_gb', BOUNDARIES)
+def test_data_transfer_tiers_match_legacy_prices(volume_gb):
+    assert tiered_cost(volume_gb, DATA_TRANSFER_OUT_TIERS) == pytest.approx(legacy_data_transfer_price(volume_gb))
+
+
+@pytest.mark.parametrize('volume_gb', BOUNDARIES)
+def test_cloudfront_tiers_match_legacy_prices(volume_gb):
+    assert tiered_cost(volume_gb, CLOUDFRONT_TIERS) == pytest.approx(legacy_cloudfront_price(volume_gb))
+
+
+def test_price_manager_uses_tiers():
+    manager = PriceManager.__new__(PriceManager)
+    assert manager.get_data_transfer_price(10240) == pytest.approx(10239 * 0.09)
+    assert manager.get_cloudfront_price(51200) == pytest.approx(10240 * 0.085 + 40960 * 0.070)
+
+
+def test_request_and_iops_tiers():
+    assert tiered_cost(1, SQS_STANDARD_TIERS) == 0
+    assert tiered_cost(1.5, SQS_STANDARD_TIERS) == pytest.approx(0.20)
+    assert tiered_cost(40000, IO2_IOPS_TIERS) == pytest.approx(32000 * 0.065 + 8000 * 0.0455)
+
+
+def test_allocated_costs_sum_to_group_price():
+    usages = [
+        (('111', 'us-east-1', 'DTO'), 6144),
+        (('111', 'us-east-1', 'DTO'), 6144),
+        (('111', 'us-east-1', 'DTO'), 0.5),
+        (('111', 'eu-west-1', 'DTO'), 60000),
+        (('222', 'us-east-1', 'DTO'), 0)
+    ]
+    price = lambda key, volume: tiered_cost(volume, DATA_TRANSFER_OUT_TIERS)
+    allocations = allocate_tiered_costs(usages, price)
+
+    groups = {}
+    for (key, _), (cost, total) in zip(usages, allocations):
+        groups.setdefault(key, []).append(cost)
+        assert total == sum(volume for k, volume in usages if k == key)
+    for key, costs in groups.items():
+        total = sum(volume for k, volume in usages if k == key)
+        assert sum(costs) == pytest.approx(price(key, total))
+
+    # 同一账号两台各6TB: 共12TB，超出10TB的部分按第二档计价后平分
+    assert allocations[0][0] == pytest.approx(allocations[1][0])
+    assert allocations[0][0] < legacy_data_transfer_price(6144)
+    assert allocations[4] == (0.0, 0)
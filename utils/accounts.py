@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多账号注册表 - 通过STS AssumeRole扫描组织内的多个AWS账号
+
+账号列表来自 AWS_ACCOUNTS_FILE 指向的JSON文件:
+[
+    {"account_id": "111111111111", "name": "prod",
+     "role_arn": "arn:aws:iam::111111111111:role/CostMonitorReadOnly",
+     "external_id": "可选", "max_concurrency": 4, "regions": ["us-east-1"]},
+    {"account_id": "222222222222", "name": "staging", "role_arn": "..."}
+]
+未配置时只扫描当前凭证所在的账号。
+每个账号的Session在进程内缓存，临时凭证在过期前由botocore自动刷新。
+"""
+
+import json
+import os
+import threading
+
+import boto3
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session
+
+
+def get_accounts_config():
+    """多账号扫描配置"""
+    return {
+        'file': os.getenv('AWS_ACCOUNTS_FILE', ''),
+        # 同时扫描的账号数
+        'parallel_accounts': int(os.getenv('ACCOUNT_SCAN_PARALLELISM', 4)),
+        # 每个账号同时运行的收集器数 (账号可单独配置max_concurrency)
+        'max_concurrency': int(os.getenv('ACCOUNT_MAX_CONCURRENCY', 10)),
+        'session_duration': int(os.getenv('ASSUME_ROLE_DURATION', 3600)),
+        'session_name': os.getenv('ASSUME_ROLE_SESSION_NAME', 'aws-cost-monitor')
+    }
+
+
+def load_accounts(path):
+    """读取账号列表文件"""
+    with open(path, encoding='utf-8') as f:
+        accounts = json.load(f)
+    if not isinstance(accounts, list):
+        raise ValueError(f"账号文件格式错误 (应为列表): {path}")
+
+    for account in accounts:
+        if not account.get('account_id'):
+            raise ValueError(f"账号缺少account_id: {account}")
+        account['account_id'] = str(account['account_id'])
+        account.setdefault('name', account['account_id'])
+    return accounts
+
+
+class AccountRegistry:
+    def __init__(self, base_session, accounts=None, session_hook=None, config=None):
+        """base_session: 用于AssumeRole的Session；session_hook: 对每个账号Session的额外处理 (监控、追踪)"""
+        self.config = config or get_accounts_config()
+        self.base_session = base_session
+        self.session_hook = session_hook
+        if accounts is None and self.config['file']:
+            accounts = load_accounts(self.config['file'])
+        self._configured = accounts
+        self._accounts = None
+        self._sessions = {}
+        self._sts = None
+        self._lock = threading.Lock()
+
+    @property
+    def parallel_accounts(self):
+        return max(1, self.config['parallel_accounts'])
+
+    @property
+    def accounts(self):
+        """要扫描的账号列表；未配置时为当前凭证所在的账号"""
+        if self._accounts is None:
+            if self._configured:
+                self._accounts = self._configured
+            else:
+                self._accounts = [{'account_id': self._current_account_id(), 'name': 'default'}]
+        return self._accounts
+
+    def max_concurrency(self, account):
+        return max(1, int(account.get('max_concurrency') or self.config['max_concurrency']))
+
+    def _sts_client(self):
+        with self._lock:
+            if self._sts is None:
+                self._sts = self.base_session.client('sts')
+            return self._sts
+
+    def _current_account_id(self):
+        account_id = os.getenv('AWS_ACCOUNT_ID')
+        if account_id:
+            return account_id
+        try:
+            return self._sts_client().get_caller_identity()['Account']
+        except Exception as e:
+            print(f"获取当前账号ID失败: {e}")
+            return ''
+
+    def get_session(self, account):
+        """账号对应的Session (缓存)；没有role_arn的账号直接使用基础Session"""
+        account_id = account['account_id']
+        with self._lock:
+            session = self._sessions.get(account_id)
+        if session is not None:
+            return session
+
+        if account.get('role_arn'):
+            session = self._assume_role_session(account)
+            if self.session_hook:
+                session = self.session_hook(session)
+        else:
+            session = self.base_session
+
+        with self._lock:
+            return self._sessions.setdefault(account_id, session)
+
+    def _assume_role_session(self, account):
+        """创建使用可自动刷新的临时凭证的Session"""
+        credentials = RefreshableCredentials.create_from_metadata(
+            metadata=self._assume_role(account),
+            refresh_using=lambda: self._assume_role(account),
+            method='sts-assume-role'
+        )
+        botocore_session = get_session()
+        botocore_session._credentials = credentials
+        region = self.base_session.region_name
+        if region:
+            botocore_session.set_config_variable('region', region)
+        return boto3.Session(botocore_session=botocore_session)
+
+    def _assume_role(self, account):
+        params = {
+            'RoleArn': account['role_arn'],
+            'RoleSessionName': self.config['session_name'],
+            'DurationSeconds': self.config['session_duration']
+        }
+        if account.get('external_id'):
+            params['ExternalId'] = account['external_id']
+
+        credentials = self._sts_client().assume_role(**params)['Credentials']
+        return {
+            'access_key': credentials['AccessKeyId'],
+            'secret_key': credentials['SecretAccessKey'],
+            'token': credentials['SessionToken'],
+            'expiry_time': credentials['Expiration'].isoformat()
+        }
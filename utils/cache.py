@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内TTL缓存 - 用于Web端的只读查询
+"""
+
+import functools
+import os
+import threading
+import time
+
+
+def get_cache_ttl():
+    """获取Web缓存过期时间 (秒)"""
+    return float(os.getenv('WEB_CACHE_TTL', 30))
+
+
+def ttl_cache(ttl=None):
+    """按参数缓存函数返回值，ttl秒后过期；被装饰函数带有clear()方法"""
+    def decorator(func):
+        cache = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            expiry_seconds = ttl if ttl is not None else get_cache_ttl()
+            key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+
+            with lock:
+                entry = cache.get(key)
+                if entry and now < entry[0]:
+                    return entry[1]
+
+            value = func(*args, **kwargs)
+
+            with lock:
+                cache[key] = (now + expiry_seconds, value)
+            return value
+
+        def clear():
+            with lock:
+                cache.clear()
+
+        wrapper.clear = clear
+        return wrapper
+    return decorator
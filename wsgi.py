@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WSGI入口 - 生产环境使用
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import app, warm_caches
+
+application = app
+
+__all__ = ['app', 'application', 'warm_caches']